@@ -11,9 +11,11 @@ from source.main_window import MainWindow
 
 # ==============================================================================
 
-app = pg.mkQApp("Image Analysis")
-window = MainWindow()
-window.show()
-pg.mkQApp().exec_()
+# Guarded so worker processes (which import this module) don't open windows
+if __name__ == "__main__":
+    app = pg.mkQApp("Image Analysis")
+    window = MainWindow()
+    window.show()
+    pg.mkQApp().exec_()
 
 # ==============================================================================
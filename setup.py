@@ -17,6 +17,7 @@ setup(
     author_email='smithh@anl.gov',
     url='https://github.com/henryjsmith12/Image_Analysis',
     install_requires=['pyqtgraph',
+                      'h5py',
                       'matplotlib',
                       'numpy',
                       'rsMap3D',
@@ -0,0 +1,799 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import h5py
+import itertools
+import multiprocessing
+import numpy as np
+import os
+from scipy import ndimage, optimize
+import threading
+import time
+
+# ==============================================================================
+
+class DatasetIntegrator:
+
+    """
+    Integrates a gridded HKL dataset onto 1D |Q| shells or azimuthal sectors:
+    - Per-voxel |Q| and azimuth are computed from the grid's axis vectors by
+      broadcasting, so no HKL meshgrids are built
+    - |Q| is measured from a centre point (the origin by default); a metric
+      (e.g. the UB matrix) converts HKL offsets to 1/Angstrom, otherwise
+      reciprocal lattice units are used
+    - The azimuth is the angle around an HKL axis through the centre
+    - Shells can be limited to an azimuth sector and sectors to a |Q| range
+    - A voxel's bin depends only on the grid and the binning, so bin indices
+      are cached; integrating again (e.g. with a new mask) is two bincounts
+    """
+
+    MODES = ["|Q|", "Azimuth"]
+
+    # Grid geometry/binning -> (voxels, bins, bin range), shared between
+    # integrators
+    bin_cache = OrderedDict()
+    MAX_CACHED_BINS = 4
+
+    # Voxels converted at once when computing coordinates
+    CHUNK_VOXELS = 2 ** 22
+
+    def __init__ (self, axes, mode="|Q|", n_bins=200, center=(0, 0, 0), axis=2,
+        q_range=None, azimuth_range=None, metric=None):
+
+        self.axes = [np.asarray(values, dtype=np.float64) for values in axes]
+        self.shape = tuple(len(values) for values in self.axes)
+        self.mode = mode
+        self.n_bins = int(n_bins)
+        self.center = np.asarray(center, dtype=np.float64)
+        self.axis = int(axis)
+        self.q_range = None if q_range is None else tuple(q_range)
+        self.azimuth_range = None if azimuth_range is None else tuple(azimuth_range)
+
+        if metric is None:
+            metric = np.identity(3)
+        self.metric = np.asarray(metric, dtype=np.float64)
+
+    # --------------------------------------------------------------------------
+
+    def key(self):
+
+        """
+        Returns a hashable description of the grid geometry and binning
+        """
+
+        return (self.shape, tuple((values[0], values[-1]) for values in self.axes),
+            self.mode, self.n_bins, tuple(self.center), self.axis, self.q_range,
+            self.azimuth_range, tuple(np.ravel(self.metric)))
+
+    # --------------------------------------------------------------------------
+
+    def azimuthBasis(self):
+
+        """
+        Returns orthonormal (u, v) vectors perpendicular to the azimuth axis.
+        Angles are measured from u (the next HKL axis) towards v.
+        """
+
+        normal = self.metric[:, self.axis] / np.linalg.norm(self.metric[:, self.axis])
+        u = self.metric[:, (self.axis + 1) % 3]
+        u = u - np.dot(u, normal) * normal
+        u = u / np.linalg.norm(u)
+
+        return u, np.cross(normal, u)
+
+    # --------------------------------------------------------------------------
+
+    def coordinates(self, name):
+
+        """
+        Returns a flat (C-ordered) array of |Q| or azimuth (degrees) for
+        every voxel
+        """
+
+        h, k, l = [values - center for values, center in zip(self.axes, self.center)]
+        n_h, n_k, n_l = self.shape
+        values = np.empty(n_h * n_k * n_l)
+        slab_size = max(1, DatasetIntegrator.CHUNK_VOXELS // max(1, n_k * n_l))
+
+        if name == "Azimuth":
+            u, v = self.azimuthBasis()
+
+        for start in range(0, n_h, slab_size):
+            h_slab = h[start:start + slab_size]
+
+            # Metric @ (hkl - center) for each voxel in the slab
+            components = [row[0] * h_slab[:, None, None] + row[1] * k[None, :, None] + \
+                row[2] * l[None, None, :] for row in self.metric]
+
+            if name == "Azimuth":
+                x = sum(u[i] * components[i] for i in range(3))
+                y = sum(v[i] * components[i] for i in range(3))
+                slab_values = np.degrees(np.arctan2(y, x))
+            else:
+                slab_values = np.sqrt(sum(component ** 2 for component in components))
+
+            values[start * n_k * n_l:(start + len(h_slab)) * n_k * n_l] = np.ravel(slab_values)
+
+        return values
+
+    # --------------------------------------------------------------------------
+
+    def voxelBins(self):
+
+        """
+        Returns (voxels, bins, bin_range): flat indices of voxels inside the
+        integration region, the bin each falls in and the binned range
+        """
+
+        key = self.key()
+        if key in DatasetIntegrator.bin_cache:
+            DatasetIntegrator.bin_cache.move_to_end(key)
+            return DatasetIntegrator.bin_cache[key]
+
+        if self.mode == "Azimuth":
+            values = self.coordinates("Azimuth")
+            bin_range, limit, limit_range = self.azimuth_range, "|Q|", self.q_range
+        else:
+            values = self.coordinates("|Q|")
+            bin_range, limit, limit_range = self.q_range, "Azimuth", self.azimuth_range
+
+        valid = np.isfinite(values)
+        if limit_range is not None:
+            limit_values = self.coordinates(limit)
+            valid &= (limit_values >= limit_range[0]) & (limit_values <= limit_range[1])
+            del limit_values
+
+        if not np.any(valid):
+            raise ValueError("No voxels fall in the integration range")
+        if bin_range is None:
+            bin_range = (np.amin(values[valid]), np.amax(values[valid]))
+        low, high = bin_range
+        width = (high - low) / self.n_bins if high > low else 1
+
+        bins = np.floor((values - low) / width)
+        # Values on the upper edge go in the last bin
+        bins[values == high] = self.n_bins - 1
+        valid &= (bins >= 0) & (bins < self.n_bins)
+
+        voxels = np.flatnonzero(valid)
+        entry = (voxels, bins[voxels].astype(np.int32), (low, high))
+
+        DatasetIntegrator.bin_cache[key] = entry
+        while len(DatasetIntegrator.bin_cache) > DatasetIntegrator.MAX_CACHED_BINS:
+            DatasetIntegrator.bin_cache.popitem(last=False)
+
+        return entry
+
+    # --------------------------------------------------------------------------
+
+    def integrate(self, dataset, mask=None):
+
+        """
+        Returns (bin centres, mean intensity, voxel count) per bin. Voxels
+        where `mask` is False and non-finite voxels are left out; empty bins
+        are 0.
+        """
+
+        voxels, bins, (low, high) = self.voxelBins()
+
+        values = np.ravel(dataset)[voxels]
+        keep = np.isfinite(values)
+        if mask is not None:
+            keep &= np.ravel(mask)[voxels]
+
+        sums = np.bincount(bins[keep], weights=values[keep], minlength=self.n_bins)
+        counts = np.bincount(bins[keep], minlength=self.n_bins)
+        intensity = np.zeros(self.n_bins)
+        np.divide(sums, counts, out=intensity, where=counts > 0)
+
+        width = (high - low) / self.n_bins
+        centers = low + (np.arange(self.n_bins) + 0.5) * width
+
+        return centers, intensity, counts
+
+# ==============================================================================
+
+class CTRExtractor:
+
+    """
+    Extracts crystal truncation rods (intensity vs L at integer H, K) from a
+    gridded HKL dataset:
+    - Each rod integrates an (H, K) window around its position; a border of
+      voxels around the window gives the per-L background
+    - All rods are extracted together: the (H, K) columns any rod touches
+      are gathered once per chunk of L and reduced with a single matrix
+      product, so the whole volume is never copied
+    - Chunks along L keep memory bounded for large grids
+    """
+
+    # Voxels gathered at once
+    CHUNK_VOXELS = 2 ** 22
+
+    def __init__ (self, axes, rods, window=(0.05, 0.05), border=(0.05, 0.05)):
+
+        self.axes = [np.asarray(values, dtype=np.float64) for values in axes]
+        self.shape = tuple(len(values) for values in self.axes)
+        self.rods = [tuple(int(round(value)) for value in rod) for rod in rods]
+        self.window = tuple(window)
+        self.border = tuple(border)
+
+        self.columns, self.signal_weights, self.background_weights = self.rodWeights()
+
+    # --------------------------------------------------------------------------
+
+    def rodWeights(self):
+
+        """
+        Returns (columns, signal, background): (H, K) indices of every column
+        used by a rod, and (n_rods, n_columns) 0/1 matrices selecting each
+        rod's window and background border
+        """
+
+        h, k = self.axes[0], self.axes[1]
+        signal_masks, background_masks = [], []
+
+        for rod_h, rod_k in self.rods:
+            dh = np.abs(h - rod_h)[:, None]
+            dk = np.abs(k - rod_k)[None, :]
+            signal = (dh <= self.window[0]) & (dk <= self.window[1])
+            outer = (dh <= self.window[0] + self.border[0]) & \
+                (dk <= self.window[1] + self.border[1])
+            signal_masks.append(signal)
+            background_masks.append(outer & ~signal)
+
+        used = np.zeros(self.shape[:2], dtype=bool)
+        for mask in signal_masks + background_masks:
+            used |= mask
+        columns = np.nonzero(used)
+
+        signal_weights = np.array([mask[columns] for mask in signal_masks], dtype=np.float64)
+        background_weights = np.array([mask[columns] for mask in background_masks],
+            dtype=np.float64)
+
+        return columns, signal_weights.reshape(len(self.rods), -1), \
+            background_weights.reshape(len(self.rods), -1)
+
+    # --------------------------------------------------------------------------
+
+    def extract(self, dataset, mask=None):
+
+        """
+        Returns (intensity, signal, background), each (n_rods, n_L):
+        - signal: mean intensity in each rod's window
+        - background: mean intensity in the border around it
+        - intensity: (signal - background) times the window's voxel count
+        Voxels where `mask` is False or that aren't finite are left out;
+        L values with no voxels are 0.
+        """
+
+        n_rods, n_l = len(self.rods), self.shape[2]
+        sums = [np.zeros((n_rods, n_l)) for i in range(2)]
+        counts = [np.zeros((n_rods, n_l)) for i in range(2)]
+        n_columns = len(self.columns[0])
+        chunk_size = max(1, CTRExtractor.CHUNK_VOXELS // max(1, n_columns))
+
+        for start in range(0, n_l, chunk_size):
+            l_slice = slice(start, min(start + chunk_size, n_l))
+
+            # (n_columns, n_chunk) values of every column any rod uses
+            values = np.asarray(dataset[self.columns[0], self.columns[1], l_slice],
+                dtype=np.float64)
+            valid = np.isfinite(values)
+            if mask is not None:
+                valid &= np.asarray(mask[self.columns[0], self.columns[1], l_slice])
+            values = np.where(valid, values, 0)
+
+            for i, weights in enumerate([self.signal_weights, self.background_weights]):
+                sums[i][:, l_slice] = weights @ values
+                counts[i][:, l_slice] = weights @ valid
+
+        signal, background = [np.zeros((n_rods, n_l)) for i in range(2)]
+        np.divide(sums[0], counts[0], out=signal, where=counts[0] > 0)
+        np.divide(sums[1], counts[1], out=background, where=counts[1] > 0)
+
+        window_size = self.signal_weights.sum(axis=1)[:, None]
+        intensity = np.where(counts[0] > 0, (signal - background) * window_size, 0)
+
+        return intensity, signal, background
+
+    # --------------------------------------------------------------------------
+
+    def save(self, file_path, intensity, signal, background):
+
+        """
+        Writes extracted rods to an HDF5 file: one "rods/H{h}_K{k}" group per
+        rod holding L, Intensity, Signal and Background
+        """
+
+        with h5py.File(file_path, "w") as file:
+            rods = file.create_group("rods")
+            rods.attrs["window"] = self.window
+            rods.attrs["border"] = self.border
+
+            for i, (rod_h, rod_k) in enumerate(self.rods):
+                rod = rods.create_group(f"H{rod_h}_K{rod_k}")
+                rod.attrs["H"] = rod_h
+                rod.attrs["K"] = rod_k
+                rod.create_dataset("L", data=self.axes[2])
+                rod.create_dataset("Intensity", data=intensity[i])
+                rod.create_dataset("Signal", data=signal[i])
+                rod.create_dataset("Background", data=background[i])
+
+    # --------------------------------------------------------------------------
+
+    def gridRods(axes):
+
+        """
+        Returns every integer (H, K) inside a grid's H and K ranges
+        """
+
+        h_values = range(int(np.ceil(np.amin(axes[0]))), int(np.floor(np.amax(axes[0]))) + 1)
+        k_values = range(int(np.ceil(np.amin(axes[1]))), int(np.floor(np.amax(axes[1]))) + 1)
+
+        return [(h, k) for h in h_values for k in k_values]
+
+# ==============================================================================
+
+class PeakFinder:
+
+    """
+    Finds peaks in a gridded HKL dataset:
+    - Peaks are local maxima (voxels equal to the maximum of their
+      neighbourhood) above a threshold
+    - The maximum filter runs on slabs along H (with a halo so slab edges
+      see their neighbours) on a shared thread pool
+    - Voxels above the threshold are grouped into connected regions, which
+      give each peak's integrated intensity, voxel count and HKL extent.
+      Maxima on a flat top (same region, same value) count as one peak; a
+      region holding several distinct maxima (close peaks, a peak on a rod)
+      is split between them along steepest uphill paths, so each voxel is
+      integrated into exactly one peak.
+    """
+
+    # Columns of the peak table returned by findPeaks
+    COLUMNS = ["H", "K", "L", "Intensity", "Integrated", "Voxels", "dH", "dK", "dL"]
+
+    # Voxels per maximum filter slab
+    CHUNK_VOXELS = 2 ** 22
+
+    executor = None
+    lock = threading.Lock()
+
+    def pool():
+        with PeakFinder.lock:
+            if PeakFinder.executor is None:
+                PeakFinder.executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+        return PeakFinder.executor
+
+    # --------------------------------------------------------------------------
+
+    def slabMaxima(dataset, start, end, threshold, size):
+
+        """
+        Returns (n, 3) indices of local maxima above threshold with H index
+        in start..end-1
+        """
+
+        halo = size // 2
+        low, high = max(start - halo, 0), min(end + halo, dataset.shape[0])
+
+        slab = np.asarray(dataset[low:high], dtype=np.float64)
+        slab = np.where(np.isfinite(slab), slab, -np.inf)
+        maxima = (ndimage.maximum_filter(slab, size=size, mode="nearest") == slab) & \
+            (slab > threshold)
+        maxima[:start - low] = False
+        maxima[end - low:] = False
+
+        indices = np.argwhere(maxima)
+        indices[:, 0] += low
+
+        return indices
+
+    # --------------------------------------------------------------------------
+
+    def localMaxima(dataset, threshold, size=3):
+
+        """
+        Returns (n, 3) indices of every local maximum above threshold
+        """
+
+        n_h = dataset.shape[0]
+        slab_size = max(1, PeakFinder.CHUNK_VOXELS // max(1, dataset[0].size))
+
+        futures = [PeakFinder.pool().submit(PeakFinder.slabMaxima, dataset, start,
+            min(start + slab_size, n_h), threshold, size) \
+            for start in range(0, n_h, slab_size)]
+
+        return np.concatenate([future.result() for future in futures] + \
+            [np.zeros((0, 3), dtype=np.int64)])
+
+    # --------------------------------------------------------------------------
+
+    def findPeaks(dataset, axes, threshold, size=3):
+
+        """
+        Returns (indices, table) for every peak, brightest first: (n, 3)
+        voxel indices and an (n, len(COLUMNS)) array of HKL position, peak
+        and integrated intensity, voxel count and HKL extent of the peak's
+        region (or its part of a region shared with other peaks)
+        """
+
+        axes = [np.asarray(values, dtype=np.float64) for values in axes]
+        steps = np.array([values[1] - values[0] if len(values) > 1 else 0 \
+            for values in axes])
+
+        indices = PeakFinder.localMaxima(dataset, threshold, size)
+
+        above = np.isfinite(dataset) & (dataset > threshold)
+        labels, n_regions = ndimage.label(above, structure=np.ones((3, 3, 3)))
+        regions = labels[tuple(indices.T)]
+        values = dataset[tuple(indices.T)]
+
+        # One peak per flat top: first maximum of each (region, value)
+        order = np.lexsort((values, regions))
+        indices, regions, values = indices[order], regions[order], values[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (regions[1:] != regions[:-1]) | (values[1:] != values[:-1])
+        indices, regions, values = indices[first], regions[first], values[first]
+
+        region_index = np.arange(1, n_regions + 1)
+        integrated = ndimage.sum_labels(np.where(above, dataset, 0), labels, region_index)
+        voxels = np.bincount(np.ravel(labels), minlength=n_regions + 1)[1:]
+        objects = ndimage.find_objects(labels)
+        extents = np.array([[(region[axis].stop - region[axis].start) * steps[axis] \
+            for axis in range(3)] for region in objects]).reshape(-1, 3)
+
+        table = np.zeros((len(indices), len(PeakFinder.COLUMNS)))
+        for axis in range(3):
+            table[:, axis] = axes[axis][indices[:, axis]]
+        table[:, 3] = values
+        table[:, 4] = integrated[regions - 1]
+        table[:, 5] = voxels[regions - 1]
+        table[:, 6:9] = extents[regions - 1]
+
+        # Regions with several peaks: totals of each peak's part
+        counts = np.bincount(regions, minlength=n_regions + 1)
+        for region in np.flatnonzero(counts > 1):
+            peaks = np.flatnonzero(regions == region)
+            table[peaks, 4:9] = PeakFinder.splitRegion(dataset, labels, region,
+                objects[region - 1], indices[peaks], steps)
+
+        order = np.argsort(-values, kind="stable")
+
+        return indices[order], table[order]
+
+    # --------------------------------------------------------------------------
+
+    def splitRegion(dataset, labels, region, bounding_box, indices, steps):
+
+        """
+        Splits a region between its peaks (at `indices`): each voxel goes to
+        the peak its steepest uphill path leads to. Voxels whose path ends
+        at a maximum that isn't a peak (e.g. a flat top's other voxels) join
+        the peak of a neighbour. Returns an (n_peaks, 5) array of integrated
+        intensity, voxel count and HKL extent per peak.
+        """
+
+        inside = np.pad(labels[bounding_box] == region, 1)
+        values = np.where(inside, np.pad(dataset[bounding_box], 1), -np.inf)
+        shape = values.shape
+        flat_values = np.ravel(values)
+        voxels = np.flatnonzero(inside)
+
+        # Highest neighbour of every region voxel (itself if none is higher);
+        # padding keeps neighbours of region voxels inside the array
+        strides = np.array([shape[1] * shape[2], shape[2], 1])
+        parent = voxels.copy()
+        best = flat_values[voxels]
+        for offset in itertools.product([-1, 0, 1], repeat=3):
+            neighbours = voxels + int(np.dot(offset, strides))
+            higher = flat_values[neighbours] > best
+            parent[higher] = neighbours[higher]
+            best[higher] = flat_values[neighbours[higher]]
+
+        # Follow uphill paths to their maxima by pointer jumping
+        root = np.zeros(values.size, dtype=np.int64)
+        root[voxels] = parent
+        while True:
+            next_root = root[root[voxels]]
+            if np.array_equal(next_root, root[voxels]):
+                break
+            root[voxels] = next_root
+
+        peak_labels = np.zeros(values.size, dtype=np.int32)
+        peak_voxels = np.ravel_multi_index(tuple((indices - \
+            [axis.start for axis in bounding_box] + 1).T), shape)
+        peak_labels[peak_voxels] = np.arange(1, len(indices) + 1)
+        basins = np.zeros(values.size, dtype=np.int32)
+        basins[voxels] = peak_labels[root[voxels]]
+        basins = basins.reshape(shape)
+
+        # Voxels left over join a labelled neighbour
+        unlabelled = inside & (basins == 0)
+        while np.any(unlabelled):
+            grown = ndimage.grey_dilation(basins, size=(3, 3, 3))
+            reached = unlabelled & (grown > 0)
+            if not np.any(reached):
+                break
+            basins[reached] = grown[reached]
+            unlabelled &= ~reached
+
+        peak_index = np.arange(1, len(indices) + 1)
+        totals = np.zeros((len(indices), 5))
+        totals[:, 0] = ndimage.sum_labels(np.where(inside, values, 0), basins, peak_index)
+        totals[:, 1] = np.bincount(np.ravel(basins), minlength=len(indices) + 1)[1:]
+        for i, basin in enumerate(ndimage.find_objects(basins, len(indices))):
+            if basin is not None:
+                totals[i, 2:5] = [(basin[axis].stop - basin[axis].start) * steps[axis] \
+                    for axis in range(3)]
+
+        return totals
+
+# ==============================================================================
+
+class PeakFitter:
+
+    """
+    Fits 3D Gaussian or Lorentzian peaks (axis-aligned widths plus a flat
+    background) to many peaks of a gridded HKL dataset:
+    - Each fit only sees a small box of voxels around its peak; boxes are
+      sliced from the grid, so only they (never the whole grid) are sent to
+      the workers
+    - Fits run in parallel on a shared process pool (least squares is
+      CPU-bound Python, so threads wouldn't help)
+    - Widths are full widths at half maximum; integrated intensities are in
+      the same units as a sum over voxels
+    """
+
+    MODELS = ["Gaussian", "Lorentzian"]
+
+    # Columns of the fit table returned by fitPeaks
+    COLUMNS = ["H", "K", "L", "Amplitude", "Background", "FWHM H", "FWHM K",
+        "FWHM L", "Integrated", "Residual"]
+
+    # Sub-volumes sent to a worker at once
+    CHUNK_SIZE = 8
+
+    executor = None
+    lock = threading.Lock()
+
+    def pool():
+        with PeakFitter.lock:
+            if PeakFitter.executor is None:
+                # Spawned workers don't inherit the GUI's threads or state
+                PeakFitter.executor = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                    mp_context=multiprocessing.get_context("spawn"))
+
+        return PeakFitter.executor
+
+    # --------------------------------------------------------------------------
+
+    def model(params, h, k, l, name):
+
+        """
+        Evaluates a peak model at broadcastable h, k, l coordinates. params:
+        (amplitude, background, h0, k0, l0, width_h, width_k, width_l)
+        """
+
+        amplitude, background = params[:2]
+        offsets = [(h - params[2]) / params[5], (k - params[3]) / params[6],
+            (l - params[4]) / params[7]]
+
+        if name == "Lorentzian":
+            shape = 1 / ((1 + offsets[0] ** 2) * (1 + offsets[1] ** 2) * (1 + offsets[2] ** 2))
+        else:
+            shape = np.exp(-0.5 * (offsets[0] ** 2 + offsets[1] ** 2 + offsets[2] ** 2))
+
+        return amplitude * shape + background
+
+    # --------------------------------------------------------------------------
+
+    def fitPeak(values, axes, name="Gaussian"):
+
+        """
+        Fits a model to a sub-volume (NaN voxels are ignored). Returns a row
+        of COLUMNS (NaN if the fit fails).
+        """
+
+        h, k, l = [np.asarray(axis, dtype=np.float64) for axis in axes]
+        finite = np.isfinite(values)
+        h, k, l = [np.broadcast_to(axis, values.shape)[finite] \
+            for axis in (h[:, None, None], k[None, :, None], l[None, None, :])]
+        data = values[finite]
+        steps = np.array([abs(axis[1] - axis[0]) if len(axis) > 1 else 1 for axis in axes])
+
+        if data.size < 9:
+            return np.full(len(PeakFitter.COLUMNS), np.nan)
+
+        # Starts from the brightest voxel, two voxels wide
+        peak = np.argmax(data)
+        background = np.amin(data)
+        p0 = [data[peak] - background, background, h[peak], k[peak], l[peak], *(2 * steps)]
+        lower = [0, -np.inf, h.min(), k.min(), l.min(), *(steps / 10)]
+        upper = [np.inf, np.inf, h.max(), k.max(), l.max(), *(steps * 100)]
+
+        try:
+            result = optimize.least_squares(
+                lambda params: PeakFitter.model(params, h, k, l, name) - data,
+                p0, bounds=(lower, upper), x_scale="jac")
+        except (ValueError, np.linalg.LinAlgError):
+            return np.full(len(PeakFitter.COLUMNS), np.nan)
+
+        amplitude, background, h0, k0, l0 = result.x[:5]
+        widths = result.x[5:]
+        if name == "Lorentzian":
+            fwhm = 2 * widths
+            volume = np.prod(np.pi * widths)
+        else:
+            fwhm = 2 * np.sqrt(2 * np.log(2)) * widths
+            volume = np.prod(np.sqrt(2 * np.pi) * widths)
+        integrated = amplitude * volume / np.prod(steps)
+        residual = np.sqrt(np.mean(result.fun ** 2))
+
+        return np.array([h0, k0, l0, amplitude, background, *fwhm, integrated, residual])
+
+    # --------------------------------------------------------------------------
+
+    def subVolume(dataset, axes, index, radius):
+
+        """
+        Returns (values, axes) of the box of voxels within `radius` voxels of
+        an index, clipped to the grid
+        """
+
+        box = tuple(slice(max(i - r, 0), min(i + r + 1, n)) \
+            for i, r, n in zip(index, radius, dataset.shape))
+
+        return np.array(dataset[box], dtype=np.float64), \
+            [np.asarray(values)[box_slice] for values, box_slice in zip(axes, box)]
+
+    # --------------------------------------------------------------------------
+
+    def fitPeaks(dataset, axes, indices, name="Gaussian", radius=(4, 4, 4),
+        ignore_empty=True):
+
+        """
+        Fits every peak (given as voxel indices). Returns (table, rate): an
+        (n, len(COLUMNS)) array (NaN rows for failed fits) and the
+        throughput in peaks per second. Empty (0) voxels are ignored if
+        ignore_empty.
+        """
+
+        start = time.perf_counter()
+        volumes, volume_axes = [], []
+
+        for index in indices:
+            values, box_axes = PeakFitter.subVolume(dataset, axes, index, radius)
+            if ignore_empty:
+                values[values == 0] = np.nan
+            volumes.append(values)
+            volume_axes.append(box_axes)
+
+        rows = PeakFitter.pool().map(PeakFitter.fitPeak, volumes, volume_axes,
+            [name] * len(volumes), chunksize=PeakFitter.CHUNK_SIZE)
+        table = np.array(list(rows)).reshape(-1, len(PeakFitter.COLUMNS))
+
+        elapsed = time.perf_counter() - start
+        rate = len(table) / elapsed if elapsed > 0 else 0
+
+        return table, rate
+
+# ==============================================================================
+
+class ObliqueSlicer:
+
+    """
+    Samples gridded HKL datasets on arbitrary planes (e.g. perpendicular to
+    [110]) with trilinear interpolation:
+    - A plane is an HKL origin plus two in-plane HKL vectors; by default it
+      is sized to cover the whole grid
+    - Slices run on a single worker thread. Only the latest request
+      matters: newer requests cancel queued ones, and a running slice stops
+      between row chunks once it has been superseded.
+    """
+
+    # Plane rows interpolated between checks for newer requests
+    CHUNK_ROWS = 32
+
+    def __init__ (self):
+
+        self.generation = 0
+        self.future = None
+        self.lock = threading.Lock()
+        self.driver = ThreadPoolExecutor(max_workers=1)
+
+    # --------------------------------------------------------------------------
+
+    def planeExtent(axes, origin, u, v):
+
+        """
+        Returns ((s_min, s_max), (t_min, t_max)) so that origin + s * u + t * v
+        covers the projection of every grid corner onto the plane
+        """
+
+        corners = np.array([[values[i] for values, i in zip(axes, corner)] \
+            for corner in itertools.product([0, -1], repeat=3)], dtype=np.float64)
+        basis = np.stack((u, v), axis=1)
+        st = np.linalg.pinv(basis) @ (corners - origin).T
+
+        return tuple((np.amin(values), np.amax(values)) for values in st)
+
+    # --------------------------------------------------------------------------
+
+    def planePoints(axes, origin, u, v, shape, extent=None):
+
+        """
+        Returns (points, extent): (3, n_s, n_t) fractional voxel indices of
+        the plane's sample points and the (s, t) ranges they span
+        """
+
+        origin, u, v = [np.asarray(vector, dtype=np.float64) for vector in (origin, u, v)]
+        if np.linalg.norm(np.cross(u, v)) == 0:
+            raise ValueError("Plane vectors must not be parallel")
+        if extent is None:
+            extent = ObliqueSlicer.planeExtent(axes, origin, u, v)
+
+        s = np.linspace(*extent[0], shape[0])
+        t = np.linspace(*extent[1], shape[1])
+        points = np.empty((3,) + tuple(shape))
+
+        for axis, values in enumerate(axes):
+            step = values[1] - values[0] if len(values) > 1 else 1
+            hkl = origin[axis] + u[axis] * s[:, None] + v[axis] * t[None, :]
+            points[axis] = (hkl - values[0]) / step
+
+        return points, extent
+
+    # --------------------------------------------------------------------------
+
+    def slice(self, dataset, axes, origin, u, v, shape=(200, 200), extent=None,
+        generation=None):
+
+        """
+        Returns (image, extent) for a plane; points outside the grid are 0.
+        Returns None if a newer request arrived while slicing.
+        """
+
+        points, extent = ObliqueSlicer.planePoints(axes, origin, u, v, shape, extent)
+        image = np.zeros(tuple(shape))
+
+        for start in range(0, shape[0], ObliqueSlicer.CHUNK_ROWS):
+            if generation is not None and generation != self.generation:
+                return None
+            rows = slice(start, start + ObliqueSlicer.CHUNK_ROWS)
+            image[rows] = ndimage.map_coordinates(dataset, points[:, rows], order=1,
+                mode="constant", cval=0)
+
+        return image, extent
+
+    # --------------------------------------------------------------------------
+
+    def submit(self, dataset, axes, origin, u, v, shape=(200, 200), extent=None):
+
+        """
+        Starts slicing a plane in the background, superseding any earlier
+        request. Returns a Future (its result is None if superseded).
+        """
+
+        with self.lock:
+            self.generation += 1
+            if self.future is not None:
+                self.future.cancel()
+            self.future = self.driver.submit(self.slice, dataset, axes, origin,
+                u, v, shape, extent, self.generation)
+
+            return self.future
+
+    # --------------------------------------------------------------------------
+
+    def shutdown(self):
+        self.driver.shutdown(wait=False)
+
+# ==============================================================================
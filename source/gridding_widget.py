@@ -5,6 +5,7 @@ See LICENSE file.
 
 # ==============================================================================
 
+from concurrent.futures import ThreadPoolExecutor
 import h5py
 import matplotlib.colors as colors
 import matplotlib.pyplot as plt
@@ -22,6 +23,10 @@ from rsMap3D.mappers.gridmapper import QGridMapper
 from rsMap3D.mappers.output.vtigridwriter import VTIGridWriter
 from rsMap3D.transforms.unitytransform3d import UnityTransform3D
 from rsMap3D.utils.srange import srange
+from spec2nexus import spec
+from source.analysis_logic import *
+from source.rsm_logic import *
+import time
 import vtk
 from vtk.util import numpy_support as npSup
 
@@ -50,6 +55,8 @@ class GriddingWidget(QtGui.QWidget):
         # Instantiated for later use
         self.conversion_dialog = ConversionParametersDialog()
         self.vti_creation_dialog = VTICreationDialog()
+        self.vti_creation_dialog.live_btn.clicked.connect(
+            self.data_selection_widget.startLiveGridding)
 
     # --------------------------------------------------------------------------
 
@@ -65,12 +72,20 @@ class GriddingWidget(QtGui.QWidget):
         self.roi_analysis_dock = Dock("ROI", size=(400, 100))
         self.data_dock = Dock("Data", size=(400, 100), hideTitle=True)
         self.line_roi_analysis_dock = Dock("Slicing", size=(400, 100))
+        self.integration_dock = Dock("Integration", size=(400, 100))
+        self.ctr_dock = Dock("CTR", size=(400, 100))
+        self.peak_dock = Dock("Peaks", size=(400, 100))
+        self.oblique_slice_dock = Dock("Oblique Slice", size=(400, 100))
 
         # Adding Docks to Area -------------------------------------------------
         self.dock_area.addDock(self.data_selection_dock)
         self.dock_area.addDock(self.line_roi_analysis_dock, "bottom", self.data_selection_dock)
         self.dock_area.addDock(self.analysis_dock, "above", self.line_roi_analysis_dock)
         self.dock_area.addDock(self.roi_analysis_dock, "above", self.analysis_dock)
+        self.dock_area.addDock(self.integration_dock, "above", self.line_roi_analysis_dock)
+        self.dock_area.addDock(self.ctr_dock, "above", self.integration_dock)
+        self.dock_area.addDock(self.peak_dock, "above", self.ctr_dock)
+        self.dock_area.addDock(self.oblique_slice_dock, "above", self.peak_dock)
         self.dock_area.addDock(self.data_dock, "right", self.data_selection_dock)
         self.dock_area.moveDock(self.analysis_dock, "above", self.roi_analysis_dock)
 
@@ -88,12 +103,20 @@ class GriddingWidget(QtGui.QWidget):
         self.roi_analysis_widget = ROIAnalysisWidget(self)
         self.data_widget = DataWidget(self)
         self.line_roi_analysis_widget = LineROIAnalysisWidget(self)
+        self.integration_widget = IntegrationWidget(self)
+        self.ctr_widget = CTRWidget(self)
+        self.peak_widget = PeakWidget(self)
+        self.oblique_slice_widget = ObliqueSliceWidget(self)
 
         # Adding Widgets to Docks ----------------------------------------------
         self.data_selection_dock.addWidget(self.data_selection_widget)
         self.analysis_dock.addWidget(self.analysis_widget)
         self.roi_analysis_dock.addWidget(self.roi_analysis_widget)
         self.line_roi_analysis_dock.addWidget(self.line_roi_analysis_widget)
+        self.integration_dock.addWidget(self.integration_widget)
+        self.ctr_dock.addWidget(self.ctr_widget)
+        self.peak_dock.addWidget(self.peak_widget)
+        self.oblique_slice_dock.addWidget(self.oblique_slice_widget)
         self.data_dock.addWidget(self.data_widget)
 
 # ==============================================================================
@@ -110,6 +133,13 @@ class DataSelectionWidget(QtGui.QWidget):
     *** TODO: Add VTI Creation dialog and use experimental layout
     """
 
+    # Live gridding polls for new frames every LIVE_POLL_INTERVAL ms (at most
+    # LIVE_FRAMES_PER_POLL per poll, on the gridder's worker thread) and
+    # redraws the dataset at most once every LIVE_REFRESH_INTERVAL seconds
+    LIVE_POLL_INTERVAL = 1000
+    LIVE_FRAMES_PER_POLL = 25
+    LIVE_REFRESH_INTERVAL = 5
+
     def __init__ (self, parent):
         super(DataSelectionWidget, self).__init__(parent)
         self.main_widget = parent
@@ -144,6 +174,20 @@ class DataSelectionWidget(QtGui.QWidget):
         self.slice_direction_lbl = QtGui.QLabel("Slice Direction:")
         self.slice_direction_cbox = QtGui.QComboBox()
         self.slice_direction_cbox.addItems(["X(H)", "Y(K)", "Z(L)"])
+        self.live_frames_lbl = QtGui.QLabel("Live Frames:")
+        self.live_frames_txtbox = QtGui.QLineEdit()
+        self.live_frames_txtbox.setReadOnly(True)
+        self.stop_live_btn = QtGui.QPushButton("Stop Live Gridding")
+        self.stop_live_btn.setEnabled(False)
+
+        # Live gridding --------------------------------------------------------
+        self.live_gridder = None
+        self.live_future = None
+        self.live_timer = QtCore.QTimer()
+        self.live_last_refresh = 0
+        # Stop requested; the final poll hands back any undisplayed frames
+        self.live_stopping = False
+        self.live_final = False
 
         # Layout ---------------------------------------------------------------
         self.layout = QtGui.QGridLayout()
@@ -159,6 +203,9 @@ class DataSelectionWidget(QtGui.QWidget):
         self.layout.addWidget(self.slice_direction_lbl, 3, 0)
         self.layout.addWidget(self.slice_direction_cbox, 3, 1)
         self.layout.addWidget(self.process_btn, 4, 0, 1, 2)
+        self.layout.addWidget(self.live_frames_lbl, 5, 0)
+        self.layout.addWidget(self.live_frames_txtbox, 5, 1)
+        self.layout.addWidget(self.stop_live_btn, 6, 0, 1, 2)
 
         self.vti_info_layout.addWidget(self.pixel_count_lbl, 0, 0, 1, 2)
         self.vti_info_layout.addWidget(self.pixel_count_txtbox, 0, 2, 1, 2)
@@ -174,6 +221,8 @@ class DataSelectionWidget(QtGui.QWidget):
         self.create_vti_btn.clicked.connect(self.showVTICreationDialog)
         self.process_btn.clicked.connect(self.createDataset)
         self.slice_direction_cbox.currentTextChanged.connect(self.changeSliceDirection)
+        self.stop_live_btn.clicked.connect(self.stopLiveGridding)
+        self.live_timer.timeout.connect(self.updateLiveGridding)
 
     # --------------------------------------------------------------------------
 
@@ -292,6 +341,132 @@ class DataSelectionWidget(QtGui.QWidget):
 
 # --------------------------------------------------------------------------
 
+    def startLiveGridding(self):
+
+        """
+        Starts gridding the scan selected in VTICreationDialog while it is
+        being collected
+        """
+
+        dialog = self.main_widget.vti_creation_dialog
+
+        try:
+            scan = dialog.selected_scan_cbox.currentText()
+            spec_name = os.path.splitext(os.path.basename(dialog.data_source_path))[0]
+            image_dir = ConversionLogic.scanImageDir(dialog.project_path, spec_name, scan)
+            shape = (dialog.h_count_sbox.value(), dialog.k_count_sbox.value(),
+                dialog.l_count_sbox.value())
+
+            geometry = ScanGeometry(dialog.data_source_path, scan,
+                dialog.detector_path, dialog.instrument_path)
+            live_gridder = LiveGridder(image_dir, geometry, shape,
+                normalize=dialog.normalize_chkbox.isChecked(),
+                keep_raw=dialog.keep_raw_chkbox.isChecked())
+
+        except Exception as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"Could Not Start Live Gridding: {ex}")
+            msg_box.exec_()
+            return
+
+        dialog.close()
+        if self.live_gridder is not None:
+            self.live_gridder.shutdown()
+        self.live_gridder = live_gridder
+        self.live_future = None
+        self.vti_path = ""
+        self.vti_txtbox.setText(f"{image_dir} (live)")
+        self.live_frames_txtbox.setText("0")
+        self.live_last_refresh = 0
+        self.live_stopping = False
+        self.live_final = False
+        self.stop_live_btn.setEnabled(True)
+        self.live_timer.start(self.LIVE_POLL_INTERVAL)
+
+    # --------------------------------------------------------------------------
+
+    def updateLiveGridding(self):
+
+        """
+        Shows the result of the last poll (redrawing at a capped rate) and
+        starts the next one
+        """
+
+        if self.live_future is not None:
+            if not self.live_future.done():
+                return
+
+            future, self.live_future = self.live_future, None
+            try:
+                frame_count, snapshot = future.result()
+            except Exception as ex:
+                self.live_timer.stop()
+                self.stop_live_btn.setEnabled(False)
+                msg_box = QtGui.QMessageBox()
+                msg_box.setWindowTitle("Error")
+                msg_box.setText(f"Live Gridding Stopped: {ex}")
+                msg_box.exec_()
+                return
+
+            self.live_frames_txtbox.setText(str(frame_count))
+            if snapshot is not None:
+                self.displayLiveDataset(*snapshot)
+            if self.live_final:
+                self.live_timer.stop()
+                return
+
+        if self.live_stopping:
+            # No new frames; only hands back what hasn't been displayed
+            self.live_final = True
+            self.live_future = self.live_gridder.submit(max_frames=0, snapshot=True)
+        else:
+            refresh = time.monotonic() - self.live_last_refresh >= self.LIVE_REFRESH_INTERVAL
+            self.live_future = self.live_gridder.submit(
+                max_frames=self.LIVE_FRAMES_PER_POLL, snapshot=refresh)
+
+    # --------------------------------------------------------------------------
+
+    def displayLiveDataset(self, dataset, axes):
+
+        """
+        Displays a dataset handed back by the live gridder, keeping the
+        current slice
+        """
+
+        self.dataset = dataset
+        self.h_values = np.array(axes[0])
+        self.k_values = np.array(axes[1])
+        self.l_values = np.array(axes[2])
+        self.hkl_values = [self.h_values, self.k_values, self.l_values]
+
+        self.pixel_count_txtbox.setText(f"{self.dataset.shape}")
+        self.h_txtbox.setText(f"({round(axes[0][0], 5)},{round(axes[0][-1], 5)})")
+        self.k_txtbox.setText(f"({round(axes[1][0], 5)},{round(axes[1][-1], 5)})")
+        self.l_txtbox.setText(f"({round(axes[2][0], 5)},{round(axes[2][-1], 5)})")
+
+        data_widget = self.main_widget.data_widget
+        index = data_widget.currentIndex
+        data_widget.displayDataset(new_dataset=True, dataset_rect=self.hkl_values)
+        data_widget.setCurrentIndex(index)
+
+        self.live_last_refresh = time.monotonic()
+
+    # --------------------------------------------------------------------------
+
+    def stopLiveGridding(self):
+
+        """
+        Stops polling once frames deposited so far are displayed; the last
+        live dataset stays loaded
+        """
+
+        self.live_stopping = True
+        self.stop_live_btn.setEnabled(False)
+        self.updateLiveGridding()
+
+    # --------------------------------------------------------------------------
+
     def changeSliceDirection(self):
 
         """
@@ -320,6 +495,7 @@ class DataWidget(pg.ImageView):
         self.slice_direction = None
         self.dataset_rect = None
         self.scene_point = None
+        self.mouse_connected = False
 
         self.view_box = self.view.getViewBox()
         self.view.setAspectLocked(False)
@@ -409,8 +585,15 @@ class DataWidget(pg.ImageView):
         self.main_widget.analysis_widget.setEnabled(True)
         self.main_widget.roi_analysis_widget.setEnabled(True)
         self.main_widget.line_roi_analysis_widget.setEnabled(True)
-
-        self.view_box.scene().sigMouseMoved.connect(self.updateMouse)
+        self.main_widget.integration_widget.setEnabled(True)
+        self.main_widget.ctr_widget.setEnabled(True)
+        self.main_widget.peak_widget.setEnabled(True)
+        self.main_widget.oblique_slice_widget.setEnabled(True)
+
+        # Connected once; datasets may be redisplayed many times (live gridding)
+        if not self.mouse_connected:
+            self.view_box.scene().sigMouseMoved.connect(self.updateMouse)
+            self.mouse_connected = True
         self.updateMouse()
         self.main_widget.analysis_widget.updateScanInfo(self.dataset)
         self.main_widget.analysis_widget.updateMaxInfo(self.dataset, self.dataset_rect)
@@ -843,6 +1026,32 @@ class ROIWidget(QtGui.QWidget):
 
     # --------------------------------------------------------------------------
 
+    def hklBox(self):
+
+        """
+        Returns HKL (min, max) corners of the ROI. The box spans the whole
+        dataset along the slicing direction.
+        """
+
+        rect = self.main_widget.data_widget.dataset_rect
+        slice_direction = self.main_widget.data_widget.slice_direction
+
+        if slice_direction == None or slice_direction == "X(H)":
+            x_dir, y_dir = 2, 1
+        elif slice_direction == "Y(K)":
+            x_dir, y_dir = 2, 0
+        else:
+            x_dir, y_dir = 1, 0
+
+        hkl_min = np.array([rect[i][0] for i in range(3)], dtype=np.float64)
+        hkl_max = np.array([rect[i][-1] for i in range(3)], dtype=np.float64)
+        hkl_min[x_dir], hkl_max[x_dir] = self.roi.pos()[0], self.roi.pos()[0] + self.roi.size()[0]
+        hkl_min[y_dir], hkl_max[y_dir] = self.roi.pos()[1], self.roi.pos()[1] + self.roi.size()[1]
+
+        return hkl_min, hkl_max
+
+    # --------------------------------------------------------------------------
+
     def plotAverageIntensity(self):
 
         """
@@ -1500,243 +1709,1091 @@ class LineROIWidget(QtGui.QWidget):
 
 # ==============================================================================
 
-class ConversionParametersDialog(QtGui.QDialog):
+class IntegrationWidget(QtGui.QWidget):
 
     """
-    Houses dialog where user selects pixel interpolation values and config files for conversion
+    Integrates the loaded dataset onto |Q| shells or azimuthal sectors and
+    plots the resulting 1D profile
     """
 
-    def __init__ (self):
-        super().__init__()
+    def __init__ (self, parent):
+        super(IntegrationWidget, self).__init__(parent)
+        self.main_widget = parent
 
-        self.setWindowModality(QtCore.Qt.ApplicationModal)
-        self.detector_config_name = ""
-        self.instrument_config_name = ""
-        self.pixel_count_nx = 0
-        self.pixel_count_ny = 0
-        self.pixel_count_nz = 0
+        self.setEnabled(False)
 
         # Widget Creation ------------------------------------------------------
-        self.detector_lbl = QtGui.QLabel("Det. Config:")
-        self.detector_txtbox = QtGui.QLineEdit()
-        self.detector_txtbox.setReadOnly(True)
-        self.detector_btn = QtGui.QPushButton("Browse")
-        self.instrument_lbl = QtGui.QLabel("Instr. Config:")
-        self.instrument_txtbox = QtGui.QLineEdit()
-        self.instrument_txtbox.setReadOnly(True)
-        self.instrument_btn = QtGui.QPushButton("Browse")
-        self.pixel_count_lbl = QtGui.QLabel("Pixel Count:")
-        self.pixel_count_nx_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
-        self.pixel_count_nx_sbox.setValue(200)
-        self.pixel_count_ny_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
-        self.pixel_count_ny_sbox.setValue(200)
-        self.pixel_count_nz_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
-        self.pixel_count_nz_sbox.setValue(200)
-        self.dialog_btnbox = QtGui.QDialogButtonBox()
-        self.dialog_btnbox.addButton("OK", QtGui.QDialogButtonBox.AcceptRole)
+        self.mode_lbl = QtGui.QLabel("Integrate:")
+        self.mode_cbox = QtGui.QComboBox()
+        self.mode_cbox.addItems(DatasetIntegrator.MODES)
+        self.bins_lbl = QtGui.QLabel("Bins:")
+        self.bins_sbox = QtGui.QSpinBox(maximum=10000, minimum=1)
+        self.bins_sbox.setValue(200)
+        self.center_lbl = QtGui.QLabel("Centre (HKL):")
+        self.center_sboxes = []
+        for i in range(3):
+            center_sbox = QtGui.QDoubleSpinBox()
+            center_sbox.setMinimum(-1000)
+            center_sbox.setMaximum(1000)
+            center_sbox.setDecimals(6)
+            self.center_sboxes.append(center_sbox)
+        self.axis_lbl = QtGui.QLabel("Azimuth Axis:")
+        self.axis_cbox = QtGui.QComboBox()
+        self.axis_cbox.addItems(["H", "K", "L"])
+        self.axis_cbox.setCurrentIndex(2)
+        self.q_range_chkbox = QtGui.QCheckBox("|Q| Range:")
+        self.q_min_sbox = QtGui.QDoubleSpinBox()
+        self.q_min_sbox.setMaximum(1000)
+        self.q_min_sbox.setDecimals(6)
+        self.q_max_sbox = QtGui.QDoubleSpinBox()
+        self.q_max_sbox.setMaximum(1000)
+        self.q_max_sbox.setDecimals(6)
+        self.q_max_sbox.setValue(1)
+        self.azimuth_range_chkbox = QtGui.QCheckBox("Azimuth Range:")
+        self.azimuth_min_sbox = QtGui.QDoubleSpinBox()
+        self.azimuth_min_sbox.setRange(-180, 180)
+        self.azimuth_min_sbox.setValue(-180)
+        self.azimuth_max_sbox = QtGui.QDoubleSpinBox()
+        self.azimuth_max_sbox.setRange(-180, 180)
+        self.azimuth_max_sbox.setValue(180)
+        self.ub_chkbox = QtGui.QCheckBox("1/Å (UB of Scan in VTI Dialog)")
+        self.ignore_empty_chkbox = QtGui.QCheckBox("Ignore Empty Voxels")
+        self.ignore_empty_chkbox.setChecked(True)
+        self.integrate_btn = QtGui.QPushButton("Integrate")
+
+        self.plot_widget = pg.PlotWidget()
+
+        # GroupBoxes -----------------------------------------------------------
+        self.info_gbox = QtGui.QGroupBox()
 
         # Layout ---------------------------------------------------------------
         self.layout = QtGui.QGridLayout()
         self.setLayout(self.layout)
+        self.info_layout = QtGui.QGridLayout()
+        self.info_gbox.setLayout(self.info_layout)
 
-        self.layout.addWidget(self.detector_lbl, 1, 0)
-        self.layout.addWidget(self.detector_txtbox, 1, 1, 1, 3)
-        self.layout.addWidget(self.detector_btn, 1, 4)
-        self.layout.addWidget(self.instrument_lbl, 2, 0)
-        self.layout.addWidget(self.instrument_txtbox, 2, 1, 1, 3)
-        self.layout.addWidget(self.instrument_btn, 2, 4)
-        self.layout.addWidget(self.pixel_count_lbl, 3, 0)
-        self.layout.addWidget(self.pixel_count_nx_sbox, 3, 1)
-        self.layout.addWidget(self.pixel_count_ny_sbox, 3, 2)
-        self.layout.addWidget(self.pixel_count_nz_sbox, 3, 3)
-        self.layout.addWidget(self.dialog_btnbox, 4, 3, 1, 2)
+        self.layout.addWidget(self.info_gbox, 0, 0)
+        self.layout.addWidget(self.plot_widget, 0, 1)
+        self.layout.setColumnStretch(1, 1)
+
+        self.info_layout.addWidget(self.mode_lbl, 0, 0)
+        self.info_layout.addWidget(self.mode_cbox, 0, 1, 1, 3)
+        self.info_layout.addWidget(self.bins_lbl, 1, 0)
+        self.info_layout.addWidget(self.bins_sbox, 1, 1, 1, 3)
+        self.info_layout.addWidget(self.center_lbl, 2, 0)
+        for i, center_sbox in enumerate(self.center_sboxes):
+            self.info_layout.addWidget(center_sbox, 2, i + 1)
+        self.info_layout.addWidget(self.axis_lbl, 3, 0)
+        self.info_layout.addWidget(self.axis_cbox, 3, 1, 1, 3)
+        self.info_layout.addWidget(self.q_range_chkbox, 4, 0)
+        self.info_layout.addWidget(self.q_min_sbox, 4, 1)
+        self.info_layout.addWidget(self.q_max_sbox, 4, 2)
+        self.info_layout.addWidget(self.azimuth_range_chkbox, 5, 0)
+        self.info_layout.addWidget(self.azimuth_min_sbox, 5, 1)
+        self.info_layout.addWidget(self.azimuth_max_sbox, 5, 2)
+        self.info_layout.addWidget(self.ub_chkbox, 6, 0, 1, 4)
+        self.info_layout.addWidget(self.ignore_empty_chkbox, 7, 0, 1, 4)
+        self.info_layout.addWidget(self.integrate_btn, 8, 0, 1, 4)
 
         # Signals --------------------------------------------------------------
-
-        self.detector_btn.clicked.connect(self.selectDetectorConfigFile)
-        self.instrument_btn.clicked.connect(self.selectInstrumentConfigFile)
-        self.dialog_btnbox.accepted.connect(self.accept)
+        self.integrate_btn.clicked.connect(self.integrate)
+        # Bins are cached, so re-masking is cheap
+        self.ignore_empty_chkbox.toggled.connect(self.integrate)
 
     # --------------------------------------------------------------------------
 
-    def selectDetectorConfigFile(self):
+    def integrator(self):
 
         """
-        Allows user to select a detector configuration .xml file.
+        Returns a DatasetIntegrator for the loaded dataset and current settings
         """
 
-        detector = QtGui.QFileDialog.getOpenFileName(self, "", "", "xml Files (*.xml)")
-        self.detector_txtbox.setText(detector[0])
+        q_range, azimuth_range, metric = None, None, None
+
+        if self.q_range_chkbox.isChecked():
+            q_range = (self.q_min_sbox.value(), self.q_max_sbox.value())
+        if self.azimuth_range_chkbox.isChecked():
+            azimuth_range = (self.azimuth_min_sbox.value(), self.azimuth_max_sbox.value())
+        if self.ub_chkbox.isChecked():
+            metric = self.main_widget.vti_creation_dialog.loadScanGeometry().ub_matrix
+
+        return DatasetIntegrator(self.main_widget.data_widget.dataset_rect,
+            mode=self.mode_cbox.currentText(), n_bins=self.bins_sbox.value(),
+            center=[center_sbox.value() for center_sbox in self.center_sboxes],
+            axis=self.axis_cbox.currentIndex(), q_range=q_range,
+            azimuth_range=azimuth_range, metric=metric)
 
     # --------------------------------------------------------------------------
 
-    def selectInstrumentConfigFile(self):
+    def integrate(self):
 
         """
-        Allows user to select an instrument configuration .xml file.
+        Plots the integrated intensity profile
         """
 
-        instrument = QtGui.QFileDialog.getOpenFileName(self, "", "", "xml Files (*.xml)")
-        self.instrument_txtbox.setText(instrument[0])
+        dataset = self.main_widget.data_widget.dataset
+        if len(dataset) == 0:
+            return
 
-    # --------------------------------------------------------------------------
+        try:
+            integrator = self.integrator()
+            mask = dataset > 0 if self.ignore_empty_chkbox.isChecked() else None
+            centers, intensity, counts = integrator.integrate(dataset, mask)
 
-    def accept(self):
+        except Exception as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"Could Not Integrate Dataset: {ex}")
+            msg_box.exec_()
+            return
 
-        """
-        Sets class variables to values in dialog and closes the dialog window.
-        """
+        if integrator.mode == "Azimuth":
+            self.plot_widget.setLabel(axis="bottom", text="Azimuth (°)")
+        elif self.ub_chkbox.isChecked():
+            self.plot_widget.setLabel(axis="bottom", text="|Q| (1/Å)")
+        else:
+            self.plot_widget.setLabel(axis="bottom", text="|Q| (r.l.u.)")
+        self.plot_widget.setLabel(axis="left", text="Average Intensity")
 
-        self.detector_config_name = self.detector_txtbox.text()
-        self.instrument_config_name = self.instrument_txtbox.text()
-        self.pixel_count_nx = self.pixel_count_nx_sbox.value()
-        self.pixel_count_ny = self.pixel_count_ny_sbox.value()
-        self.pixel_count_nz = self.pixel_count_nz_sbox.value()
-        self.close()
+        # Bins no voxel falls in are left out of the plot
+        filled = counts > 0
+        self.plot_widget.plot(centers[filled], intensity[filled], clear=True)
 
 # ==============================================================================
 
-class VTICreationDialog(QtGui.QDialog):
+class CTRWidget(QtGui.QWidget):
 
-    def __init__ (self):
-        super().__init__()
+    """
+    Extracts background-subtracted crystal truncation rods from the loaded
+    dataset for a list of integer (H, K) positions
+    """
 
-        self.setWindowModality(QtCore.Qt.ApplicationModal)
-        self.detector_config_name = ""
-        self.instrument_config_name = ""
-        self.pixel_count_nx = 0
-        self.pixel_count_ny = 0
-        self.pixel_count_nz = 0
+    def __init__ (self, parent):
+        super(CTRWidget, self).__init__(parent)
+        self.main_widget = parent
+
+        self.setEnabled(False)
+        self.extractor = None
+        self.profiles = None
 
         # Widget Creation ------------------------------------------------------
-        self.project_lbl = QtGui.QLabel("Project Directory:")
-        self.project_txtbox = QtGui.QLineEdit()
-        self.project_txtbox.setReadOnly(True)
-        self.project_btn = QtGui.QPushButton("Browse")
-        self.data_source_lbl = QtGui.QLabel("Data Source (SPEC):")
-        self.data_source_txtbox = QtGui.QLineEdit()
-        self.data_source_txtbox.setReadOnly(True)
-        self.data_source_btn = QtGui.QPushButton("Browse")
-        self.selected_scan_lbl = QtGui.QLabel("Selected Scan:")
-        self.selected_scan_cbox = QtGui.QComboBox()
-        self.pixel_count_lbl = QtGui.QLabel("Interpolation (HKL):")
-        self.h_count_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
-        self.h_count_sbox.setValue(200)
-        self.k_count_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
-        self.k_count_sbox.setValue(200)
-        self.l_count_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
-        self.l_count_sbox.setValue(200)
-        self.detector_lbl = QtGui.QLabel("Det. Config:")
-        self.detector_txtbox = QtGui.QLineEdit()
-        self.detector_txtbox.setReadOnly(True)
-        self.detector_btn = QtGui.QPushButton("Browse")
-        self.instrument_lbl = QtGui.QLabel("Instr. Config:")
-        self.instrument_txtbox = QtGui.QLineEdit()
-        self.instrument_txtbox.setReadOnly(True)
-        self.instrument_btn = QtGui.QPushButton("Browse")
-        self.dialog_btnbox = QtGui.QDialogButtonBox()
-        self.dialog_btnbox.addButton("Create", QtGui.QDialogButtonBox.AcceptRole)
+        self.rods_lbl = QtGui.QLabel("Rods (H,K):")
+        self.rods_txtbox = QtGui.QLineEdit()
+        self.rods_txtbox.setPlaceholderText("e.g. 0,0; 1,0; 1,1")
+        self.grid_rods_btn = QtGui.QPushButton("All in Grid")
+        self.window_lbl = QtGui.QLabel("Window (H, K):")
+        self.border_lbl = QtGui.QLabel("Background (H, K):")
+        self.window_sboxes, self.border_sboxes = [], []
+        for sboxes in [self.window_sboxes, self.border_sboxes]:
+            for i in range(2):
+                sbox = QtGui.QDoubleSpinBox()
+                sbox.setMaximum(1)
+                sbox.setDecimals(4)
+                sbox.setSingleStep(0.01)
+                sbox.setValue(0.05)
+                sboxes.append(sbox)
+        self.ignore_empty_chkbox = QtGui.QCheckBox("Ignore Empty Voxels")
+        self.ignore_empty_chkbox.setChecked(True)
+        self.extract_btn = QtGui.QPushButton("Extract")
+        self.export_btn = QtGui.QPushButton("Export")
+        self.export_btn.setEnabled(False)
+
+        self.plot_widget = pg.PlotWidget()
+        self.plot_widget.addLegend()
+
+        # GroupBoxes -----------------------------------------------------------
+        self.info_gbox = QtGui.QGroupBox()
 
         # Layout ---------------------------------------------------------------
         self.layout = QtGui.QGridLayout()
         self.setLayout(self.layout)
+        self.info_layout = QtGui.QGridLayout()
+        self.info_gbox.setLayout(self.info_layout)
 
-        self.layout.addWidget(self.project_lbl, 0, 0, 1, 3)
-        self.layout.addWidget(self.project_txtbox, 0, 3, 1, 3)
-        self.layout.addWidget(self.project_btn, 0, 6, 1, 3)
-        self.layout.addWidget(self.data_source_lbl, 1, 0, 1, 3)
-        self.layout.addWidget(self.data_source_txtbox, 1, 3, 1, 3)
-        self.layout.addWidget(self.data_source_btn, 1, 6, 1, 3)
-        self.layout.addWidget(self.selected_scan_lbl, 2, 0, 1, 4)
-        self.layout.addWidget(self.selected_scan_cbox, 2, 4, 1, 5)
-        self.layout.addWidget(self.pixel_count_lbl, 3, 0, 1, 3)
-        self.layout.addWidget(self.h_count_sbox, 3, 3, 1, 1)
-        self.layout.addWidget(self.k_count_sbox, 3, 5, 1, 1)
-        self.layout.addWidget(self.l_count_sbox, 3, 7, 1, 1)
-        self.layout.addWidget(self.detector_lbl, 4, 0, 1, 3)
-        self.layout.addWidget(self.detector_txtbox, 4, 3, 1, 3)
-        self.layout.addWidget(self.detector_btn, 4, 6, 1, 3)
-        self.layout.addWidget(self.instrument_lbl, 5, 0, 1, 3)
-        self.layout.addWidget(self.instrument_txtbox, 5, 3, 1, 3)
-        self.layout.addWidget(self.instrument_btn, 5, 6, 1, 3)
-
-        self.layout.addWidget(self.dialog_btnbox, 6, 8)
-        self.layout.setColumnStretch(0,1)
-        self.layout.setColumnStretch(1,1)
-        self.layout.setColumnStretch(2,1)
-        self.layout.setColumnStretch(3,1)
-        self.layout.setColumnStretch(4,1)
-        self.layout.setColumnStretch(5,1)
-        self.layout.setColumnStretch(6,1)
-        self.layout.setColumnStretch(7,1)
-        self.layout.setColumnStretch(8,1)
-
+        self.layout.addWidget(self.info_gbox, 0, 0)
+        self.layout.addWidget(self.plot_widget, 0, 1)
+        self.layout.setColumnStretch(1, 1)
+
+        self.info_layout.addWidget(self.rods_lbl, 0, 0)
+        self.info_layout.addWidget(self.rods_txtbox, 0, 1, 1, 2)
+        self.info_layout.addWidget(self.grid_rods_btn, 1, 1, 1, 2)
+        self.info_layout.addWidget(self.window_lbl, 2, 0)
+        self.info_layout.addWidget(self.window_sboxes[0], 2, 1)
+        self.info_layout.addWidget(self.window_sboxes[1], 2, 2)
+        self.info_layout.addWidget(self.border_lbl, 3, 0)
+        self.info_layout.addWidget(self.border_sboxes[0], 3, 1)
+        self.info_layout.addWidget(self.border_sboxes[1], 3, 2)
+        self.info_layout.addWidget(self.ignore_empty_chkbox, 4, 0, 1, 3)
+        self.info_layout.addWidget(self.extract_btn, 5, 0, 1, 2)
+        self.info_layout.addWidget(self.export_btn, 5, 2)
 
         # Signals --------------------------------------------------------------
-
-        self.project_btn.clicked.connect(self.selectProjectDirectory)
-        self.data_source_btn.clicked.connect(self.selectDataSource)
-        self.detector_btn.clicked.connect(self.selectDetectorConfigFile)
-        self.instrument_btn.clicked.connect(self.selectInstrumentConfigFile)
-        self.dialog_btnbox.accepted.connect(self.accept)
+        self.grid_rods_btn.clicked.connect(self.fillGridRods)
+        self.extract_btn.clicked.connect(self.extractRods)
+        self.export_btn.clicked.connect(self.exportRods)
 
     # --------------------------------------------------------------------------
 
-    def selectProjectDirectory(self):
+    def parseRods(self):
 
         """
-        - Opens directory dialog
-        - Sets project directory
+        Returns [(H, K)] from the rods textbox ("h,k; h,k; ...")
         """
 
-        # Selecting a Project Directory ----------------------------------------
-        project_path = QtGui.QFileDialog.getExistingDirectory(self,
-            "Open Project Directory")
-
-        # Adding SPEC Files to a ListBox ---------------------------------------
-        if project_path != "":
-            self.spec_files = []
+        rods = []
+        for rod in self.rods_txtbox.text().split(";"):
+            if rod.strip() != "":
+                h, k = rod.split(",")
+                rods.append((int(round(float(h))), int(round(float(k)))))
 
-            # Adds SPEC file basenames in directory to list
-            for file in os.listdir(project_path):
-                if file.endswith(".spec"):
-                    self.project_path = project_path
-                    self.project_txtbox.setText(self.project_path)
+        return rods
 
     # --------------------------------------------------------------------------
 
-    def selectDataSource(self):
+    def fillGridRods(self):
 
         """
-        Allows user to select a detector configuration .xml file.
+        Lists every integer (H, K) rod inside the loaded dataset
         """
 
-        self.data_source_path = QtGui.QFileDialog.getOpenFileName(self, "", "", "SPEC Files (*.spec)")[0]
-        self.data_source_txtbox.setText(self.data_source_path)
-
-        self.scan_list = []
-        file = open(self.data_source_path,"r")
-        for line in file:
-            if line.startswith("#S"):
-                scan = line.split()[1]
-                if len(scan) < 3:
-                    scan = ("00" + scan)[-3:]
-                self.scan_list.append(scan)
-
-        self.selected_scan_cbox.clear()
-        self.selected_scan_cbox.addItems(self.scan_list)
+        rods = CTRExtractor.gridRods(self.main_widget.data_widget.dataset_rect)
+        self.rods_txtbox.setText("; ".join(f"{h},{k}" for h, k in rods))
 
     # --------------------------------------------------------------------------
 
-    def selectDetectorConfigFile(self):
+    def extractRods(self):
 
         """
-        Allows user to select a detector configuration .xml file.
+        Extracts and plots background-subtracted intensity vs L for every rod
         """
 
-        self.detector_path = QtGui.QFileDialog.getOpenFileName(self, "", "", "xml Files (*.xml)")[0]
-        self.detector_txtbox.setText(self.detector_path)
-
+        dataset = self.main_widget.data_widget.dataset
+        if len(dataset) == 0:
+            return
+
+        try:
+            rods = self.parseRods()
+            if len(rods) == 0:
+                raise ValueError("No rods given")
+
+            self.extractor = CTRExtractor(self.main_widget.data_widget.dataset_rect,
+                rods, window=[sbox.value() for sbox in self.window_sboxes],
+                border=[sbox.value() for sbox in self.border_sboxes])
+            mask = dataset > 0 if self.ignore_empty_chkbox.isChecked() else None
+            self.profiles = self.extractor.extract(dataset, mask)
+
+        except Exception as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"Could Not Extract Rods: {ex}")
+            msg_box.exec_()
+            return
+
+        intensity = self.profiles[0]
+        l_values = self.extractor.axes[2]
+
+        self.plot_widget.clear()
+        self.plot_widget.setLabel(axis="bottom", text="L")
+        self.plot_widget.setLabel(axis="left", text="Intensity")
+        for i, (h, k) in enumerate(rods):
+            self.plot_widget.plot(l_values, intensity[i], pen=(i, len(rods)),
+                name=f"({h}, {k})")
+
+        self.export_btn.setEnabled(True)
+
+    # --------------------------------------------------------------------------
+
+    def exportRods(self):
+
+        """
+        Writes the extracted rods to an HDF5 file
+        """
+
+        file_path = QtGui.QFileDialog.getSaveFileName(self, "", "", "(*.hdf)")[0]
+        if file_path == "":
+            return
+
+        try:
+            self.extractor.save(file_path, *self.profiles)
+        except Exception as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"Could Not Create File: {ex}")
+            msg_box.exec_()
+
+# ==============================================================================
+
+class PeakWidget(QtGui.QWidget):
+
+    """
+    Finds local maxima in the loaded dataset and lists them in a sortable
+    table. Selecting a peak shows its slice and centres ROI 1 on it. Found
+    peaks can be fitted with 3D peak models in parallel.
+    """
+
+    def __init__ (self, parent):
+        super(PeakWidget, self).__init__(parent)
+        self.main_widget = parent
+
+        self.setEnabled(False)
+        self.indices = None
+        self.table = None
+
+        # Peak searches and fits run on a worker thread; once the Future
+        # polled by peak_timer is done, its result goes to peak_callback
+        # (dropped if another dataset was loaded meanwhile)
+        self.peak_driver = ThreadPoolExecutor(max_workers=1)
+        self.peak_future = None
+        self.peak_dataset = None
+        self.peak_callback = None
+        self.peak_error = ""
+        self.peak_timer = QtCore.QTimer()
+        self.peak_interval = 100
+
+        # Widget Creation ------------------------------------------------------
+        self.threshold_lbl = QtGui.QLabel("Threshold (% Max):")
+        self.threshold_sbox = QtGui.QDoubleSpinBox()
+        self.threshold_sbox.setRange(0, 100)
+        self.threshold_sbox.setDecimals(3)
+        self.threshold_sbox.setValue(10)
+        self.size_lbl = QtGui.QLabel("Neighbourhood:")
+        self.size_sbox = QtGui.QSpinBox(maximum=21, minimum=3)
+        self.size_sbox.setSingleStep(2)
+        self.find_btn = QtGui.QPushButton("Find Peaks")
+        self.count_lbl = QtGui.QLabel("Peaks:")
+        self.count_txtbox = QtGui.QLineEdit()
+        self.count_txtbox.setReadOnly(True)
+        self.model_lbl = QtGui.QLabel("Model:")
+        self.model_cbox = QtGui.QComboBox()
+        self.model_cbox.addItems(PeakFitter.MODELS)
+        self.radius_lbl = QtGui.QLabel("Fit Radius (Voxels):")
+        self.radius_sbox = QtGui.QSpinBox(maximum=50, minimum=1)
+        self.radius_sbox.setValue(4)
+        self.fit_btn = QtGui.QPushButton("Fit Peaks")
+        self.fit_btn.setEnabled(False)
+        self.rate_lbl = QtGui.QLabel("Peaks/s:")
+        self.rate_txtbox = QtGui.QLineEdit()
+        self.rate_txtbox.setReadOnly(True)
+
+        self.peak_table = QtGui.QTableWidget(0, len(PeakFinder.COLUMNS))
+        self.peak_table.setHorizontalHeaderLabels(PeakFinder.COLUMNS)
+        self.fit_table = QtGui.QTableWidget(0, len(PeakFitter.COLUMNS))
+        self.fit_table.setHorizontalHeaderLabels(PeakFitter.COLUMNS)
+        for table in [self.peak_table, self.fit_table]:
+            table.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+            table.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
+            table.setSelectionMode(QtGui.QAbstractItemView.SingleSelection)
+        self.table_tabs = QtGui.QTabWidget()
+        self.table_tabs.addTab(self.peak_table, "Peaks")
+        self.table_tabs.addTab(self.fit_table, "Fits")
+
+        # GroupBoxes -----------------------------------------------------------
+        self.info_gbox = QtGui.QGroupBox()
+
+        # Layout ---------------------------------------------------------------
+        self.layout = QtGui.QGridLayout()
+        self.setLayout(self.layout)
+        self.info_layout = QtGui.QGridLayout()
+        self.info_gbox.setLayout(self.info_layout)
+
+        self.layout.addWidget(self.info_gbox, 0, 0)
+        self.layout.addWidget(self.table_tabs, 0, 1)
+        self.layout.setColumnStretch(1, 1)
+
+        self.info_layout.addWidget(self.threshold_lbl, 0, 0)
+        self.info_layout.addWidget(self.threshold_sbox, 0, 1)
+        self.info_layout.addWidget(self.size_lbl, 1, 0)
+        self.info_layout.addWidget(self.size_sbox, 1, 1)
+        self.info_layout.addWidget(self.find_btn, 2, 0, 1, 2)
+        self.info_layout.addWidget(self.count_lbl, 3, 0)
+        self.info_layout.addWidget(self.count_txtbox, 3, 1)
+        self.info_layout.addWidget(self.model_lbl, 4, 0)
+        self.info_layout.addWidget(self.model_cbox, 4, 1)
+        self.info_layout.addWidget(self.radius_lbl, 5, 0)
+        self.info_layout.addWidget(self.radius_sbox, 5, 1)
+        self.info_layout.addWidget(self.fit_btn, 6, 0, 1, 2)
+        self.info_layout.addWidget(self.rate_lbl, 7, 0)
+        self.info_layout.addWidget(self.rate_txtbox, 7, 1)
+
+        # Signals --------------------------------------------------------------
+        self.find_btn.clicked.connect(self.findPeaks)
+        self.fit_btn.clicked.connect(self.fitPeaks)
+        self.peak_table.cellClicked.connect(self.showPeak)
+        self.fit_table.cellClicked.connect(self.showPeak)
+        self.peak_timer.timeout.connect(self.updatePeakTask)
+
+    # --------------------------------------------------------------------------
+
+    def startPeakTask(self, error_text, callback, function, *args):
+
+        """
+        Runs a peak search/fit in the background; the buttons stay disabled
+        until it finishes
+        """
+
+        self.find_btn.setEnabled(False)
+        self.fit_btn.setEnabled(False)
+        self.peak_dataset = self.main_widget.data_widget.dataset
+        self.peak_error = error_text
+        self.peak_callback = callback
+        self.peak_future = self.peak_driver.submit(function, *args)
+        self.peak_timer.start(self.peak_interval)
+
+    # --------------------------------------------------------------------------
+
+    def updatePeakTask(self):
+
+        """
+        Hands a finished search/fit to its callback, or reports its error
+        """
+
+        if self.peak_future is None or not self.peak_future.done():
+            return
+
+        self.peak_timer.stop()
+        self.find_btn.setEnabled(True)
+        self.fit_btn.setEnabled(self.table is not None and len(self.table) > 0)
+
+        try:
+            result = self.peak_future.result()
+        except Exception as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"{self.peak_error}: {ex}")
+            msg_box.exec_()
+            return
+
+        if self.peak_dataset is self.main_widget.data_widget.dataset:
+            self.peak_callback(result)
+
+    # --------------------------------------------------------------------------
+
+    def findPeaks(self):
+
+        """
+        Starts searching the dataset for peaks
+        """
+
+        dataset = self.main_widget.data_widget.dataset
+        if len(dataset) == 0:
+            return
+
+        rect = self.main_widget.data_widget.dataset_rect
+        fraction = self.threshold_sbox.value() / 100
+        size = self.size_sbox.value()
+
+        self.startPeakTask("Could Not Find Peaks", self.showPeaks,
+            lambda: PeakFinder.findPeaks(dataset, rect, np.nanmax(dataset) * fraction, size))
+
+    # --------------------------------------------------------------------------
+
+    def showPeaks(self, result):
+
+        """
+        Fills the peak table with found peaks
+        """
+
+        self.indices, self.table = result
+
+        PeakWidget.fillTable(self.peak_table, self.table)
+        PeakWidget.fillTable(self.fit_table, np.zeros((0, len(PeakFitter.COLUMNS))))
+        self.table_tabs.setCurrentWidget(self.peak_table)
+        self.count_txtbox.setText(str(len(self.table)))
+        self.rate_txtbox.setText("")
+        self.fit_btn.setEnabled(len(self.table) > 0)
+
+    # --------------------------------------------------------------------------
+
+    def fitPeaks(self):
+
+        """
+        Starts fitting every found peak
+        """
+
+        dataset = self.main_widget.data_widget.dataset
+        radius = [self.radius_sbox.value()] * 3
+
+        self.startPeakTask("Could Not Fit Peaks", self.showFits, PeakFitter.fitPeaks,
+            dataset, self.main_widget.data_widget.dataset_rect, self.indices,
+            self.model_cbox.currentText(), radius)
+
+    # --------------------------------------------------------------------------
+
+    def showFits(self, result):
+
+        """
+        Fills the fit table with the peaks' fits
+        """
+
+        fits, rate = result
+
+        PeakWidget.fillTable(self.fit_table, fits)
+        self.table_tabs.setCurrentWidget(self.fit_table)
+        self.rate_txtbox.setText(str(round(rate, 1)))
+
+    # --------------------------------------------------------------------------
+
+    def fillTable(table_widget, rows):
+
+        """
+        Fills a table with numeric (sortable) rows; each row remembers its
+        peak
+        """
+
+        table_widget.setSortingEnabled(False)
+        table_widget.setRowCount(len(rows))
+        for row, peak in enumerate(rows):
+            for column, value in enumerate(peak):
+                item = QtGui.QTableWidgetItem()
+                item.setData(QtCore.Qt.DisplayRole, float(round(value, 5)))
+                item.setData(QtCore.Qt.UserRole, row)
+                table_widget.setItem(row, column, item)
+        table_widget.setSortingEnabled(True)
+
+    # --------------------------------------------------------------------------
+
+    def showPeak(self, row, column=0):
+
+        """
+        Moves the DataWidget to the peak's slice and centres ROI 1 on it
+        """
+
+        peak = self.table_tabs.currentWidget().item(row, 0).data(QtCore.Qt.UserRole)
+        index, hkl, extent = self.indices[peak], self.table[peak][:3], self.table[peak][6:9]
+
+        data_widget = self.main_widget.data_widget
+        rect = data_widget.dataset_rect
+        slice_direction = data_widget.slice_direction
+
+        if slice_direction == None or slice_direction == "X(H)":
+            x_dir, y_dir, t_dir = 2, 1, 0
+        elif slice_direction == "Y(K)":
+            x_dir, y_dir, t_dir = 2, 0, 1
+        else:
+            x_dir, y_dir, t_dir = 1, 0, 2
+
+        data_widget.setCurrentIndex(int(index[t_dir]))
+
+        # ROI spans the peak's region (at least a few voxels)
+        roi_widget = self.main_widget.roi_analysis_widget.roi_1
+        if not roi_widget.visible_chkbox.isChecked():
+            roi_widget.visible_chkbox.setChecked(True)
+            roi_widget.toggleVisibility(True)
+
+        steps = [abs(rect[axis][1] - rect[axis][0]) if len(rect[axis]) > 1 else 0 \
+            for axis in range(3)]
+        roi_widget.width_sbox.setValue(max(extent[x_dir], 3 * steps[x_dir]))
+        roi_widget.height_sbox.setValue(max(extent[y_dir], 3 * steps[y_dir]))
+        roi_widget.x_sbox.setValue(hkl[x_dir])
+        roi_widget.y_sbox.setValue(hkl[y_dir])
+
+# ==============================================================================
+
+class ObliqueSliceWidget(QtGui.QWidget):
+
+    """
+    Displays a slice of the loaded dataset on an arbitrary plane, spanned by
+    two HKL vectors and shifted along its normal with a slider. Slices are
+    interpolated off the GUI thread; only the latest request is shown.
+    """
+
+    def __init__ (self, parent):
+        super(ObliqueSliceWidget, self).__init__(parent)
+        self.main_widget = parent
+
+        self.setEnabled(False)
+        self.slicer = ObliqueSlicer()
+        self.dataset = None
+        self.norm = None
+
+        # Polls the latest slice request
+        self.slice_future = None
+        self.slice_timer = QtCore.QTimer()
+        self.slice_interval = 30
+
+        # Widget Creation ------------------------------------------------------
+        self.u_lbl = QtGui.QLabel("u (HKL):")
+        self.v_lbl = QtGui.QLabel("v (HKL):")
+        self.origin_lbl = QtGui.QLabel("Origin (HKL):")
+        self.u_sboxes, self.v_sboxes, self.origin_sboxes = [], [], []
+        for sboxes, values in [(self.u_sboxes, (1, 1, 0)), (self.v_sboxes, (0, 0, 1)),
+            (self.origin_sboxes, (0, 0, 0))]:
+            for value in values:
+                sbox = QtGui.QDoubleSpinBox()
+                sbox.setMinimum(-1000)
+                sbox.setMaximum(1000)
+                sbox.setDecimals(4)
+                sbox.setValue(value)
+                sboxes.append(sbox)
+        self.center_btn = QtGui.QPushButton("Center")
+        self.offset_lbl = QtGui.QLabel("Offset:")
+        self.offset_sldr = QtGui.QSlider(QtCore.Qt.Horizontal)
+        self.offset_sldr.setRange(-500, 500)
+        self.offset_txtbox = QtGui.QLineEdit()
+        self.offset_txtbox.setReadOnly(True)
+        self.resolution_lbl = QtGui.QLabel("Resolution:")
+        self.resolution_sbox = QtGui.QSpinBox(maximum=2000, minimum=10)
+        self.resolution_sbox.setValue(200)
+
+        self.plot_widget = pg.PlotWidget()
+        self.image_item = pg.ImageItem()
+        self.plot_widget.addItem(self.image_item)
+
+        # GroupBoxes -----------------------------------------------------------
+        self.info_gbox = QtGui.QGroupBox()
+
+        # Layout ---------------------------------------------------------------
+        self.layout = QtGui.QGridLayout()
+        self.setLayout(self.layout)
+        self.info_layout = QtGui.QGridLayout()
+        self.info_gbox.setLayout(self.info_layout)
+
+        self.layout.addWidget(self.info_gbox, 0, 0)
+        self.layout.addWidget(self.plot_widget, 0, 1)
+        self.layout.setColumnStretch(1, 1)
+
+        for row, (lbl, sboxes) in enumerate([(self.u_lbl, self.u_sboxes),
+            (self.v_lbl, self.v_sboxes), (self.origin_lbl, self.origin_sboxes)]):
+            self.info_layout.addWidget(lbl, row, 0)
+            for i, sbox in enumerate(sboxes):
+                self.info_layout.addWidget(sbox, row, i + 1)
+        self.info_layout.addWidget(self.center_btn, 3, 1, 1, 3)
+        self.info_layout.addWidget(self.offset_lbl, 4, 0)
+        self.info_layout.addWidget(self.offset_sldr, 4, 1, 1, 2)
+        self.info_layout.addWidget(self.offset_txtbox, 4, 3)
+        self.info_layout.addWidget(self.resolution_lbl, 5, 0)
+        self.info_layout.addWidget(self.resolution_sbox, 5, 1, 1, 3)
+
+        # Signals --------------------------------------------------------------
+        for sbox in self.u_sboxes + self.v_sboxes + self.origin_sboxes:
+            sbox.valueChanged.connect(self.requestSlice)
+        self.center_btn.clicked.connect(self.center)
+        self.offset_sldr.valueChanged.connect(self.requestSlice)
+        self.resolution_sbox.valueChanged.connect(self.requestSlice)
+        self.slice_timer.timeout.connect(self.updateSlice)
+
+    # --------------------------------------------------------------------------
+
+    def center(self):
+
+        """
+        Moves the plane's origin to the centre of the dataset
+        """
+
+        rect = self.main_widget.data_widget.dataset_rect
+
+        for sbox, values in zip(self.origin_sboxes, rect):
+            sbox.setValue((values[0] + values[-1]) / 2)
+        self.offset_sldr.setValue(0)
+
+    # --------------------------------------------------------------------------
+
+    def planeOrigin(self):
+
+        """
+        Returns the origin shifted along the plane's unit normal by the
+        slider (full range: half the dataset's diagonal either way)
+        """
+
+        rect = self.main_widget.data_widget.dataset_rect
+        u = np.array([sbox.value() for sbox in self.u_sboxes])
+        v = np.array([sbox.value() for sbox in self.v_sboxes])
+        origin = np.array([sbox.value() for sbox in self.origin_sboxes])
+
+        normal = np.cross(u, v)
+        if np.linalg.norm(normal) > 0:
+            normal = normal / np.linalg.norm(normal)
+        diagonal = np.linalg.norm([values[-1] - values[0] for values in rect])
+        offset = self.offset_sldr.value() / self.offset_sldr.maximum() * diagonal / 2
+        self.offset_txtbox.setText(str(round(offset, 5)))
+
+        return origin + offset * normal, u, v
+
+    # --------------------------------------------------------------------------
+
+    def requestSlice(self):
+
+        """
+        Starts slicing the current plane; earlier requests are dropped
+        """
+
+        dataset = self.main_widget.data_widget.dataset
+        if len(dataset) == 0:
+            return
+
+        # Colormap matches the DataWidget's (log scale up to the max)
+        if dataset is not self.dataset:
+            self.dataset = dataset
+            self.norm = colors.LogNorm()
+            self.norm.autoscale_None(np.ravel(dataset))
+
+        origin, u, v = self.planeOrigin()
+        resolution = self.resolution_sbox.value()
+
+        # Vectors are often briefly parallel while being edited
+        if np.linalg.norm(np.cross(u, v)) == 0:
+            return
+
+        self.slice_future = self.slicer.submit(dataset,
+            self.main_widget.data_widget.dataset_rect, origin, u, v,
+            (resolution, resolution))
+        if not self.slice_timer.isActive():
+            self.slice_timer.start(self.slice_interval)
+
+    # --------------------------------------------------------------------------
+
+    def updateSlice(self):
+
+        """
+        Displays the latest slice once it's done
+        """
+
+        if self.slice_future is None or not self.slice_future.done():
+            return
+
+        self.slice_timer.stop()
+        if self.slice_future.cancelled():
+            return
+
+        try:
+            result = self.slice_future.result()
+        except Exception as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"Could Not Slice Dataset: {ex}")
+            msg_box.exec_()
+            return
+
+        if result is None:
+            return
+
+        image, ((s_min, s_max), (t_min, t_max)) = result
+        self.image_item.setImage(plt.cm.jet(self.norm(image)))
+        self.image_item.setRect(QtCore.QRectF(s_min, t_min, s_max - s_min, t_max - t_min))
+
+        u = tuple(sbox.value() for sbox in self.u_sboxes)
+        v = tuple(sbox.value() for sbox in self.v_sboxes)
+        self.plot_widget.setLabel(axis="bottom", text=f"u = {u}")
+        self.plot_widget.setLabel(axis="left", text=f"v = {v}")
+
+# ==============================================================================
+
+class ConversionParametersDialog(QtGui.QDialog):
+
+    """
+    Houses dialog where user selects pixel interpolation values and config files for conversion
+    """
+
+    def __init__ (self):
+        super().__init__()
+
+        self.setWindowModality(QtCore.Qt.ApplicationModal)
+        self.detector_config_name = ""
+        self.instrument_config_name = ""
+        self.pixel_count_nx = 0
+        self.pixel_count_ny = 0
+        self.pixel_count_nz = 0
+
+        # Widget Creation ------------------------------------------------------
+        self.detector_lbl = QtGui.QLabel("Det. Config:")
+        self.detector_txtbox = QtGui.QLineEdit()
+        self.detector_txtbox.setReadOnly(True)
+        self.detector_btn = QtGui.QPushButton("Browse")
+        self.instrument_lbl = QtGui.QLabel("Instr. Config:")
+        self.instrument_txtbox = QtGui.QLineEdit()
+        self.instrument_txtbox.setReadOnly(True)
+        self.instrument_btn = QtGui.QPushButton("Browse")
+        self.pixel_count_lbl = QtGui.QLabel("Pixel Count:")
+        self.pixel_count_nx_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
+        self.pixel_count_nx_sbox.setValue(200)
+        self.pixel_count_ny_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
+        self.pixel_count_ny_sbox.setValue(200)
+        self.pixel_count_nz_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
+        self.pixel_count_nz_sbox.setValue(200)
+        self.dialog_btnbox = QtGui.QDialogButtonBox()
+        self.dialog_btnbox.addButton("OK", QtGui.QDialogButtonBox.AcceptRole)
+
+        # Layout ---------------------------------------------------------------
+        self.layout = QtGui.QGridLayout()
+        self.setLayout(self.layout)
+
+        self.layout.addWidget(self.detector_lbl, 1, 0)
+        self.layout.addWidget(self.detector_txtbox, 1, 1, 1, 3)
+        self.layout.addWidget(self.detector_btn, 1, 4)
+        self.layout.addWidget(self.instrument_lbl, 2, 0)
+        self.layout.addWidget(self.instrument_txtbox, 2, 1, 1, 3)
+        self.layout.addWidget(self.instrument_btn, 2, 4)
+        self.layout.addWidget(self.pixel_count_lbl, 3, 0)
+        self.layout.addWidget(self.pixel_count_nx_sbox, 3, 1)
+        self.layout.addWidget(self.pixel_count_ny_sbox, 3, 2)
+        self.layout.addWidget(self.pixel_count_nz_sbox, 3, 3)
+        self.layout.addWidget(self.dialog_btnbox, 4, 3, 1, 2)
+
+        # Signals --------------------------------------------------------------
+
+        self.detector_btn.clicked.connect(self.selectDetectorConfigFile)
+        self.instrument_btn.clicked.connect(self.selectInstrumentConfigFile)
+        self.dialog_btnbox.accepted.connect(self.accept)
+
+    # --------------------------------------------------------------------------
+
+    def selectDetectorConfigFile(self):
+
+        """
+        Allows user to select a detector configuration .xml file.
+        """
+
+        detector = QtGui.QFileDialog.getOpenFileName(self, "", "", "xml Files (*.xml)")
+        self.detector_txtbox.setText(detector[0])
+
+    # --------------------------------------------------------------------------
+
+    def selectInstrumentConfigFile(self):
+
+        """
+        Allows user to select an instrument configuration .xml file.
+        """
+
+        instrument = QtGui.QFileDialog.getOpenFileName(self, "", "", "xml Files (*.xml)")
+        self.instrument_txtbox.setText(instrument[0])
+
+    # --------------------------------------------------------------------------
+
+    def accept(self):
+
+        """
+        Sets class variables to values in dialog and closes the dialog window.
+        """
+
+        self.detector_config_name = self.detector_txtbox.text()
+        self.instrument_config_name = self.instrument_txtbox.text()
+        self.pixel_count_nx = self.pixel_count_nx_sbox.value()
+        self.pixel_count_ny = self.pixel_count_ny_sbox.value()
+        self.pixel_count_nz = self.pixel_count_nz_sbox.value()
+        self.close()
+
+# ==============================================================================
+
+class VTICreationDialog(QtGui.QDialog):
+
+    def __init__ (self):
+        super().__init__()
+
+        self.setWindowModality(QtCore.Qt.ApplicationModal)
+        self.detector_config_name = ""
+        self.instrument_config_name = ""
+        self.pixel_count_nx = 0
+        self.pixel_count_ny = 0
+        self.pixel_count_nz = 0
+
+        # Widget Creation ------------------------------------------------------
+        self.project_lbl = QtGui.QLabel("Project Directory:")
+        self.project_txtbox = QtGui.QLineEdit()
+        self.project_txtbox.setReadOnly(True)
+        self.project_btn = QtGui.QPushButton("Browse")
+        self.data_source_lbl = QtGui.QLabel("Data Source (SPEC):")
+        self.data_source_txtbox = QtGui.QLineEdit()
+        self.data_source_txtbox.setReadOnly(True)
+        self.data_source_btn = QtGui.QPushButton("Browse")
+        self.selected_scan_lbl = QtGui.QLabel("Selected Scan:")
+        self.selected_scan_cbox = QtGui.QComboBox()
+        self.merge_scans_chkbox = QtGui.QCheckBox("Merge Scans:")
+        self.merge_scans_txtbox = QtGui.QLineEdit()
+        self.merge_scans_txtbox.setPlaceholderText("e.g. 840,842-845")
+        self.merge_scans_txtbox.setEnabled(False)
+        self.pixel_count_lbl = QtGui.QLabel("Interpolation (HKL):")
+        self.h_count_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
+        self.h_count_sbox.setValue(200)
+        self.k_count_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
+        self.k_count_sbox.setValue(200)
+        self.l_count_sbox = QtGui.QSpinBox(maximum=1000, minimum=1)
+        self.l_count_sbox.setValue(200)
+        self.recommend_btn = QtGui.QPushButton("Recommend")
+        self.normalize_chkbox = QtGui.QCheckBox("Normalize (Monitor/Filter)")
+        self.normalize_chkbox.setChecked(True)
+        self.keep_raw_chkbox = QtGui.QCheckBox("Keep Raw Counts")
+        self.memory_lbl = QtGui.QLabel("Est. Memory:")
+        self.memory_txtbox = QtGui.QLineEdit()
+        self.memory_txtbox.setReadOnly(True)
+        self.empty_voxels_lbl = QtGui.QLabel("Est. Empty Voxels:")
+        self.empty_voxels_txtbox = QtGui.QLineEdit()
+        self.empty_voxels_txtbox.setReadOnly(True)
+        self.estimate_btn = QtGui.QPushButton("Estimate")
+        self.detector_lbl = QtGui.QLabel("Det. Config:")
+        self.detector_txtbox = QtGui.QLineEdit()
+        self.detector_txtbox.setReadOnly(True)
+        self.detector_btn = QtGui.QPushButton("Browse")
+        self.instrument_lbl = QtGui.QLabel("Instr. Config:")
+        self.instrument_txtbox = QtGui.QLineEdit()
+        self.instrument_txtbox.setReadOnly(True)
+        self.instrument_btn = QtGui.QPushButton("Browse")
+        self.projection_lbl = QtGui.QLabel("Projection:")
+        self.projection_cbox = QtGui.QComboBox()
+        self.projection_cbox.addItems(["None (3D Grid)", "H-K", "H-L", "K-L", "|Q|"])
+        self.q_count_sbox = QtGui.QSpinBox(maximum=10000, minimum=1)
+        self.q_count_sbox.setValue(500)
+        self.q_count_sbox.setToolTip("|Q| Bins")
+        self.q_count_sbox.setEnabled(False)
+        self.projection_range_chkbox = QtGui.QCheckBox("Projection Range:")
+        self.projection_range_chkbox.setEnabled(False)
+        self.projection_range_lbls = [QtGui.QLabel("") for i in range(2)]
+        self.projection_min_sboxes = [QtGui.QDoubleSpinBox() for i in range(2)]
+        self.projection_max_sboxes = [QtGui.QDoubleSpinBox() for i in range(2)]
+        for sbox in self.projection_min_sboxes + self.projection_max_sboxes:
+            sbox.setRange(-1000, 1000)
+            sbox.setDecimals(4)
+            sbox.setSingleStep(0.01)
+            sbox.setEnabled(False)
+        for sbox in self.projection_min_sboxes:
+            sbox.setToolTip("Min")
+        for sbox in self.projection_max_sboxes:
+            sbox.setToolTip("Max")
+        self.live_btn = QtGui.QPushButton("Grid Live")
+        self.dialog_btnbox = QtGui.QDialogButtonBox()
+        self.dialog_btnbox.addButton("Create", QtGui.QDialogButtonBox.AcceptRole)
+
+        # Layout ---------------------------------------------------------------
+        self.layout = QtGui.QGridLayout()
+        self.setLayout(self.layout)
+
+        self.layout.addWidget(self.project_lbl, 0, 0, 1, 3)
+        self.layout.addWidget(self.project_txtbox, 0, 3, 1, 3)
+        self.layout.addWidget(self.project_btn, 0, 6, 1, 3)
+        self.layout.addWidget(self.data_source_lbl, 1, 0, 1, 3)
+        self.layout.addWidget(self.data_source_txtbox, 1, 3, 1, 3)
+        self.layout.addWidget(self.data_source_btn, 1, 6, 1, 3)
+        self.layout.addWidget(self.selected_scan_lbl, 2, 0, 1, 4)
+        self.layout.addWidget(self.selected_scan_cbox, 2, 4, 1, 5)
+        self.layout.addWidget(self.merge_scans_chkbox, 3, 0, 1, 4)
+        self.layout.addWidget(self.merge_scans_txtbox, 3, 4, 1, 5)
+        self.layout.addWidget(self.pixel_count_lbl, 4, 0, 1, 3)
+        self.layout.addWidget(self.h_count_sbox, 4, 3, 1, 1)
+        self.layout.addWidget(self.k_count_sbox, 4, 5, 1, 1)
+        self.layout.addWidget(self.l_count_sbox, 4, 7, 1, 1)
+        self.layout.addWidget(self.recommend_btn, 4, 8, 1, 1)
+        self.layout.addWidget(self.normalize_chkbox, 9, 0, 1, 4)
+        self.layout.addWidget(self.keep_raw_chkbox, 9, 4, 1, 2)
+        self.layout.addWidget(self.detector_lbl, 5, 0, 1, 3)
+        self.layout.addWidget(self.detector_txtbox, 5, 3, 1, 3)
+        self.layout.addWidget(self.detector_btn, 5, 6, 1, 3)
+        self.layout.addWidget(self.instrument_lbl, 6, 0, 1, 3)
+        self.layout.addWidget(self.instrument_txtbox, 6, 3, 1, 3)
+        self.layout.addWidget(self.instrument_btn, 6, 6, 1, 3)
+        self.layout.addWidget(self.memory_lbl, 7, 0, 1, 3)
+        self.layout.addWidget(self.memory_txtbox, 7, 3, 1, 3)
+        self.layout.addWidget(self.empty_voxels_lbl, 8, 0, 1, 3)
+        self.layout.addWidget(self.empty_voxels_txtbox, 8, 3, 1, 3)
+        self.layout.addWidget(self.estimate_btn, 8, 6, 1, 3)
+
+        self.layout.addWidget(self.projection_lbl, 10, 0, 1, 3)
+        self.layout.addWidget(self.projection_cbox, 10, 3, 1, 3)
+        self.layout.addWidget(self.q_count_sbox, 10, 6, 1, 1)
+        self.layout.addWidget(self.projection_range_chkbox, 11, 0, 1, 3)
+        for i in range(2):
+            self.layout.addWidget(self.projection_range_lbls[i], 11, 3 + 3 * i)
+            self.layout.addWidget(self.projection_min_sboxes[i], 11, 4 + 3 * i)
+            self.layout.addWidget(self.projection_max_sboxes[i], 11, 5 + 3 * i)
+
+        self.layout.addWidget(self.live_btn, 12, 6, 1, 2)
+        self.layout.addWidget(self.dialog_btnbox, 12, 8)
+        self.layout.setColumnStretch(0,1)
+        self.layout.setColumnStretch(1,1)
+        self.layout.setColumnStretch(2,1)
+        self.layout.setColumnStretch(3,1)
+        self.layout.setColumnStretch(4,1)
+        self.layout.setColumnStretch(5,1)
+        self.layout.setColumnStretch(6,1)
+        self.layout.setColumnStretch(7,1)
+        self.layout.setColumnStretch(8,1)
+
+
+        # Signals --------------------------------------------------------------
+
+        self.project_btn.clicked.connect(self.selectProjectDirectory)
+        self.data_source_btn.clicked.connect(self.selectDataSource)
+        self.detector_btn.clicked.connect(self.selectDetectorConfigFile)
+        self.instrument_btn.clicked.connect(self.selectInstrumentConfigFile)
+        self.merge_scans_chkbox.toggled.connect(self.merge_scans_txtbox.setEnabled)
+        self.recommend_btn.clicked.connect(self.recommendGridSize)
+        self.estimate_btn.clicked.connect(self.estimateEmptyVoxels)
+        self.h_count_sbox.valueChanged.connect(self.updateMemoryEstimate)
+        self.k_count_sbox.valueChanged.connect(self.updateMemoryEstimate)
+        self.l_count_sbox.valueChanged.connect(self.updateMemoryEstimate)
+        self.projection_cbox.currentTextChanged.connect(self.updateProjectionControls)
+        self.projection_range_chkbox.toggled.connect(self.updateProjectionControls)
+        self.dialog_btnbox.accepted.connect(self.accept)
+
+        # Scan geometry/sampling used for grid planning; set on first estimate
+        self.scan_geometry = None
+        self.scan_bounds = None
+        self.updateMemoryEstimate()
+
+        # Conversions run on a worker thread; the dialog stays disabled until
+        # the Future polled by conversion_timer is done
+        self.conversion_driver = ThreadPoolExecutor(max_workers=1)
+        self.conversion_future = None
+        self.conversion_error = ""
+        self.conversion_timer = QtCore.QTimer()
+        self.conversion_interval = 250
+        self.conversion_timer.timeout.connect(self.updateConversion)
+
+    # --------------------------------------------------------------------------
+
+    def selectProjectDirectory(self):
+
+        """
+        - Opens directory dialog
+        - Sets project directory
+        """
+
+        # Selecting a Project Directory ----------------------------------------
+        project_path = QtGui.QFileDialog.getExistingDirectory(self,
+            "Open Project Directory")
+
+        # Adding SPEC Files to a ListBox ---------------------------------------
+        if project_path != "":
+            self.spec_files = []
+
+            # Adds SPEC file basenames in directory to list
+            for file in os.listdir(project_path):
+                if file.endswith(".spec"):
+                    self.project_path = project_path
+                    self.project_txtbox.setText(self.project_path)
+
+    # --------------------------------------------------------------------------
+
+    def selectDataSource(self):
+
+        """
+        Allows user to select a detector configuration .xml file.
+        """
+
+        self.data_source_path = QtGui.QFileDialog.getOpenFileName(self, "", "", "SPEC Files (*.spec)")[0]
+        self.data_source_txtbox.setText(self.data_source_path)
+
+        self.scan_list = []
+        file = open(self.data_source_path,"r")
+        for line in file:
+            if line.startswith("#S"):
+                scan = line.split()[1]
+                if len(scan) < 3:
+                    scan = ("00" + scan)[-3:]
+                self.scan_list.append(scan)
+
+        self.selected_scan_cbox.clear()
+        self.selected_scan_cbox.addItems(self.scan_list)
+
+    # --------------------------------------------------------------------------
+
+    def selectDetectorConfigFile(self):
+
+        """
+        Allows user to select a detector configuration .xml file.
+        """
+
+        self.detector_path = QtGui.QFileDialog.getOpenFileName(self, "", "", "xml Files (*.xml)")[0]
+        self.detector_txtbox.setText(self.detector_path)
+
     # --------------------------------------------------------------------------
 
     def selectInstrumentConfigFile(self):
@@ -1750,17 +2807,245 @@ class VTICreationDialog(QtGui.QDialog):
 
     # --------------------------------------------------------------------------
 
+    def loadScanGeometry(self):
+
+        """
+        Creates (or reuses) the scan geometry for the selected scan/configs
+        """
+
+        scan = self.selected_scan_cbox.currentText()
+        geometry = self.scan_geometry
+
+        if geometry is None or geometry.scan_number != int(scan) or \
+            geometry.spec_path != self.data_source_path or \
+            geometry.detector_path != self.detector_path or \
+            geometry.instrument_path != self.instrument_path:
+            self.scan_geometry = ScanGeometry(self.data_source_path, scan,
+                self.detector_path, self.instrument_path)
+            self.scan_bounds, self.scan_steps = \
+                GridPlanningLogic.estimateSampling(self.scan_geometry)
+
+        return self.scan_geometry
+
+    # --------------------------------------------------------------------------
+
+    def recommendGridSize(self):
+
+        """
+        Sets HKL interpolation counts from the scan's natural sampling and
+        estimates the resulting empty voxel fraction
+        """
+
+        try:
+            geometry = self.loadScanGeometry()
+            max_voxels = GridPlanningLogic.sampleCount(geometry) // \
+                GridPlanningLogic.SAMPLES_PER_VOXEL
+            h_count, k_count, l_count = GridPlanningLogic.recommendGridSize(
+                self.scan_bounds, self.scan_steps, self.h_count_sbox.maximum(),
+                max_voxels)
+
+            self.h_count_sbox.setValue(h_count)
+            self.k_count_sbox.setValue(k_count)
+            self.l_count_sbox.setValue(l_count)
+            self.estimateEmptyVoxels()
+
+        except Exception as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"Could Not Plan Grid: {ex}")
+            msg_box.exec_()
+
+    # --------------------------------------------------------------------------
+
+    def estimateEmptyVoxels(self):
+
+        """
+        Predicts the fraction of empty voxels for the current counts
+        """
+
+        try:
+            geometry = self.loadScanGeometry()
+            shape = (self.h_count_sbox.value(), self.k_count_sbox.value(),
+                self.l_count_sbox.value())
+            fraction = GridPlanningLogic.estimateEmptyFraction(geometry,
+                self.scan_bounds, shape)
+            self.empty_voxels_txtbox.setText(f"{round(fraction * 100, 1)}%")
+
+        except Exception as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"Could Not Estimate Grid: {ex}")
+            msg_box.exec_()
+
+    # --------------------------------------------------------------------------
+
+    def updateMemoryEstimate(self):
+
+        """
+        Updates predicted memory footprint for the current counts
+        """
+
+        shape = (self.h_count_sbox.value(), self.k_count_sbox.value(),
+            self.l_count_sbox.value())
+        memory = GridPlanningLogic.estimateMemory(shape)
+        self.memory_txtbox.setText(f"{round(memory / 1024 ** 3, 2)} GB")
+
+        # Empty voxel estimate no longer matches the counts
+        self.empty_voxels_txtbox.setText("")
+
+    # --------------------------------------------------------------------------
+
     def accept(self):
 
         scan = self.selected_scan_cbox.currentText()
         h_count = self.h_count_sbox.value()
         k_count = self.k_count_sbox.value()
         l_count = self.l_count_sbox.value()
+        projection = self.projection_cbox.currentText()
+
+        if projection in ConversionLogic.PROJECTION_AXES:
+            self.createProjection(projection)
+            return
 
         file_name = QtGui.QFileDialog.getSaveFileName(self,"", "", "VTI Files (*.vti)")[0]
 
-        ConversionLogic.createVTIFile(self.project_path, self.data_source_path,
-            self.detector_path, self.instrument_path, scan, h_count, k_count, l_count, file_name)
+        if self.merge_scans_chkbox.isChecked():
+            if file_name == "":
+                return
+
+            self.startConversion("Could Not Merge Scans",
+                ConversionLogic.createMergedVTIFile, self.project_path,
+                self.data_source_path, self.detector_path, self.instrument_path,
+                self.merge_scans_txtbox.text(), h_count, k_count, l_count,
+                file_name, normalize=self.normalize_chkbox.isChecked(),
+                keep_raw=self.keep_raw_chkbox.isChecked())
+            return
+        else:
+            ConversionLogic.createVTIFile(self.project_path, self.data_source_path,
+                self.detector_path, self.instrument_path, scan, h_count, k_count, l_count, file_name)
+
+        self.close()
+
+    # --------------------------------------------------------------------------
+
+    def createProjection(self, projection):
+
+        """
+        Projects the selected (or merged) scans onto the chosen axes (over
+        the chosen ranges, if set) and writes the result to an .hdf file in
+        the background; no 3D grid is created
+        """
+
+        if self.merge_scans_chkbox.isChecked():
+            scans = self.merge_scans_txtbox.text()
+        else:
+            scans = self.selected_scan_cbox.currentText()
+
+        counts = [self.h_count_sbox.value(), self.k_count_sbox.value(),
+            self.l_count_sbox.value(), self.q_count_sbox.value()]
+        axes = ConversionLogic.PROJECTION_AXES[projection]
+        shape = [counts[axis] for axis in axes]
+
+        try:
+            bounds = self.projectionBounds(axes)
+        except ValueError as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"Could Not Create Projection: {ex}")
+            msg_box.exec_()
+            return
+
+        file_name = QtGui.QFileDialog.getSaveFileName(self, "", "", "HDF Files (*.hdf)")[0]
+        if file_name == "":
+            return
+
+        self.startConversion("Could Not Create Projection",
+            ConversionLogic.createProjectionFile, self.project_path,
+            self.data_source_path, self.detector_path, self.instrument_path,
+            scans, axes, shape, file_name, bounds=bounds,
+            normalize=self.normalize_chkbox.isChecked())
+
+    # --------------------------------------------------------------------------
+
+    def updateProjectionControls(self):
+
+        """
+        Enables the |Q| bin count and range inputs that apply to the chosen
+        projection
+        """
+
+        axes = ConversionLogic.PROJECTION_AXES.get(self.projection_cbox.currentText(), ())
+        limit_range = self.projection_range_chkbox.isChecked()
+
+        self.q_count_sbox.setEnabled(ProjectionAccumulator.Q_AXIS in axes)
+        self.projection_range_chkbox.setEnabled(len(axes) > 0)
+
+        for i in range(2):
+            used = i < len(axes)
+            name = ProjectionAccumulator.AXIS_NAMES[axes[i]] if used else ""
+            self.projection_range_lbls[i].setText(f"{name}:" if used else "")
+            self.projection_min_sboxes[i].setEnabled(used and limit_range)
+            self.projection_max_sboxes[i].setEnabled(used and limit_range)
+
+    # --------------------------------------------------------------------------
+
+    def projectionBounds(self, axes):
+
+        """
+        Returns [[min, max]] per projection axis from the range inputs, or
+        None (the scans' full extent) if no range is set
+        """
+
+        if not self.projection_range_chkbox.isChecked():
+            return None
+
+        bounds = [[self.projection_min_sboxes[i].value(),
+            self.projection_max_sboxes[i].value()] for i in range(len(axes))]
+
+        for (axis_min, axis_max), axis in zip(bounds, axes):
+            if axis_min >= axis_max:
+                raise ValueError(f"{ProjectionAccumulator.AXIS_NAMES[axis]} " \
+                    "range minimum must be below its maximum.")
+
+        return bounds
+
+    # --------------------------------------------------------------------------
+
+    def startConversion(self, error_text, function, *args, **kwargs):
+
+        """
+        Runs a conversion on the worker thread, keeping the dialog disabled
+        until it finishes
+        """
+
+        self.setEnabled(False)
+        self.conversion_error = error_text
+        self.conversion_future = self.conversion_driver.submit(function, *args, **kwargs)
+        self.conversion_timer.start(self.conversion_interval)
+
+    # --------------------------------------------------------------------------
+
+    def updateConversion(self):
+
+        """
+        Closes the dialog once the conversion is done, or reports its error
+        and keeps the dialog open
+        """
+
+        if not self.conversion_future.done():
+            return
+
+        self.conversion_timer.stop()
+        self.setEnabled(True)
+
+        try:
+            self.conversion_future.result()
+        except Exception as ex:
+            msg_box = QtGui.QMessageBox()
+            msg_box.setWindowTitle("Error")
+            msg_box.setText(f"{self.conversion_error}: {ex}")
+            msg_box.exec_()
+            return
 
         self.close()
 
@@ -1768,6 +3053,9 @@ class VTICreationDialog(QtGui.QDialog):
 
 class ConversionLogic():
 
+    # Projection name -> ProjectionAccumulator axes
+    PROJECTION_AXES = {"H-K": (0, 1), "H-L": (0, 2), "K-L": (1, 2), "|Q|": (3,)}
+
     def createVTIFile(project_dir, spec_file, detector_config_name, instrument_config_name,
         scan, nx, ny, nz, file_name=None):
 
@@ -1799,7 +3087,7 @@ class ConversionLogic():
         app_config = RSMap3DConfigParser()
         max_image_memory = app_config.getMaxImageMemory()
 
-        scan_dir = os.path.join(project_dir, "images", spec_name, f"S{scan}")
+        scan_dir = ConversionLogic.scanImageDir(project_dir, spec_name, scan)
         
         for file in os.listdir(scan_dir):
             old_point_number = file.split("_")[-1]
@@ -1828,6 +3116,147 @@ class ConversionLogic():
 
     # --------------------------------------------------------------------------
 
+    def createMergedVTIFile(project_dir, spec_file, detector_config_name,
+        instrument_config_name, scans, nx, ny, nz, file_name=None,
+        normalize=True, keep_raw=False):
+
+        """
+        Grids several scans (given as a range string, e.g. "840,842-845")
+        into one VTI file. Intensities are normalized by the SPEC
+        monitor/filter columns while gridding; with keep_raw the
+        unnormalized grid is also written to "<name>_raw.vti".
+        """
+
+        def updateMergeProgress(value1, value2):
+            print("Merge Progress %s/%s" % (value1, value2))
+
+        spec_name, spec_ext = os.path.splitext(os.path.basename(spec_file))
+        if file_name == None or file_name == "":
+            output_file_name = os.path.join(project_dir, spec_name + "_" + \
+                scans.replace(",", "_") + ".vti")
+        else:
+            output_file_name = file_name
+
+        geometries, image_dirs = ConversionLogic.loadScans(project_dir, spec_file,
+            detector_config_name, instrument_config_name, scans)
+
+        accumulator = GridMergeLogic.mergeScans(geometries, image_dirs,
+            (nx, ny, nz), progress=updateMergeProgress, normalize=normalize,
+            keep_raw=keep_raw)
+        ConversionLogic.saveVTIFile(output_file_name, accumulator.dataset(),
+            accumulator.axes())
+
+        if keep_raw:
+            raw_file_name = os.path.splitext(output_file_name)[0] + "_raw.vti"
+            ConversionLogic.saveVTIFile(raw_file_name, accumulator.dataset(raw=True),
+                accumulator.axes())
+
+        return output_file_name
+
+    # --------------------------------------------------------------------------
+
+    def createProjectionFile(project_dir, spec_file, detector_config_name,
+        instrument_config_name, scans, axes, shape, file_name=None, bounds=None,
+        normalize=True):
+
+        """
+        Projects one or more scans (given as a range string) straight onto
+        two HKL axes, or onto |Q|, and writes the mean intensity per pixel,
+        summed intensity, pixel counts and axis values to an .hdf file. No 3D
+        grid is created. `bounds` ([[min, max]] per axis) default to the
+        scans' full extent.
+        """
+
+        def updateProjectionProgress(value1, value2):
+            print("Projection Progress %s/%s" % (value1, value2))
+
+        axis_names = [ProjectionAccumulator.AXIS_NAMES[axis] for axis in axes]
+        spec_name, spec_ext = os.path.splitext(os.path.basename(spec_file))
+        if file_name == None or file_name == "":
+            output_file_name = os.path.join(project_dir, spec_name + "_" + \
+                scans.replace(",", "_") + "_" + "".join(axis_names).strip("|") + ".hdf")
+        else:
+            output_file_name = file_name
+
+        geometries, image_dirs = ConversionLogic.loadScans(project_dir, spec_file,
+            detector_config_name, instrument_config_name, scans)
+
+        accumulator = GridMergeLogic.projectScans(geometries, image_dirs, axes,
+            shape, bounds=bounds, progress=updateProjectionProgress,
+            normalize=normalize)
+
+        with h5py.File(output_file_name, "w") as file:
+            data = file.create_group("data")
+            intensity = data.create_dataset("Intensity", data=accumulator.projection())
+            intensity.attrs["description"] = "Mean intensity per pixel (Sum / Counts)"
+            data.create_dataset("Sum", data=accumulator.sum)
+            data.create_dataset("Counts", data=accumulator.count)
+            for name, values in zip(axis_names, accumulator.axisValues()):
+                data.create_dataset(name.strip("|"), data=values)
+            data.attrs["axes"] = [name.strip("|") for name in axis_names]
+            data.attrs["scans"] = scans
+
+        return output_file_name
+
+    # --------------------------------------------------------------------------
+
+    def loadScans(project_dir, spec_file, detector_config_name,
+        instrument_config_name, scans):
+
+        """
+        Returns scan geometries and image directories for a range string of
+        scans in a project, sharing one parsed SPEC file
+        """
+
+        spec_name, spec_ext = os.path.splitext(os.path.basename(spec_file))
+        spec_data = spec.SpecDataFile(spec_file)
+        geometries, image_dirs = [], []
+
+        for scan in srange(scans).list():
+            geometries.append(ScanGeometry(spec_file, scan, detector_config_name,
+                instrument_config_name, spec_file=spec_data))
+            image_dirs.append(ConversionLogic.scanImageDir(project_dir, spec_name, scan))
+
+        return geometries, image_dirs
+
+    # --------------------------------------------------------------------------
+
+    def scanImageDir(project_dir, spec_name, scan):
+
+        """
+        Returns the image directory of a scan in a project (named the way
+        rsMap3D's Sector33SpecDataSource expects, e.g. S005)
+        """
+
+        return os.path.join(project_dir, "images", spec_name, f"S{int(scan):03d}")
+
+    # --------------------------------------------------------------------------
+
+    def saveVTIFile(file_name, dataset, axes):
+
+        """
+        Writes an HKL dataset (indexed [H, K, L]) to a .vti file readable by
+        loadData
+        """
+
+        image_data = vtk.vtkImageData()
+        image_data.SetDimensions(*dataset.shape)
+        image_data.SetOrigin(axes[0][0], axes[1][0], axes[2][0])
+        image_data.SetSpacing(*[axis[1] - axis[0] if len(axis) > 1 else 1 \
+            for axis in axes])
+
+        # VTK orders points with x (H) varying fastest
+        scalars = npSup.numpy_to_vtk(np.ravel(dataset, order="F"), deep=True)
+        scalars.SetName("Scalars_")
+        image_data.GetPointData().SetScalars(scalars)
+
+        writer = vtk.vtkXMLImageDataWriter()
+        writer.SetFileName(file_name)
+        writer.SetInputData(image_data)
+        writer.Write()
+
+    # --------------------------------------------------------------------------
+
     def loadData(vti_file):
 
         """
@@ -0,0 +1,1878 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import bisect
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import h5py
+import json
+import numpy as np
+import os
+import re
+import threading
+import tifffile as tiff
+import xml.etree.ElementTree as ET
+
+# ==============================================================================
+
+class FrameCache:
+
+    """
+    Least-recently-used cache of decoded scan frames:
+    - Keyed by image path; entries are dropped if the file's mtime changes
+    - Bounded by total bytes rather than frame count
+    - Safe to share between the GUI thread and background workers
+    - Frames in a scan's packed FrameStack are read from it directly
+    - Frames are corrected (bad pixels/flat field) before they're cached
+    """
+
+    def __init__ (self, max_bytes=512 * 1024 ** 2):
+
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.n_bytes = 0
+        self.lock = threading.Lock()
+
+        # Scan directory -> ScanFrameReader
+        self.readers = {}
+
+        # DetectorCorrection applied to every frame read (or None)
+        self.correction = None
+
+    # --------------------------------------------------------------------------
+
+    def getFrame(self, path):
+
+        """
+        Returns a frame, transposed to match dimensions of RSM. Decodes and
+        caches it if it isn't cached yet.
+        """
+
+        mtime = os.stat(path).st_mtime
+        scan_path, name = os.path.split(path)
+
+        # Uncorrected memory-mapped frames need no caching
+        reader = self.reader(scan_path)
+        if self.correction is None and reader.frame_stack.contains(name, mtime):
+            return reader.frame_stack.frame(name)
+
+        with self.lock:
+            if path in self.frames:
+                frame_mtime, frame = self.frames[path]
+                if frame_mtime == mtime:
+                    self.frames.move_to_end(path)
+                    return frame
+                self.removeFrame(path)
+
+        frame = reader.readFrame(name)
+        self.addFrame(path, mtime, frame)
+
+        return frame
+
+    # --------------------------------------------------------------------------
+
+    def readFrame(self, path):
+
+        """
+        Returns a frame without adding it to the cache, so streaming passes
+        over a whole scan don't evict frames being viewed
+        """
+
+        mtime = os.stat(path).st_mtime
+        scan_path, name = os.path.split(path)
+
+        with self.lock:
+            if path in self.frames and self.frames[path][0] == mtime:
+                return self.frames[path][1]
+
+        return self.reader(scan_path).readFrame(name)
+
+    # --------------------------------------------------------------------------
+
+    def prefetchFrames(self, paths):
+
+        """
+        Decodes the frames that aren't cached yet as one concurrent batch and
+        caches them (e.g. ahead of playback)
+        """
+
+        missing = []
+
+        for path in paths:
+            mtime = os.stat(path).st_mtime
+            scan_path, name = os.path.split(path)
+            if self.correction is None and \
+                self.reader(scan_path).frame_stack.contains(name, mtime):
+                continue
+            with self.lock:
+                if path in self.frames and self.frames[path][0] == mtime:
+                    continue
+            missing.append((path, mtime))
+
+        if not missing:
+            return
+
+        # Frames are copied out of the batch array; cached views would keep
+        # the whole batch alive after most of its frames were evicted
+        frames = self.correct(BatchDecodeLogic.readFrames(
+            [path for path, mtime in missing]))
+        for (path, mtime), frame in zip(missing, frames):
+            self.addFrame(path, mtime, frame.copy())
+
+    # --------------------------------------------------------------------------
+
+    def setCorrection(self, correction):
+
+        """
+        Sets the correction applied to frames read from now on, dropping
+        frames cached with the previous one. Returns True if it changed.
+        """
+
+        if correction is self.correction:
+            return False
+
+        with self.lock:
+            self.correction = correction
+            for reader in self.readers.values():
+                reader.correction = correction
+            self.frames.clear()
+            self.n_bytes = 0
+
+        return True
+
+    # --------------------------------------------------------------------------
+
+    def correct(self, frames):
+        if self.correction is None:
+            return frames
+
+        return self.correction.apply(frames)
+
+    # --------------------------------------------------------------------------
+
+    def findFrame(self, key):
+
+        """
+        Returns a frame cached under a non-file key (e.g. an HDF5 frame),
+        or None
+        """
+
+        with self.lock:
+            if key in self.frames:
+                self.frames.move_to_end(key)
+                return self.frames[key][1]
+
+        return None
+
+    # --------------------------------------------------------------------------
+
+    def reader(self, scan_path):
+        with self.lock:
+            if scan_path not in self.readers:
+                self.readers[scan_path] = ScanFrameReader(scan_path, self.correction)
+            return self.readers[scan_path]
+
+    # --------------------------------------------------------------------------
+
+    def refreshStack(self, scan_path):
+
+        """
+        Picks up a scan's newly packed FrameStack
+        """
+
+        self.reader(scan_path).refresh()
+
+    # --------------------------------------------------------------------------
+
+    def addFrame(self, path, mtime, frame):
+
+        """
+        Caches a decoded frame, evicting least recently used frames as needed
+        """
+
+        with self.lock:
+            if path in self.frames:
+                self.removeFrame(path)
+            self.frames[path] = (mtime, frame)
+            self.n_bytes += frame.nbytes
+
+            while self.n_bytes > self.max_bytes and len(self.frames) > 1:
+                self.removeFrame(next(iter(self.frames)))
+
+    # --------------------------------------------------------------------------
+
+    def removeFrame(self, path):
+        mtime, frame = self.frames.pop(path)
+        self.n_bytes -= frame.nbytes
+
+    # --------------------------------------------------------------------------
+
+    def contains(self, path):
+        with self.lock:
+            return path in self.frames
+
+    # --------------------------------------------------------------------------
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.n_bytes = 0
+
+# ==============================================================================
+
+class ScanDirectoryLogic:
+
+    """
+    Helpers for reading a scan's image directory as it grows
+    """
+
+    IMAGE_EXTENSIONS = (".tif", ".tiff")
+
+    def listNewImages(scan_path, known_images):
+
+        """
+        Returns sorted basenames of images in scan_path that aren't in
+        known_images. Only the new entries are validated; anything that
+        isn't a .tif/.tiff image (e.g. a temporary file) is skipped.
+        """
+
+        new_images = []
+
+        for file in os.listdir(scan_path):
+            if file in known_images:
+                continue
+            if file.endswith(ScanDirectoryLogic.IMAGE_EXTENSIONS) and \
+                os.path.isfile(os.path.join(scan_path, file)):
+                new_images.append(file)
+
+        return sorted(new_images)
+
+    # --------------------------------------------------------------------------
+
+    def insertImages(scan_images, new_images):
+
+        """
+        Inserts new basenames into the sorted image list in place. Returns
+        the list index of each inserted image.
+        """
+
+        indices = []
+
+        for image in new_images:
+            index = bisect.bisect(scan_images, image)
+            scan_images.insert(index, image)
+            indices.append(index)
+
+        return indices
+
+# ==============================================================================
+
+class BatchDecodeLogic:
+
+    """
+    Decodes batches of TIFF frames concurrently:
+    - Frames are decoded on a shared thread pool; tifffile's codecs release
+      the GIL, so compressed (LZW/deflate) scans decode in parallel
+    - Each frame is decoded straight into its slot of a preallocated array
+    """
+
+    executor = None
+    lock = threading.Lock()
+
+    def pool():
+        with BatchDecodeLogic.lock:
+            if BatchDecodeLogic.executor is None:
+                BatchDecodeLogic.executor = ThreadPoolExecutor(
+                    max_workers=os.cpu_count())
+
+        return BatchDecodeLogic.executor
+
+    # --------------------------------------------------------------------------
+
+    def frameLayout(path):
+
+        """
+        Returns the (shape, dtype) of a TIFF's frame as stored in the file
+        """
+
+        with tiff.TiffFile(path) as file:
+            page = file.pages[0]
+            return page.shape, page.dtype
+
+    # --------------------------------------------------------------------------
+
+    def decodeInto(paths, slots):
+
+        """
+        Decodes each file into its slot (a C-contiguous array in the file's
+        layout), waiting for all of them
+        """
+
+        futures = [BatchDecodeLogic.pool().submit(tiff.imread, path, out=slot) \
+            for path, slot in zip(paths, slots)]
+
+        for future in futures:
+            future.result()
+
+    # --------------------------------------------------------------------------
+
+    def readFrames(paths, out=None):
+
+        """
+        Returns frames (transposed to match dimensions of RSM) as an
+        (n_frames, n_x, n_y) array. `out` may be a preallocated
+        (n_frames, rows, cols) array in the files' layout to decode into.
+        """
+
+        if out is None:
+            shape, dtype = BatchDecodeLogic.frameLayout(paths[0])
+            out = np.empty((len(paths),) + shape, dtype=dtype)
+
+        BatchDecodeLogic.decodeInto(paths, list(out[:len(paths)]))
+
+        return out[:len(paths)].transpose(0, 2, 1)
+
+# ==============================================================================
+
+class DetectorCorrection:
+
+    """
+    Bad-pixel mask and flat-field correction for a detector:
+    - Read from files beside the detector config, e.g. for
+      6IDB_DetectorGeometry.xml: 6IDB_DetectorGeometry_mask.tif (nonzero
+      pixels are bad) and 6IDB_DetectorGeometry_flatfield.tif
+    - Loaded once per config and reused while none of the files change
+    - Applied in place to frames as they're read, before they're cached:
+      bad pixels are set to 0 and the rest scaled by mean(flat) / flat
+    """
+
+    MASK_SUFFIXES = ["_mask.npy", "_mask.tif", "_mask.tiff"]
+    FLAT_FIELD_SUFFIXES = ["_flatfield.npy", "_flatfield.tif", "_flatfield.tiff"]
+
+    # (config path, file mtimes) -> DetectorCorrection
+    corrections = {}
+
+    def __init__ (self, shape, mask=None, flat_field=None, key=""):
+
+        self.shape = tuple(shape)
+        self.key = key
+        self.mask = np.zeros(self.shape, dtype=bool) if mask is None else mask != 0
+        self.gain = None
+
+        if flat_field is not None:
+            flat_field = flat_field.astype(np.float64)
+            self.mask |= ~np.isfinite(flat_field) | (flat_field <= 0)
+            self.gain = np.zeros(self.shape, dtype=np.float32)
+            good = ~self.mask
+            self.gain[good] = np.mean(flat_field[good]) / flat_field[good]
+
+        self.has_bad_pixels = bool(np.any(self.mask))
+
+    # --------------------------------------------------------------------------
+
+    def fromConfig(detector_path):
+
+        """
+        Returns the correction for a detector config, or None if there are
+        no correction files beside it
+        """
+
+        mask_path = DetectorCorrection.findFile(detector_path,
+            DetectorCorrection.MASK_SUFFIXES)
+        flat_field_path = DetectorCorrection.findFile(detector_path,
+            DetectorCorrection.FLAT_FIELD_SUFFIXES)
+
+        if mask_path is None and flat_field_path is None:
+            return None
+
+        paths = [path for path in (detector_path, mask_path, flat_field_path) \
+            if path is not None]
+        key = ";".join(f"{path}@{os.stat(path).st_mtime}" for path in paths)
+
+        if key not in DetectorCorrection.corrections:
+            shape = DetectorCorrection.detectorShape(detector_path)
+            mask, flat_field = [None if path is None else \
+                DetectorCorrection.loadArray(path, shape) \
+                for path in (mask_path, flat_field_path)]
+            DetectorCorrection.corrections[key] = DetectorCorrection(shape, mask,
+                flat_field, key)
+
+        return DetectorCorrection.corrections[key]
+
+    # --------------------------------------------------------------------------
+
+    def findFile(detector_path, suffixes):
+        stem = os.path.splitext(detector_path)[0]
+
+        for suffix in suffixes:
+            if os.path.exists(stem + suffix):
+                return stem + suffix
+
+        return None
+
+    # --------------------------------------------------------------------------
+
+    def detectorShape(detector_path):
+
+        """
+        Returns the detector's (n_x, n_y) pixel counts from its config
+        """
+
+        for element in ET.parse(detector_path).iter():
+            if element.tag.endswith("Npixels"):
+                return tuple(int(n) for n in element.text.split())
+
+        raise ValueError(f"No Npixels in '{detector_path}'.")
+
+    # --------------------------------------------------------------------------
+
+    def loadArray(path, shape):
+        if path.endswith(".npy"):
+            array = np.load(path)
+        else:
+            array = tiff.imread(path)
+
+        # Transposed to match dimensions of RSM
+        array = array.T
+        if array.shape != tuple(shape):
+            raise ValueError(f"'{os.path.basename(path)}' is {array.shape[0]}x" \
+                f"{array.shape[1]} pixels; detector is {shape[0]}x{shape[1]}.")
+
+        return array
+
+    # --------------------------------------------------------------------------
+
+    def apply(self, frames):
+
+        """
+        Corrects a frame (or an (n_frames, n_x, n_y) batch) in place.
+        Returns the corrected array, which is a new float32 array only if a
+        flat field is applied to integer or read-only frames.
+        """
+
+        if frames.shape[-2:] != self.shape:
+            raise ValueError("Frame doesn't match the detector's mask/flat field.")
+
+        if self.gain is not None:
+            if frames.dtype.kind != "f" or not frames.flags.writeable:
+                frames = frames.astype(np.float32)
+            np.multiply(frames, self.gain, out=frames)
+        elif self.has_bad_pixels and not frames.flags.writeable:
+            frames = frames.copy()
+
+        if self.has_bad_pixels:
+            frames[..., self.mask] = 0
+
+        return frames
+
+# ==============================================================================
+
+class FrameStatsIndex:
+
+    """
+    Per-frame summary of a scan (max, argmax, total counts, saturated pixel
+    count and an optional pixel ROI sum):
+    - Computed on a background thread, streaming frames from an ImageSource
+    - Saved beside the scan; frames that haven't changed are reused when the
+      index is recomputed
+    """
+
+    STATISTICS = ["Max", "Total", "Saturated", "ROI Sum"]
+
+    def __init__ (self, image_source, saturation_level, roi=None):
+
+        self.image_source = image_source
+        self.scan_path = image_source.path
+        self.image_names = list(image_source.image_names)
+        self.saturation_level = saturation_level
+        # (x_min, x_max, y_min, y_max) in displayed (transposed) pixels
+        self.roi = None if roi is None else tuple(int(i) for i in roi)
+
+        n_frames = len(self.image_names)
+        self.mtimes = np.full(n_frames, np.nan)
+        self.done = np.zeros(n_frames, dtype=bool)
+        self.stats = {
+            "Max": np.zeros(n_frames),
+            "Total": np.zeros(n_frames),
+            "Saturated": np.zeros(n_frames),
+            "ROI Sum": np.zeros(n_frames)
+        }
+        self.argmax = np.zeros((n_frames, 2), dtype=np.int64)
+
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    # --------------------------------------------------------------------------
+
+    def cachePath(scan_path):
+        return os.path.normpath(scan_path) + "_frame_stats.npz"
+
+    # --------------------------------------------------------------------------
+
+    def load(self):
+
+        """
+        Reuses saved rows for frames with the same name and mtime, computed
+        with the same saturation level, ROI and detector correction
+        """
+
+        path = FrameStatsIndex.cachePath(self.scan_path)
+        if not os.path.exists(path):
+            return
+
+        try:
+            with np.load(path) as data:
+                roi = tuple(data["roi"]) if len(data["roi"]) else None
+                if float(data["saturation_level"]) != self.saturation_level or \
+                    roi != self.roi or \
+                    str(data["correction"]) != self.image_source.correctionKey():
+                    return
+
+                rows = {name: i for i, name in enumerate(data["image_names"])}
+                for i, name in enumerate(self.image_names):
+                    row = rows.get(name)
+                    mtime = self.image_source.frameMtime(i)
+                    if row is None or not data["done"][row] or data["mtimes"][row] != mtime:
+                        continue
+                    self.mtimes[i] = mtime
+                    self.argmax[i] = data["argmax"][row]
+                    for stat in FrameStatsIndex.STATISTICS:
+                        self.stats[stat][i] = data[stat][row]
+                    self.done[i] = True
+        except (OSError, KeyError, ValueError):
+            pass
+
+    # --------------------------------------------------------------------------
+
+    def save(self):
+
+        """
+        Writes the index beside the scan. Returns False if the location
+        isn't writable.
+        """
+
+        try:
+            with open(FrameStatsIndex.cachePath(self.scan_path), "wb") as file:
+                np.savez(file, image_names=np.array(self.image_names),
+                    mtimes=self.mtimes, done=self.done, argmax=self.argmax,
+                    saturation_level=self.saturation_level,
+                    correction=self.image_source.correctionKey(),
+                    roi=np.array(self.roi if self.roi is not None else [], dtype=np.int64),
+                    **self.stats)
+        except OSError:
+            return False
+
+        return True
+
+    # --------------------------------------------------------------------------
+
+    def computeFrame(self, i):
+        mtime = self.image_source.frameMtime(i)
+        image = self.image_source.readFrame(i)
+
+        self.argmax[i] = np.unravel_index(np.argmax(image), image.shape)
+        self.stats["Max"][i] = image[tuple(self.argmax[i])]
+        self.stats["Total"][i] = np.sum(image, dtype=np.float64)
+        self.stats["Saturated"][i] = np.count_nonzero(image >= self.saturation_level)
+        if self.roi is not None:
+            x_min, x_max, y_min, y_max = self.roi
+            self.stats["ROI Sum"][i] = np.sum(image[x_min:x_max, y_min:y_max],
+                dtype=np.float64)
+        self.mtimes[i] = mtime
+        self.done[i] = True
+
+    # --------------------------------------------------------------------------
+
+    def run(self):
+
+        """
+        Computes every frame not loaded from disk, then saves the index
+        """
+
+        for i in np.nonzero(~self.done)[0]:
+            if self.stop_event.is_set():
+                break
+            try:
+                self.computeFrame(i)
+            except Exception:
+                # Unreadable (e.g. partially written) frame; left for next run
+                continue
+
+        self.save()
+
+    # --------------------------------------------------------------------------
+
+    def start(self):
+        self.load()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # --------------------------------------------------------------------------
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    # --------------------------------------------------------------------------
+
+    def isRunning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # --------------------------------------------------------------------------
+
+    def brightestFrame(self):
+
+        """
+        Returns the index of the computed frame with the highest max, or None
+        """
+
+        if not np.any(self.done):
+            return None
+
+        return int(np.argmax(np.where(self.done, self.stats["Max"], -np.inf)))
+
+# ==============================================================================
+
+class ThumbnailCache:
+
+    """
+    Small previews of a scan's frames for navigation:
+    - Max-pooled (so peaks survive) and log-scaled to uint8 per frame
+    - Generated on a background thread, in batches read through the
+      ImageSource
+    - Saved beside the scan; frames that haven't changed are reused, so
+      reopening a scan shows its thumbnails immediately
+    - Frames the source picks up later are queued onto the running thread
+    """
+
+    BATCH_SIZE = 32
+
+    def __init__ (self, image_source, size=64):
+
+        self.image_source = image_source
+        self.scan_path = image_source.path
+        self.image_names = list(image_source.image_names)
+        self.rows = {name: i for i, name in enumerate(self.image_names)}
+        # Longest side of a thumbnail, in pixels
+        self.size = int(size)
+
+        n_frames = len(self.image_names)
+        self.mtimes = np.full(n_frames, np.nan)
+        self.done = np.zeros(n_frames, dtype=bool)
+        # (n_frames, n_x, n_y) once the thumbnail shape is known
+        self.thumbnails = None
+
+        # Guards the arrays above against update() while the thread runs
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    # --------------------------------------------------------------------------
+
+    def cachePath(scan_path):
+        return os.path.normpath(scan_path) + "_thumbnails.npz"
+
+    # --------------------------------------------------------------------------
+
+    def load(self):
+
+        """
+        Reuses saved thumbnails for frames with the same name and mtime, made
+        at the same size with the same detector correction
+        """
+
+        path = ThumbnailCache.cachePath(self.scan_path)
+        if not os.path.exists(path):
+            return
+
+        try:
+            with np.load(path) as data:
+                if int(data["size"]) != self.size or \
+                    str(data["correction"]) != self.image_source.correctionKey():
+                    return
+
+                thumbnails = data["thumbnails"]
+                rows = {name: i for i, name in enumerate(data["image_names"])}
+                for i, name in enumerate(self.image_names):
+                    row = rows.get(name)
+                    mtime = self.image_source.frameMtime(i)
+                    if row is None or not data["done"][row] or data["mtimes"][row] != mtime:
+                        continue
+                    if self.thumbnails is None:
+                        self.allocate(thumbnails.shape[1:])
+                    self.thumbnails[i] = thumbnails[row]
+                    self.mtimes[i] = mtime
+                    self.done[i] = True
+        except (OSError, KeyError, ValueError):
+            pass
+
+    # --------------------------------------------------------------------------
+
+    def save(self):
+
+        """
+        Writes the thumbnails beside the scan. Returns False if the location
+        isn't writable.
+        """
+
+        with self.lock:
+            if self.thumbnails is None:
+                return False
+            image_names = np.array(self.image_names)
+            mtimes, done = self.mtimes.copy(), self.done.copy()
+            thumbnails = self.thumbnails.copy()
+
+        try:
+            with self.save_lock, \
+                open(ThumbnailCache.cachePath(self.scan_path), "wb") as file:
+                np.savez(file, image_names=image_names, mtimes=mtimes,
+                    done=done, size=self.size,
+                    correction=self.image_source.correctionKey(),
+                    thumbnails=thumbnails)
+        except OSError:
+            return False
+
+        return True
+
+    # --------------------------------------------------------------------------
+
+    def allocate(self, shape):
+        self.thumbnails = np.zeros((len(self.image_names),) + tuple(shape),
+            dtype=np.uint8)
+
+    # --------------------------------------------------------------------------
+
+    def downsample(self, frames):
+
+        """
+        Returns (n_frames, n_x, n_y) frames as uint8 thumbnails
+        """
+
+        n_frames, n_x, n_y = frames.shape
+        factor = max(-(-max(n_x, n_y) // self.size), 1)
+        t_x, t_y = -(-n_x // factor), -(-n_y // factor)
+
+        padded = np.zeros((n_frames, t_x * factor, t_y * factor), dtype=np.float32)
+        padded[:, :n_x, :n_y] = frames
+        pooled = padded.reshape(n_frames, t_x, factor, t_y, factor).max(axis=(2, 4))
+
+        np.log1p(np.maximum(pooled, 0, out=pooled), out=pooled)
+        peak = pooled.reshape(n_frames, -1).max(axis=1)[:, None, None]
+        np.divide(pooled * 255, peak, out=pooled, where=peak > 0)
+
+        return pooled.astype(np.uint8)
+
+    # --------------------------------------------------------------------------
+
+    def run(self):
+
+        """
+        Makes thumbnails for every frame not loaded from disk (including
+        frames queued by update() meanwhile), a batch at a time, then saves
+        them
+        """
+
+        attempted = set()
+
+        while not self.stop_event.is_set():
+            with self.lock:
+                pending = [i for i in np.flatnonzero(~self.done) \
+                    if self.image_names[i] not in attempted]
+                if len(pending) == 0:
+                    self.running = False
+                    break
+                batch = pending[:ThumbnailCache.BATCH_SIZE]
+                batch_names = [self.image_names[i] for i in batch]
+
+            attempted.update(batch_names)
+            try:
+                mtimes = [self.image_source.frameMtime(i) for i in batch]
+                thumbnails = self.downsample(self.image_source.readFrames(batch))
+            except Exception:
+                # Unreadable (e.g. partially written) frame; left for next run
+                continue
+
+            with self.lock:
+                source_names = self.image_source.image_names
+                if [source_names[i] for i in batch] != batch_names:
+                    # Frames were inserted before the batch while it was
+                    # read, so it may not hold the frames named; read again
+                    attempted.difference_update(batch_names)
+                    continue
+                if self.thumbnails is None:
+                    self.allocate(thumbnails.shape[1:])
+                rows = [self.rows[name] for name in batch_names]
+                self.thumbnails[rows] = thumbnails
+                self.mtimes[rows] = mtimes
+                self.done[rows] = True
+
+        with self.lock:
+            self.running = False
+
+        self.save()
+
+    # --------------------------------------------------------------------------
+
+    def start(self):
+
+        """
+        Loads saved thumbnails, then makes the rest in the background
+        """
+
+        self.load()
+        self.stop_event.clear()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # --------------------------------------------------------------------------
+
+    def update(self):
+
+        """
+        Adds rows for frames the image source picked up since the cache was
+        made. They are made by the running thread, or a new one if it has
+        finished.
+        """
+
+        with self.lock:
+            image_names = list(self.image_source.image_names)
+            rows = {name: i for i, name in enumerate(image_names)}
+            old_rows = [self.rows[name] for name in self.image_names]
+            new_rows = [rows[name] for name in self.image_names]
+
+            mtimes = np.full(len(image_names), np.nan)
+            mtimes[new_rows] = self.mtimes[old_rows]
+            done = np.zeros(len(image_names), dtype=bool)
+            done[new_rows] = self.done[old_rows]
+            if self.thumbnails is not None:
+                thumbnails = np.zeros((len(image_names),) + self.thumbnails.shape[1:],
+                    dtype=np.uint8)
+                thumbnails[new_rows] = self.thumbnails[old_rows]
+                self.thumbnails = thumbnails
+
+            self.image_names, self.rows = image_names, rows
+            self.mtimes, self.done = mtimes, done
+
+            restart = not self.running and not self.stop_event.is_set()
+            if restart:
+                self.running = True
+
+        if restart:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    # --------------------------------------------------------------------------
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    # --------------------------------------------------------------------------
+
+    def isRunning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+# ==============================================================================
+
+class FrameProjector:
+
+    """
+    Sum/max/mean projections over ranges of a scan's frames:
+    - Frames are read from an ImageSource in chunks on a thread pool (each
+      chunk batch-decoded) and reduced as they arrive
+    - Results are kept per frame range; a range that contains a cached one
+      only reads the frames outside it
+    """
+
+    CHUNK_SIZE = 16
+    MAX_CACHED_RANGES = 8
+
+    def __init__ (self, image_source, max_workers=None):
+
+        self.image_source = image_source
+
+        # (start, end) -> (sum, max) for frames start..end-1
+        self.ranges = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count())
+        # Runs whole projections so callers (e.g. the GUI thread) don't block
+        self.driver = ThreadPoolExecutor(max_workers=1)
+
+    # --------------------------------------------------------------------------
+
+    def reduceChunk(self, frames):
+
+        """
+        Returns (sum, max) of a list of frame indices
+        """
+
+        images = self.image_source.readFrames(frames)
+
+        return images.sum(axis=0, dtype=np.float64), images.max(axis=0)
+
+    # --------------------------------------------------------------------------
+
+    def cachedSubrange(self, start, end):
+
+        """
+        Returns the largest cached range inside [start, end), or None
+        """
+
+        with self.lock:
+            inside = [key for key in self.ranges if start <= key[0] and key[1] <= end]
+            if not inside:
+                return None
+            key = max(inside, key=lambda key: key[1] - key[0])
+            self.ranges.move_to_end(key)
+            return key, self.ranges[key]
+
+    # --------------------------------------------------------------------------
+
+    def project(self, start, end):
+
+        """
+        Returns (sum, max, mean) images over frames start..end-1
+        """
+
+        start, end = max(int(start), 0), min(int(end), self.image_source.frameCount())
+        if end <= start:
+            raise ValueError("Frame range is empty.")
+
+        partials = []
+        frames = list(range(start, end))
+        cached = self.cachedSubrange(start, end)
+
+        if cached is not None:
+            (cached_start, cached_end), cached_result = cached
+            partials.append(cached_result)
+            frames = list(range(start, cached_start)) + list(range(cached_end, end))
+
+        chunks = [frames[i:i + FrameProjector.CHUNK_SIZE] \
+            for i in range(0, len(frames), FrameProjector.CHUNK_SIZE)]
+        partials.extend(self.executor.map(self.reduceChunk, chunks))
+
+        total_sum = partials[0][0].copy()
+        total_max = partials[0][1].copy()
+        for chunk_sum, chunk_max in partials[1:]:
+            total_sum += chunk_sum
+            np.maximum(total_max, chunk_max, out=total_max)
+
+        with self.lock:
+            self.ranges[(start, end)] = (total_sum, total_max)
+            self.ranges.move_to_end((start, end))
+            while len(self.ranges) > FrameProjector.MAX_CACHED_RANGES:
+                self.ranges.popitem(last=False)
+
+        return total_sum, total_max, total_sum / (end - start)
+
+    # --------------------------------------------------------------------------
+
+    def submit(self, start, end):
+
+        """
+        Starts a projection in the background. Returns a Future.
+        """
+
+        return self.driver.submit(self.project, start, end)
+
+    # --------------------------------------------------------------------------
+
+    def clear(self):
+        with self.lock:
+            self.ranges.clear()
+
+    # --------------------------------------------------------------------------
+
+    def shutdown(self):
+        self.driver.shutdown(wait=False)
+        self.executor.shutdown(wait=False)
+
+# ==============================================================================
+
+class BackgroundModel:
+
+    """
+    Per-pixel running median (or percentile) background over a sliding
+    window of frames centred on each frame:
+    - Only the window's frames are held, in a ring buffer; stepping through
+      the scan replaces one frame per step
+    - Frames are read through the ImageSource (so from the FrameCache)
+    - The percentile is taken in row blocks on a thread pool
+    - Recent backgrounds are kept, so revisiting frames is free
+    """
+
+    MAX_CACHED_BACKGROUNDS = 8
+
+    def __init__ (self, image_source, window=15, percentile=50, max_workers=None):
+
+        self.image_source = image_source
+        self.window = max(int(window), 1)
+        self.percentile = float(percentile)
+
+        # Ring buffer of window frames; slot -> frame index (-1 if empty)
+        self.buffer = None
+        self.slot_frames = np.full(self.window, -1, dtype=np.int64)
+
+        # Frame index -> background
+        self.backgrounds = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.n_workers = max_workers or os.cpu_count()
+        self.executor = ThreadPoolExecutor(max_workers=self.n_workers)
+
+    # --------------------------------------------------------------------------
+
+    def windowRange(self, frame):
+
+        """
+        Returns the (start, end) frames of a frame's window, shifted to stay
+        inside the scan
+        """
+
+        n_frames = self.image_source.frameCount()
+        start = min(max(frame - self.window // 2, 0), max(n_frames - self.window, 0))
+
+        return start, min(start + self.window, n_frames)
+
+    # --------------------------------------------------------------------------
+
+    def fillWindow(self, start, end):
+
+        """
+        Reads the window's frames that aren't in the ring buffer yet into
+        slots holding frames outside it. Returns the slots in use.
+        """
+
+        frames = range(start, end)
+        missing = [frame for frame in frames if frame not in self.slot_frames]
+        free = [slot for slot in range(self.window) \
+            if not start <= self.slot_frames[slot] < end]
+
+        self.image_source.prefetchFrames(missing)
+        for slot, frame in zip(free, missing):
+            image = self.image_source.getFrame(frame)
+            if self.buffer is None:
+                self.buffer = np.empty((self.window,) + image.shape, dtype=np.float32)
+            self.buffer[slot] = image
+            self.slot_frames[slot] = frame
+
+        return np.flatnonzero((self.slot_frames >= start) & (self.slot_frames < end))
+
+    # --------------------------------------------------------------------------
+
+    def background(self, frame):
+
+        """
+        Returns the background (float32) for a frame
+        """
+
+        with self.lock:
+            if frame in self.backgrounds:
+                self.backgrounds.move_to_end(frame)
+                return self.backgrounds[frame]
+
+            slots = self.fillWindow(*self.windowRange(frame))
+            k = int(round(self.percentile / 100 * (len(slots) - 1)))
+            background = np.empty(self.buffer.shape[1:], dtype=np.float32)
+
+            n_rows = background.shape[0]
+            step = max(-(-n_rows // (2 * self.n_workers)), 1)
+            blocks = [slice(i, i + step) for i in range(0, n_rows, step)]
+            list(self.executor.map(lambda rows: self.reduceRows(slots, k, rows,
+                background), blocks))
+
+            self.backgrounds[frame] = background
+            while len(self.backgrounds) > BackgroundModel.MAX_CACHED_BACKGROUNDS:
+                self.backgrounds.popitem(last=False)
+
+        return background
+
+    # --------------------------------------------------------------------------
+
+    def reduceRows(self, slots, k, rows, background):
+
+        """
+        Writes the k-th smallest value of each pixel in a block of rows
+        """
+
+        window = self.buffer[slots, rows]
+        background[rows] = np.partition(window, k, axis=0)[k]
+
+    # --------------------------------------------------------------------------
+
+    def subtract(self, image, frame):
+
+        """
+        Returns the frame minus its background, clipped at 0
+        """
+
+        subtracted = np.subtract(image, self.background(frame), dtype=np.float32)
+
+        return np.maximum(subtracted, 0, out=subtracted)
+
+    # --------------------------------------------------------------------------
+
+    def clear(self):
+
+        """
+        Drops buffered frames and backgrounds (e.g. after frames change)
+        """
+
+        with self.lock:
+            self.slot_frames[:] = -1
+            self.backgrounds.clear()
+
+    # --------------------------------------------------------------------------
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+# ==============================================================================
+
+class ImagePyramid:
+
+    """
+    A frame and its 2x-downsampled levels, for displaying large frames at
+    the resolution of the view:
+    - Levels are max-pooled, so hot spots survive downsampling
+    - Only the part of a level around the view is handed out when the
+      whole level is too big to upload
+    """
+
+    MIN_SIZE = 256
+
+    def __init__ (self, image):
+
+        self.levels = [image]
+
+        while max(self.levels[-1].shape) > ImagePyramid.MIN_SIZE:
+            self.levels.append(ImagePyramid.maxPool(self.levels[-1]))
+
+    # --------------------------------------------------------------------------
+
+    def maxPool(image):
+
+        """
+        Returns the max of each 2x2 block (edges padded by repetition)
+        """
+
+        n_x, n_y = image.shape
+        padded = np.pad(image, ((0, n_x % 2), (0, n_y % 2)), mode="edge")
+
+        return padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).max(axis=(1, 3))
+
+    # --------------------------------------------------------------------------
+
+    def levelFor(self, pixel_size):
+
+        """
+        Returns the coarsest level with no more than one image pixel per
+        screen pixel, given the image pixels per screen pixel
+        """
+
+        if pixel_size <= 1:
+            return 0
+
+        return int(min(np.floor(np.log2(pixel_size)), len(self.levels) - 1))
+
+    # --------------------------------------------------------------------------
+
+    def region(self, level, x_range, y_range, max_pixels):
+
+        """
+        Returns the part of a level to display for a view range (in frame
+        pixels), and its (x, y, width, height) rect in frame pixels. The
+        whole level is returned if it has no more than max_pixels; otherwise
+        the view plus half its size on each side.
+        """
+
+        image = self.levels[level]
+        scale = 2 ** level
+        n_x, n_y = image.shape
+
+        if image.size <= max_pixels:
+            x_0, x_1, y_0, y_1 = 0, n_x, 0, n_y
+        else:
+            (x_min, x_max), (y_min, y_max) = x_range, y_range
+            margin_x, margin_y = (x_max - x_min) / 2, (y_max - y_min) / 2
+            x_0, x_1 = [int(np.clip(x // scale, 0, n_x)) for x in \
+                (x_min - margin_x, x_max + margin_x + scale)]
+            y_0, y_1 = [int(np.clip(y // scale, 0, n_y)) for y in \
+                (y_min - margin_y, y_max + margin_y + scale)]
+
+        rect = (x_0 * scale, y_0 * scale, (x_1 - x_0) * scale, (y_1 - y_0) * scale)
+
+        return image[x_0:x_1, y_0:y_1], rect
+
+# ==============================================================================
+
+class StackManifestLogic:
+
+    """
+    Manifests record the source images (name, size, mtime) a packed stack
+    was built from, so stale stacks can be detected
+    """
+
+    def describeImages(scan_path, image_names):
+        images = []
+
+        for name in image_names:
+            stat = os.stat(os.path.join(scan_path, name))
+            images.append([name, stat.st_size, stat.st_mtime])
+
+        return images
+
+    # --------------------------------------------------------------------------
+
+    def describeSource(image_source):
+
+        """
+        Returns [name, size, mtime] for every frame of an ImageSource
+        """
+
+        return [[name, image_source.frameSize(i), image_source.frameMtime(i)] \
+            for i, name in enumerate(image_source.image_names)]
+
+    # --------------------------------------------------------------------------
+
+    def isValid(manifest_path, images, correction=""):
+
+        """
+        Returns True if the manifest exists and lists exactly these images
+        (read with the same detector correction)
+        """
+
+        try:
+            with open(manifest_path) as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return False
+
+        return manifest.get("images") == images and \
+            manifest.get("correction", "") == correction
+
+    # --------------------------------------------------------------------------
+
+    def write(manifest_path, images, shape, dtype, correction=""):
+        with open(manifest_path, "w") as file:
+            json.dump({"images": images, "shape": list(shape),
+                "dtype": np.dtype(dtype).str, "correction": correction}, file)
+
+# ==============================================================================
+
+class PixelTraceStack:
+
+    """
+    A scan's frames repacked pixel-major, shape (n_x, n_y, n_frames), in a
+    memory-mapped .npy beside the scan. Each pixel's intensity
+    over the scan is contiguous, so pixel/ROI traces are read instantly.
+    Built once on a background thread; reused while its manifest matches.
+    """
+
+    # Frames buffered in memory before each write to the stack
+    BLOCK_FRAMES = 64
+
+    def __init__ (self, image_source):
+
+        self.image_source = image_source
+        self.image_names = list(image_source.image_names)
+        self.path = os.path.normpath(image_source.path) + "_traces.npy"
+        self.manifest_path = os.path.normpath(image_source.path) + "_traces.json"
+
+        self.stack = None
+        self.frames_done = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    # --------------------------------------------------------------------------
+
+    def open(self):
+
+        """
+        Maps an existing stack if it matches the scan's images. Returns
+        True if successful.
+        """
+
+        images = StackManifestLogic.describeSource(self.image_source)[:len(self.image_names)]
+
+        if os.path.exists(self.path) and \
+            StackManifestLogic.isValid(self.manifest_path, images,
+            self.image_source.correctionKey()):
+            self.stack = np.load(self.path, mmap_mode="r")
+            self.frames_done = self.stack.shape[2]
+            return True
+
+        return False
+
+    # --------------------------------------------------------------------------
+
+    def build(self):
+
+        """
+        Packs the frames into the stack, a block of frames at a time. Falls
+        back to an in-memory stack if the scan's parent isn't writable.
+        """
+
+        images = StackManifestLogic.describeSource(self.image_source)[:len(self.image_names)]
+        n_frames = len(self.image_names)
+
+        first = self.image_source.readFrame(0)
+        shape = first.shape + (n_frames,)
+        temp_path = self.path + ".part"
+
+        try:
+            stack = np.lib.format.open_memmap(temp_path, mode="w+",
+                dtype=first.dtype, shape=shape)
+        except OSError:
+            temp_path = None
+            stack = np.empty(shape, dtype=first.dtype)
+
+        for start in range(0, n_frames, PixelTraceStack.BLOCK_FRAMES):
+            if self.stop_event.is_set():
+                return
+            end = min(start + PixelTraceStack.BLOCK_FRAMES, n_frames)
+            block = self.image_source.readFrames(range(start, end))
+            stack[:, :, start:end] = np.moveaxis(block, 0, 2)
+            self.frames_done = end
+
+        if temp_path is None:
+            self.stack = stack
+            return
+
+        stack.flush()
+        del stack
+        os.replace(temp_path, self.path)
+        StackManifestLogic.write(self.manifest_path, images, shape, first.dtype,
+            self.image_source.correctionKey())
+        self.stack = np.load(self.path, mmap_mode="r")
+
+    # --------------------------------------------------------------------------
+
+    def start(self):
+
+        """
+        Opens the cached stack, or starts building it in the background
+        """
+
+        if self.open():
+            return
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.build, daemon=True)
+        self.thread.start()
+
+    # --------------------------------------------------------------------------
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    # --------------------------------------------------------------------------
+
+    def isReady(self):
+        return self.stack is not None
+
+    # --------------------------------------------------------------------------
+
+    def trace(self, x, y, radius=0):
+
+        """
+        Returns summed intensity of the (2 * radius + 1)^2 pixel square
+        around (x, y) for every frame, or None if outside the detector
+        """
+
+        n_x, n_y = self.stack.shape[:2]
+        x, y = int(np.floor(x)), int(np.floor(y))
+        if not (0 <= x < n_x and 0 <= y < n_y):
+            return None
+
+        roi = self.stack[max(x - radius, 0):x + radius + 1, max(y - radius, 0):y + radius + 1]
+
+        return np.sum(roi, axis=(0, 1), dtype=np.float64)
+
+# ==============================================================================
+
+class FrameStack:
+
+    """
+    A scan directory's frames packed frame-major, shape (n_frames, n_x,
+    n_y), into one memory-mapped .npy beside the directory. Saves a
+    file open/TIFF parse per frame on every visit. The manifest is checked
+    frame by frame, so frames rewritten since packing (or added later) are
+    simply read from their TIFFs.
+    """
+
+    def __init__ (self, scan_path):
+
+        self.scan_path = scan_path
+        self.path = os.path.normpath(scan_path) + "_frames.npy"
+        self.manifest_path = os.path.normpath(scan_path) + "_frames.json"
+
+        self.stack = None
+        # Image name -> (stack row, mtime), for frames whose file is unchanged
+        self.index = {}
+        self.frames_done = 0
+
+    # --------------------------------------------------------------------------
+
+    def open(self):
+
+        """
+        Maps the packed stack if there is one. Returns True if any of its
+        frames are still current.
+        """
+
+        self.stack, self.index = None, {}
+
+        try:
+            with open(self.manifest_path) as file:
+                manifest = json.load(file)
+            stack = np.load(self.path, mmap_mode="r")
+        except (OSError, ValueError):
+            return False
+
+        for row, (name, size, mtime) in enumerate(manifest["images"]):
+            try:
+                stat = os.stat(os.path.join(self.scan_path, name))
+            except OSError:
+                continue
+            if stat.st_size == size and stat.st_mtime == mtime:
+                self.index[name] = (row, mtime)
+
+        if self.index:
+            self.stack = stack
+
+        return self.stack is not None
+
+    # --------------------------------------------------------------------------
+
+    def build(self, image_names, stop_event=None):
+
+        """
+        Packs the given frames (written to a .part file, then renamed) and
+        maps the result
+        """
+
+        images = StackManifestLogic.describeImages(self.scan_path, image_names)
+
+        # Transposed to match dimensions of RSM
+        first = tiff.imread(os.path.join(self.scan_path, image_names[0])).T
+        shape = (len(image_names),) + first.shape
+        temp_path = self.path + ".part"
+        stack = np.lib.format.open_memmap(temp_path, mode="w+", dtype=first.dtype,
+            shape=shape)
+
+        # Frames are batch-decoded into one reused buffer (file layout)
+        batch_size = 2 * os.cpu_count()
+        buffer = np.empty((batch_size,) + first.T.shape, dtype=first.dtype)
+
+        for start in range(0, len(image_names), batch_size):
+            if stop_event is not None and stop_event.is_set():
+                return
+            paths = [os.path.join(self.scan_path, name) \
+                for name in image_names[start:start + batch_size]]
+            stack[start:start + len(paths)] = BatchDecodeLogic.readFrames(paths, buffer)
+            self.frames_done = start + len(paths)
+
+        stack.flush()
+        del stack
+        os.replace(temp_path, self.path)
+        StackManifestLogic.write(self.manifest_path, images, shape, first.dtype)
+        self.open()
+
+    # --------------------------------------------------------------------------
+
+    def contains(self, name, mtime=None):
+
+        """
+        Returns True if the frame is packed (and, if given, its file's mtime
+        still matches)
+        """
+
+        if name not in self.index:
+            return False
+
+        return mtime is None or self.index[name][1] == mtime
+
+    # --------------------------------------------------------------------------
+
+    def frame(self, name):
+        return self.stack[self.index[name][0]]
+
+# ==============================================================================
+
+class ScanFrameReader:
+
+    """
+    Reads a scan directory's frames (transposed to match dimensions of RSM)
+    from its packed FrameStack where current, otherwise from the TIFFs.
+    Frames are corrected with the DetectorCorrection, if given.
+    """
+
+    def __init__ (self, scan_path, correction=None):
+
+        self.scan_path = scan_path
+        self.correction = correction
+        self.frame_stack = FrameStack(scan_path)
+        self.frame_stack.open()
+
+    # --------------------------------------------------------------------------
+
+    def readFrame(self, name):
+        path = os.path.join(self.scan_path, name)
+
+        if self.frame_stack.contains(name, os.stat(path).st_mtime):
+            return self.correct(self.frame_stack.frame(name))
+
+        return self.correct(tiff.imread(path).T)
+
+    # --------------------------------------------------------------------------
+
+    def readFrames(self, names, out=None):
+
+        """
+        Returns frames as an (n_frames, n_x, n_y) array. Packed frames are
+        copied from the stack; the rest are batch-decoded. `out` is as in
+        BatchDecodeLogic.readFrames.
+        """
+
+        paths = [os.path.join(self.scan_path, name) for name in names]
+        packed = [self.frame_stack.contains(name, os.stat(path).st_mtime) \
+            for name, path in zip(names, paths)]
+
+        if out is None:
+            if all(packed):
+                return self.correct(np.stack([self.frame_stack.frame(name) \
+                    for name in names]))
+            shape, dtype = BatchDecodeLogic.frameLayout(paths[packed.index(False)])
+            out = np.empty((len(names),) + shape, dtype=dtype)
+
+        decode = [i for i in range(len(names)) if not packed[i]]
+        for i in range(len(names)):
+            if packed[i]:
+                out[i] = self.frame_stack.frame(names[i]).T
+        BatchDecodeLogic.decodeInto([paths[i] for i in decode], [out[i] for i in decode])
+
+        return self.correct(out[:len(names)].transpose(0, 2, 1))
+
+    # --------------------------------------------------------------------------
+
+    def correct(self, frames):
+        if self.correction is None:
+            return frames
+
+        return self.correction.apply(frames)
+
+    # --------------------------------------------------------------------------
+
+    def refresh(self):
+
+        """
+        Re-maps the packed stack (e.g. after it's been rebuilt)
+        """
+
+        self.frame_stack.open()
+
+# ==============================================================================
+
+class ImageSource:
+
+    """
+    A scan's frames, whatever they're stored in. Frames are addressed by
+    index (scan point) and returned transposed to match dimensions of RSM.
+    Subclasses provide image_names, getFrame (cached), readFrame/readFrames
+    (not cached, for streaming passes), frameSize, frameMtime and update.
+    """
+
+    HDF5_EXTENSIONS = (".h5", ".hdf5", ".hdf", ".nxs")
+
+    def open(path, frame_cache):
+
+        """
+        Returns the source for a scan directory of TIFFs or an HDF5 file
+        """
+
+        if os.path.isdir(path):
+            return TiffDirectorySource(path, frame_cache)
+        if path.endswith(ImageSource.HDF5_EXTENSIONS):
+            return HDF5Source(path, frame_cache)
+
+        raise ValueError("Scan must be a directory of .tif/.tiff images or an " \
+            "HDF5 file.")
+
+    # --------------------------------------------------------------------------
+
+    def frameCount(self):
+        return len(self.image_names)
+
+    # --------------------------------------------------------------------------
+
+    def correctionKey(self):
+
+        """
+        Returns a string identifying the correction frames are read with
+        ("" if none), for validating caches of derived data
+        """
+
+        correction = self.frame_cache.correction
+
+        return "" if correction is None else correction.key
+
+    # --------------------------------------------------------------------------
+
+    def prefetchFrames(self, indices):
+
+        """
+        Caches frames ahead of use (e.g. playback)
+        """
+
+        for i in indices:
+            self.getFrame(i)
+
+    # --------------------------------------------------------------------------
+
+    def scanNumber(self):
+
+        """
+        Returns the SPEC scan number from the source's name (e.g. "S840",
+        "pmn_pt011_2_1_S840.h5")
+        """
+
+        name = os.path.splitext(os.path.basename(os.path.normpath(self.path)))[0]
+        match = re.search(r"S(\d+)$", name) or re.search(r"S(\d+)", name) or \
+            re.search(r"(\d+)(?!.*\d)", name)
+        if match is None:
+            raise ValueError(f"Could not find a scan number in '{name}'.")
+
+        return int(match.group(1))
+
+# ==============================================================================
+
+class TiffDirectorySource(ImageSource):
+
+    """
+    Frames stored as one .tif/.tiff per scan point in a scan directory
+    """
+
+    def __init__ (self, scan_path, frame_cache):
+
+        self.path = scan_path
+        self.frame_cache = frame_cache
+
+        # Anything that isn't an image (e.g. a partial file left by the
+        # acquisition) is skipped
+        self.image_names = ScanDirectoryLogic.listNewImages(scan_path, set())
+
+    # --------------------------------------------------------------------------
+
+    def framePath(self, i):
+        return os.path.join(self.path, self.image_names[i])
+
+    # --------------------------------------------------------------------------
+
+    def getFrame(self, i):
+        return self.frame_cache.getFrame(self.framePath(i))
+
+    # --------------------------------------------------------------------------
+
+    def readFrame(self, i):
+        return self.frame_cache.readFrame(self.framePath(i))
+
+    # --------------------------------------------------------------------------
+
+    def readFrames(self, indices, out=None):
+        return self.frame_cache.reader(self.path).readFrames(
+            [self.image_names[i] for i in indices], out)
+
+    # --------------------------------------------------------------------------
+
+    def prefetchFrames(self, indices):
+        self.frame_cache.prefetchFrames([self.framePath(i) for i in indices])
+
+    # --------------------------------------------------------------------------
+
+    def frameSize(self, i):
+        return os.stat(self.framePath(i)).st_size
+
+    # --------------------------------------------------------------------------
+
+    def frameMtime(self, i):
+        return os.stat(self.framePath(i)).st_mtime
+
+    # --------------------------------------------------------------------------
+
+    def update(self):
+
+        """
+        Adds images written since the last update. Returns their list
+        indices and names.
+        """
+
+        new_images = ScanDirectoryLogic.listNewImages(self.path, set(self.image_names))
+        indices = ScanDirectoryLogic.insertImages(self.image_names, new_images)
+
+        return indices, new_images
+
+# ==============================================================================
+
+class HDF5Source(ImageSource):
+
+    """
+    Frames stored as a 3D (n_frames, rows, cols) dataset in an HDF5/NeXus
+    file. Frames are read one at a time through h5py, so only the chunks
+    holding a frame are decoded. Frames are never rewritten once stored.
+    """
+
+    # Checked in order before searching the file for a 3D dataset
+    DATASET_PATHS = ["entry/data/data", "entry/instrument/detector/data", "data"]
+
+    def __init__ (self, path, frame_cache, dataset_path=None):
+
+        self.path = path
+        self.frame_cache = frame_cache
+        self.dataset_path = dataset_path
+        self.lock = threading.Lock()
+
+        self.file, self.dataset = None, None
+        self.openFile()
+
+        stem = os.path.splitext(os.path.basename(path))[0]
+        self.stem = stem
+        self.image_names = [f"{stem}_{i:05d}" for i in range(self.dataset.shape[0])]
+
+    # --------------------------------------------------------------------------
+
+    def openFile(self):
+
+        """
+        Opens the file (as a SWMR reader if it was written that way) and
+        finds the frame dataset
+        """
+
+        if self.file is not None:
+            self.file.close()
+
+        try:
+            self.file = h5py.File(self.path, "r", swmr=True)
+        except (OSError, ValueError):
+            self.file = h5py.File(self.path, "r")
+
+        if self.dataset_path is None:
+            self.dataset_path = HDF5Source.findDataset(self.file)
+        self.dataset = self.file[self.dataset_path]
+
+    # --------------------------------------------------------------------------
+
+    def findDataset(file):
+
+        """
+        Returns the path of the file's detector frame dataset
+        """
+
+        for path in HDF5Source.DATASET_PATHS:
+            if path in file and isinstance(file[path], h5py.Dataset) and \
+                file[path].ndim == 3:
+                return path
+
+        paths = []
+        file.visititems(lambda name, item: paths.append(name) \
+            if isinstance(item, h5py.Dataset) and item.ndim == 3 else None)
+        if not paths:
+            raise ValueError("HDF5 file has no 3D (frame) dataset.")
+
+        return paths[0]
+
+    # --------------------------------------------------------------------------
+
+    def getFrame(self, i):
+        key = f"{self.path}::{self.dataset_path}::{i}"
+
+        frame = self.frame_cache.findFrame(key)
+        if frame is None:
+            frame = self.readFrame(i)
+            self.frame_cache.addFrame(key, None, frame)
+
+        return frame
+
+    # --------------------------------------------------------------------------
+
+    def readFrame(self, i):
+
+        # h5py isn't safe for concurrent reads of one file
+        with self.lock:
+            frame = self.dataset[i].T
+
+        return self.frame_cache.correct(frame)
+
+    # --------------------------------------------------------------------------
+
+    def readFrames(self, indices, out=None):
+
+        """
+        Returns frames as an (n_frames, n_x, n_y) array. `out` may be a
+        preallocated (n_frames, rows, cols) array to read into.
+        """
+
+        if out is None:
+            out = np.empty((len(indices),) + self.dataset.shape[1:],
+                dtype=self.dataset.dtype)
+
+        with self.lock:
+            for slot, i in enumerate(indices):
+                self.dataset.read_direct(out, np.s_[i], np.s_[slot])
+
+        return self.frame_cache.correct(out[:len(indices)].transpose(0, 2, 1))
+
+    # --------------------------------------------------------------------------
+
+    def frameSize(self, i):
+        return int(np.prod(self.dataset.shape[1:])) * self.dataset.dtype.itemsize
+
+    # --------------------------------------------------------------------------
+
+    def frameMtime(self, i):
+
+        # Frames have no timestamps of their own; any write to the file
+        # (e.g. a rewritten frame) invalidates results cached against it
+        return os.stat(self.path).st_mtime
+
+    # --------------------------------------------------------------------------
+
+    def update(self):
+
+        """
+        Picks up frames appended to the dataset. Returns their list indices
+        and names.
+        """
+
+        with self.lock:
+            try:
+                if self.file.id.valid and self.file.swmr_mode:
+                    self.dataset.refresh()
+                else:
+                    self.openFile()
+            except (OSError, KeyError, ValueError):
+                # File caught mid-write; tried again on the next update
+                return [], []
+
+            n_frames = self.dataset.shape[0]
+
+        indices = list(range(len(self.image_names), n_frames))
+        new_images = [f"{self.stem}_{i:05d}" for i in indices]
+        self.image_names.extend(new_images)
+
+        return indices, new_images
+
+# ==============================================================================
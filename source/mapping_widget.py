@@ -5,19 +5,19 @@ See LICENSE file.
 
 # ==============================================================================
 
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.colors as colors
 import matplotlib.pyplot as plt
 import numpy as np
-import os
 import pyqtgraph as pg
 from pyqtgraph.dockarea import *
 from pyqtgraph.Qt import QtGui, QtCore
-from rsMap3D.datasource.DetectorGeometryForXrayutilitiesReader import DetectorGeometryForXrayutilitiesReader as detReader
 from rsMap3D.datasource.InstForXrayutilitiesReader import InstForXrayutilitiesReader as instrReader
 from spec2nexus import spec
-import tifffile as tiff
+from source.image_logic import *
+from source.rsm_logic import *
+import threading
 import xml.etree.ElementTree as ET
-import xrayutilities as xu
 
 # ==============================================================================
 
@@ -38,23 +38,43 @@ class MappingWidget(QtGui.QWidget):
         self.options_widget.setEnabled(False)
         self.analysis_widget = AnalysisWidget(self)
         self.analysis_widget.setEnabled(False)
+        self.statistics_widget = StatisticsWidget(self)
+        self.statistics_widget.setEnabled(False)
+        self.trace_widget = TraceWidget(self)
+        self.trace_widget.setEnabled(False)
+        self.plane_widget = PlaneWidget(self)
+        self.plane_widget.setEnabled(False)
         self.rsm_dialog = RSMDialog()
 
+        # Frames are corrected with the selected detector config's mask and
+        # flat field
+        self.rsm_dialog.closed.connect(self.scan_control_widget.updateCorrection)
+
         # Main Widget Docks
         self.dock_area = DockArea()
         self.scan_control_dock = Dock("Scan Control", size=(100, 300), hideTitle=True)
         self.options_dock = Dock("Options", size=(100, 100), hideTitle=True)
-        self.analysis_dock = Dock("Analysis", size=(300, 100), hideTitle=True)
+        self.analysis_dock = Dock("Analysis", size=(300, 100))
+        self.statistics_dock = Dock("Statistics", size=(300, 100))
+        self.trace_dock = Dock("Pixel Trace", size=(300, 100))
+        self.plane_dock = Dock("HKL Plane", size=(300, 100))
         self.image_dock = Dock("Image", size=(300, 300), hideTitle=True)
         self.scan_control_dock.addWidget(self.scan_control_widget)
         self.options_dock.addWidget(self.options_widget)
         self.analysis_dock.addWidget(self.analysis_widget)
+        self.statistics_dock.addWidget(self.statistics_widget)
+        self.trace_dock.addWidget(self.trace_widget)
+        self.plane_dock.addWidget(self.plane_widget)
         self.image_dock.addWidget(self.image_widget)
         self.dock_area.addDock(self.scan_control_dock)
         self.dock_area.addDock(self.options_dock, "bottom", self.scan_control_dock)
         self.dock_area.addDock(self.analysis_dock, "right", self.options_dock)
         self.dock_area.addDock(self.image_dock, "top", self.analysis_dock)
         self.dock_area.moveDock(self.image_dock, "right", self.scan_control_dock)
+        self.dock_area.addDock(self.statistics_dock, "above", self.analysis_dock)
+        self.dock_area.addDock(self.trace_dock, "above", self.statistics_dock)
+        self.dock_area.addDock(self.plane_dock, "above", self.trace_dock)
+        self.analysis_dock.raiseDock()
 
         self.layout = QtGui.QVBoxLayout()
         self.setLayout(self.layout)
@@ -91,11 +111,53 @@ class ScanControlWidget(QtGui.QWidget):
         # Absolute path for current image in view
         self.current_image_path = ""
 
+        # Decoded frames shared by display/analysis
+        self.frame_cache = FrameCache()
+
+        # Frames of the current scan (TIFF directory or HDF5 file)
+        self.image_source = None
+
+        # Running median/percentile background (built on request)
+        self.background_model = None
+
+        # Frame thumbnails shown as image list icons as they're made
+        self.thumbnail_cache = None
+        self.thumbnails_shown = None
+        self.thumbnail_timer = QtCore.QTimer()
+        self.thumbnail_interval = 250
+
+        # Decodes frames ahead of playback
+        self.prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.prefetch_size = 32
+
+        # Geometry of the current scan (created on request)
+        self.geometry = None
+        self.geometry_key = None
+
+        # HKL -> (frame, pixel) index for the current scan (built on request,
+        # in the background); callbacks wait for it while it's built
+        self.hkl_index = None
+        self.hkl_index_loader = None
+        self.hkl_index_callbacks = []
+        self.hkl_index_timer = QtCore.QTimer()
+        self.hkl_index_interval = 250
+
+        # Frame range projections for the current scan
+        self.projector = None
+
+        # Watches scan directory/file for new frames (inotify where available,
+        # plus polling for network filesystems that don't report changes)
+        self.scan_watcher = QtCore.QFileSystemWatcher()
+        self.scan_poll_timer = QtCore.QTimer()
+        self.scan_poll_interval = 2000
+
         # Widget contents
         self.select_scan_btn = QtGui.QPushButton("Select Scan")
+        self.select_hdf5_btn = QtGui.QPushButton("Select HDF5 File")
         self.select_scan_txt = QtGui.QLineEdit()
         self.select_scan_txt.setReadOnly(True)
         self.scan_images_list_widget = QtGui.QListWidget()
+        self.scan_images_list_widget.setIconSize(QtCore.QSize(64, 64))
         self.current_image_lbl = QtGui.QLabel("Current Image:")
         self.current_image_txt = QtGui.QLineEdit()
         self.current_image_txt.setReadOnly(True)
@@ -103,55 +165,137 @@ class ScanControlWidget(QtGui.QWidget):
         self.play_scan_btn.setEnabled(False)
         self.rsm_btn = QtGui.QPushButton("Create Reciprocal Space Map")
         self.rsm_btn.setEnabled(False)
+        self.watch_scan_chkbox = QtGui.QCheckBox("Watch Scan")
+        self.watch_scan_chkbox.setEnabled(False)
+        self.follow_latest_chkbox = QtGui.QCheckBox("Follow Latest Frame")
+        self.follow_latest_chkbox.setEnabled(False)
+        self.pack_frames_btn = QtGui.QPushButton("Pack Frames")
+        self.pack_frames_btn.setEnabled(False)
+
+        # Packs the scan into a FrameStack in the background
+        self.frame_stack = None
+        self.pack_thread = None
+        self.pack_timer = QtCore.QTimer()
+        self.pack_interval = 500
 
         # Layout
         self.layout = QtGui.QGridLayout()
         self.setLayout(self.layout)
         self.layout.addWidget(self.select_scan_btn, 0, 0)
-        self.layout.addWidget(self.select_scan_txt, 0, 1)
-        self.layout.addWidget(self.scan_images_list_widget, 1, 0, 4, 2)
-        self.layout.addWidget(self.current_image_lbl, 5, 0)
-        self.layout.addWidget(self.current_image_txt, 5, 1)
-        self.layout.addWidget(self.play_scan_btn, 6, 0, 1, 2)
-        self.layout.addWidget(self.rsm_btn, 7, 0, 1, 2)
+        self.layout.addWidget(self.select_hdf5_btn, 0, 1)
+        self.layout.addWidget(self.select_scan_txt, 1, 0, 1, 2)
+        self.layout.addWidget(self.scan_images_list_widget, 2, 0, 4, 2)
+        self.layout.addWidget(self.current_image_lbl, 6, 0)
+        self.layout.addWidget(self.current_image_txt, 6, 1)
+        self.layout.addWidget(self.play_scan_btn, 7, 0, 1, 2)
+        self.layout.addWidget(self.rsm_btn, 8, 0, 1, 2)
+        self.layout.addWidget(self.watch_scan_chkbox, 9, 0)
+        self.layout.addWidget(self.follow_latest_chkbox, 9, 1)
+        self.layout.addWidget(self.pack_frames_btn, 10, 0, 1, 2)
 
         # Signals
         self.select_scan_btn.clicked.connect(self.selectScan)
+        self.select_hdf5_btn.clicked.connect(self.selectHDF5File)
         self.scan_images_list_widget.itemClicked.connect(self.selectImage)
         self.play_scan_btn.clicked.connect(self.playScan)
         self.rsm_btn.clicked.connect(self.openRSMDialog)
+        self.watch_scan_chkbox.toggled.connect(self.toggleWatchScan)
+        self.follow_latest_chkbox.toggled.connect(self.followLatestImage)
+        self.pack_frames_btn.clicked.connect(self.packFrames)
+        self.pack_timer.timeout.connect(self.updatePackProgress)
+        self.thumbnail_timer.timeout.connect(self.updateThumbnails)
+        self.hkl_index_timer.timeout.connect(self.updateHKLIndexProgress)
+        self.scan_watcher.directoryChanged.connect(self.updateScanImages)
+        self.scan_watcher.fileChanged.connect(self.updateScanImages)
+        self.scan_poll_timer.timeout.connect(self.updateScanImages)
 
     # --------------------------------------------------------------------------
 
     def selectScan(self):
         """
-        - Sets scan to view
-        - Enables other widgets after set
+        Sets scan to view from a directory of .tif/.tiff images
         """
 
-        self.scan_path = QtGui.QFileDialog.getExistingDirectory(self, \
+        scan_path = QtGui.QFileDialog.getExistingDirectory(self, \
             "Select Scan Directory")
-        
-        if self.scan_path != "":
-            for file in os.listdir(self.scan_path):
-                if not file.endswith((".tif", ".tiff")):
-                    error_mbx = QtGui.QMessageBox()
-                    error_mbx.setText("Directory must include only .tif/.tiff images.")
-                    error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
-                    error_mbx.exec_()
-                    return
 
-            self.scan_number = int(os.path.basename(self.scan_path)[1:])
-            self.select_scan_txt.setText(self.scan_path)
-            self.scan_images = sorted(os.listdir(self.scan_path))
+        if scan_path != "":
+            self.openScan(scan_path)
+
+    # --------------------------------------------------------------------------
+
+    def selectHDF5File(self):
+        """
+        Sets scan to view from an HDF5/NeXus detector stack
+        """
+
+        scan_path, _ = QtGui.QFileDialog.getOpenFileName(self, \
+            "Select HDF5 File", "", "HDF5 Files (*.h5 *.hdf5 *.hdf *.nxs)")
+
+        if scan_path != "":
+            self.openScan(scan_path)
+
+    # --------------------------------------------------------------------------
 
-            self.scan_images_list_widget.clear()
-            self.scan_images_list_widget.addItems(self.scan_images)
+    def openScan(self, scan_path):
+        """
+        - Opens scan's image source
+        - Enables other widgets after set
+        """
 
-            self.play_scan_btn.setEnabled(True)
-            self.rsm_btn.setEnabled(True)
-            self.parent.options_widget.setEnabled(True)
-            self.parent.analysis_widget.setEnabled(True)
+        try:
+            image_source = ImageSource.open(scan_path, self.frame_cache)
+            scan_number = image_source.scanNumber()
+        except Exception as ex:
+            error_mbx = QtGui.QMessageBox()
+            error_mbx.setText(str(ex))
+            error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+            error_mbx.exec_()
+            return
+
+        # Stops watching previous scan
+        self.stopWatching()
+
+        self.scan_path = scan_path
+        self.image_source = image_source
+        self.scan_number = scan_number
+        self.geometry = None
+        self.resetHKLIndex()
+        self.resetBackgroundModel()
+        self.parent.analysis_widget.region_pixels = {}
+        self.parent.statistics_widget.clear()
+        self.parent.trace_widget.clear()
+        self.parent.plane_widget.clear()
+        self.select_scan_txt.setText(self.scan_path)
+        # Shared with the source, so updates show up in both
+        self.scan_images = self.image_source.image_names
+
+        self.scan_images_list_widget.clear()
+        self.scan_images_list_widget.addItems(self.scan_images)
+        self.startThumbnails()
+
+        if self.projector is not None:
+            self.projector.shutdown()
+        self.projector = FrameProjector(self.image_source)
+        self.parent.options_widget.setFrameCount(len(self.scan_images))
+        self.parent.options_widget.projection_end_sbx.setValue(len(self.scan_images) - 1)
+
+        self.play_scan_btn.setEnabled(True)
+        self.rsm_btn.setEnabled(True)
+        self.watch_scan_chkbox.setEnabled(True)
+        self.follow_latest_chkbox.setEnabled(True)
+        # Only TIFF directories are packed; HDF5 files are already a stack
+        self.pack_frames_btn.setEnabled(
+            isinstance(self.image_source, TiffDirectorySource) and \
+            (self.pack_thread is None or not self.pack_thread.is_alive()))
+        self.parent.options_widget.setEnabled(True)
+        self.parent.analysis_widget.setEnabled(True)
+        self.parent.statistics_widget.setEnabled(True)
+        self.parent.trace_widget.setEnabled(True)
+        self.parent.plane_widget.setEnabled(True)
+
+        if self.watch_scan_chkbox.isChecked():
+            self.toggleWatchScan(True)
 
     # --------------------------------------------------------------------------
 
@@ -168,10 +312,328 @@ class ScanControlWidget(QtGui.QWidget):
         self.current_image_index = self.scan_images.index(current_image_basename)
 
         # Transposed to match dimensions of RSM
-        image = tiff.imread(self.current_image_path).T
+        image = self.image_source.getFrame(self.current_image_index)
+        if self.parent.options_widget.background_chkbox.isChecked():
+            image = self.backgroundModel().subtract(image, self.current_image_index)
         self.parent.image_widget.displayImage(image)
+        self.parent.image_widget.markPixel(None)
         self.createRSM()
         self.parent.analysis_widget.updateMaxInfo()
+        self.parent.analysis_widget.updateRegionOverlay()
+        self.parent.statistics_widget.updateFrameLine(self.current_image_index)
+        self.parent.plane_widget.updatePlane()
+
+    # --------------------------------------------------------------------------
+
+    def startThumbnails(self):
+        """
+        (Re)starts making thumbnails for the scan's frames; saved ones are
+        shown right away
+        """
+
+        if self.thumbnail_cache is not None:
+            self.thumbnail_cache.stop()
+
+        self.thumbnail_cache = ThumbnailCache(self.image_source)
+        self.thumbnails_shown = np.zeros(len(self.thumbnail_cache.image_names), dtype=bool)
+        self.thumbnail_cache.start()
+        self.updateThumbnails()
+        self.thumbnail_timer.start(self.thumbnail_interval)
+
+    # --------------------------------------------------------------------------
+
+    def queueThumbnails(self, indices):
+        """
+        Queues frames inserted into the image list (at `indices`, in order)
+        onto the thumbnail cache
+        """
+
+        for index in indices:
+            self.thumbnails_shown = np.insert(self.thumbnails_shown, index, False)
+
+        self.thumbnail_cache.update()
+        if not self.thumbnail_timer.isActive():
+            self.thumbnail_timer.start(self.thumbnail_interval)
+
+    # --------------------------------------------------------------------------
+
+    def refreshThumbnails(self):
+        """
+        Redraws thumbnails (e.g. with a new colormap)
+        """
+
+        if self.thumbnails_shown is not None:
+            self.thumbnails_shown[:] = False
+            self.updateThumbnails()
+
+    # --------------------------------------------------------------------------
+
+    def updateThumbnails(self):
+        """
+        Sets list icons for thumbnails made since the last update
+        """
+
+        thumbnail_cache = self.thumbnail_cache
+        running = thumbnail_cache.isRunning()
+        new_frames = np.flatnonzero(thumbnail_cache.done & ~self.thumbnails_shown)
+
+        if len(new_frames):
+            n_x, n_y = thumbnail_cache.thumbnails.shape[1:]
+            self.scan_images_list_widget.setIconSize(QtCore.QSize(n_x, n_y))
+
+        image_widget = self.parent.image_widget
+        for frame in new_frames:
+            item = self.scan_images_list_widget.item(int(frame))
+            if item is None:
+                continue
+            # Rows of a QImage run along y
+            thumbnail = thumbnail_cache.thumbnails[frame].T / 255
+            color_image = np.ascontiguousarray(
+                image_widget.setColormap(thumbnail) * 255, dtype=np.ubyte)
+            q_image = QtGui.QImage(color_image.data, color_image.shape[1],
+                color_image.shape[0], color_image.strides[0],
+                QtGui.QImage.Format_RGBA8888)
+            item.setIcon(QtGui.QIcon(QtGui.QPixmap.fromImage(q_image)))
+            self.thumbnails_shown[frame] = True
+
+        if not running:
+            self.thumbnail_timer.stop()
+
+    # --------------------------------------------------------------------------
+
+    def backgroundModel(self):
+        """
+        Returns the scan's background model, recreated if its window or
+        percentile changed
+        """
+
+        options_widget = self.parent.options_widget
+        window = options_widget.background_window_sbx.value()
+        percentile = options_widget.background_percentile_sbx.value()
+
+        if self.background_model is None or self.background_model.window != window \
+            or self.background_model.percentile != percentile:
+            self.resetBackgroundModel()
+            self.background_model = BackgroundModel(self.image_source, window,
+                percentile)
+
+        return self.background_model
+
+    # --------------------------------------------------------------------------
+
+    def resetBackgroundModel(self):
+        if self.background_model is not None:
+            self.background_model.shutdown()
+        self.background_model = None
+
+    # --------------------------------------------------------------------------
+
+    def toggleWatchScan(self, state):
+        """
+        Starts/stops watching the scan directory for new frames
+        """
+
+        if state:
+            if self.scan_path not in self.scan_watcher.directories() + \
+                self.scan_watcher.files():
+                self.scan_watcher.addPath(self.scan_path)
+            self.scan_poll_timer.start(self.scan_poll_interval)
+            self.updateScanImages()
+        else:
+            self.stopWatching()
+
+    # --------------------------------------------------------------------------
+
+    def stopWatching(self):
+        watched_paths = self.scan_watcher.directories() + self.scan_watcher.files()
+
+        if watched_paths:
+            self.scan_watcher.removePaths(watched_paths)
+        self.scan_poll_timer.stop()
+
+    # --------------------------------------------------------------------------
+
+    def updateScanImages(self):
+        """
+        - Appends frames written since the last update to the image list
+        - Only new files are validated
+        - Displays latest frame if following
+        """
+
+        n_images = len(self.scan_images)
+        indices, new_images = self.image_source.update()
+
+        if len(new_images) == 0:
+            return
+
+        for index, image in zip(indices, new_images):
+            self.scan_images_list_widget.insertItem(index, image)
+
+        # Cached projections stay valid only if frames were appended
+        if min(indices) < n_images:
+            self.projector.shutdown()
+            self.projector = FrameProjector(self.image_source)
+        # Windows near the end of the scan have changed
+        if self.background_model is not None:
+            self.background_model.clear()
+        self.queueThumbnails(indices)
+        self.parent.options_widget.setFrameCount(len(self.scan_images))
+
+        if self.follow_latest_chkbox.isChecked():
+            self.followLatestImage()
+
+    # --------------------------------------------------------------------------
+
+    def followLatestImage(self, state=True):
+        """
+        Displays the most recent frame in the scan
+        """
+
+        count = self.scan_images_list_widget.count()
+
+        if state and count > 0:
+            latest_item = self.scan_images_list_widget.item(count - 1)
+
+            if self.parent.rsm_dialog.files_set:
+                geometry = self.scanGeometry()
+                geometry.refresh()
+                if count > geometry.pointCount():
+                    # Frame's SPEC point not written yet; the next directory
+                    # update tries again
+                    return
+
+            self.scan_images_list_widget.setCurrentItem(latest_item)
+            self.selectImage(latest_item)
+
+    # --------------------------------------------------------------------------
+
+    def packFrames(self):
+        """
+        Packs the scan's frames into a single memory-mapped stack beside the
+        scan directory (read by the Mapping tab and gridding from then on)
+        """
+
+        self.frame_stack = FrameStack(self.scan_path)
+        self.pack_thread = threading.Thread(target=self.frame_stack.build,
+            args=(list(self.scan_images),), daemon=True)
+        self.pack_thread.start()
+        self.pack_frames_btn.setEnabled(False)
+        self.pack_timer.start(self.pack_interval)
+
+    # --------------------------------------------------------------------------
+
+    def updatePackProgress(self):
+        n_frames = len(self.scan_images)
+
+        if self.pack_thread.is_alive():
+            self.pack_frames_btn.setText(f"Packing: {self.frame_stack.frames_done}/{n_frames}")
+            return
+
+        self.pack_timer.stop()
+        self.pack_frames_btn.setText("Pack Frames")
+        self.pack_frames_btn.setEnabled(True)
+        self.frame_cache.refreshStack(self.frame_stack.scan_path)
+
+    # --------------------------------------------------------------------------
+
+    def jumpToFrame(self, frame, pixel=None):
+        """
+        Displays a frame of the scan and optionally marks a pixel in it
+        """
+
+        item = self.scan_images_list_widget.item(int(frame))
+
+        if item is not None:
+            self.scan_images_list_widget.setCurrentItem(item)
+            self.selectImage(item)
+            self.parent.image_widget.markPixel(pixel)
+
+    # --------------------------------------------------------------------------
+
+    def scanGeometry(self):
+        """
+        Returns the scan's geometry from the dialog's .spec and config files,
+        reused while they're unchanged
+        """
+
+        rsm_dialog = self.parent.rsm_dialog
+        if not rsm_dialog.files_set:
+            raise ValueError("Set .spec and config files (Create Reciprocal " \
+                "Space Map) first.")
+
+        key = (rsm_dialog.spec_path, self.scan_number, rsm_dialog.detector_path,
+            rsm_dialog.instrument_path)
+        if self.geometry is None or self.geometry_key != key:
+            self.geometry = ScanGeometry(*key)
+            self.geometry_key = key
+
+        return self.geometry
+
+    # --------------------------------------------------------------------------
+
+    def loadHKLIndex(self, callback):
+        """
+        Calls `callback(index)` with the scan's HKL index. The first time,
+        the index is loaded from disk or built (slow for large scans) in the
+        background, and the callback runs once it's ready.
+        """
+
+        if self.hkl_index is not None:
+            callback(self.hkl_index)
+            return
+
+        if self.hkl_index_loader is None:
+            self.hkl_index_loader = HKLIndexLoader(self.scanGeometry(), self.scan_path)
+            self.hkl_index_loader.start()
+            self.hkl_index_timer.start(self.hkl_index_interval)
+
+        self.hkl_index_callbacks.append(callback)
+        self.updateHKLIndexProgress()
+
+    # --------------------------------------------------------------------------
+
+    def updateHKLIndexProgress(self):
+        """
+        Shows index build progress; hands the index to waiting callbacks
+        (or reports the error) once the background thread ends
+        """
+
+        loader = self.hkl_index_loader
+        analysis_widget = self.parent.analysis_widget
+
+        if loader.isRunning():
+            analysis_widget.setIndexProgress(loader.done, loader.total)
+            return
+
+        self.hkl_index_timer.stop()
+        analysis_widget.setIndexProgress(None)
+        callbacks, self.hkl_index_callbacks = self.hkl_index_callbacks, []
+
+        if loader.error is not None:
+            self.hkl_index_loader = None
+            error_mbx = QtGui.QMessageBox()
+            error_mbx.setText(f"Could not build HKL index: {loader.error}")
+            error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+            error_mbx.exec_()
+            return
+
+        self.hkl_index = loader.index
+        for callback in callbacks:
+            callback(self.hkl_index)
+
+    # --------------------------------------------------------------------------
+
+    def resetHKLIndex(self):
+        """
+        Drops the index (a build still running for the previous scan is
+        left to finish, and its result ignored)
+        """
+
+        self.hkl_index_timer.stop()
+        self.hkl_index = None
+        self.hkl_index_loader = None
+        self.hkl_index_callbacks = []
+        self.parent.analysis_widget.setIndexProgress(None)
 
     # --------------------------------------------------------------------------
 
@@ -180,13 +642,56 @@ class ScanControlWidget(QtGui.QWidget):
         Loops through scan images
         """
 
-        for i in range(self.scan_images_list_widget.count()):
+        count = self.scan_images_list_widget.count()
+        block = self.prefetch_size
+
+        # Next block of frames is batch-decoded in the background while the
+        # current one plays
+        self.image_source.prefetchFrames(range(0, min(block, count)))
+
+        for i in range(count):
+            if i % block == 0 and i + block < count:
+                self.prefetcher.submit(self.image_source.prefetchFrames,
+                    range(i + block, min(i + 2 * block, count)))
             self.selectImage(self.scan_images_list_widget.item(i))
             # Refreshes GUI; inefficient
             QtGui.QApplication.processEvents()
 
     # --------------------------------------------------------------------------
 
+    def updateCorrection(self):
+        """
+        Applies the bad-pixel mask/flat field beside the selected detector
+        config (if any) to every frame read from now on
+        """
+
+        rsm_dialog = self.parent.rsm_dialog
+
+        try:
+            correction = DetectorCorrection.fromConfig(rsm_dialog.detector_path) \
+                if rsm_dialog.files_set else None
+        except Exception as ex:
+            correction = None
+            error_mbx = QtGui.QMessageBox()
+            error_mbx.setText(f"Detector correction not applied: {ex}")
+            error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+            error_mbx.exec_()
+
+        if not self.frame_cache.setCorrection(correction):
+            return
+
+        if self.projector is not None:
+            self.projector.clear()
+        if self.background_model is not None:
+            self.background_model.clear()
+        self.startThumbnails()
+
+        current_item = self.scan_images_list_widget.currentItem()
+        if current_item is not None:
+            self.selectImage(current_item)
+
+    # --------------------------------------------------------------------------
+
     def openRSMDialog(self):
         """
         Opens dialog to set .spec and config files
@@ -387,18 +892,61 @@ class OptionsWidget(QtGui.QWidget):
         self.cmap_scale_cbx = QtGui.QComboBox()
         self.cmap_scale_cbx.addItems(["Logarithmic", "Linear"])
 
+        self.projection_lbl = QtGui.QLabel("Projection:")
+        self.projection_cbx = QtGui.QComboBox()
+        self.projection_cbx.addItems(["Sum", "Max", "Mean"])
+        self.projection_frames_lbl = QtGui.QLabel("Frames:")
+        self.projection_start_sbx = QtGui.QSpinBox()
+        self.projection_end_sbx = QtGui.QSpinBox()
+        self.project_btn = QtGui.QPushButton("Project Frames")
+
+        self.background_chkbox = QtGui.QCheckBox("Subtract Background")
+        self.background_window_lbl = QtGui.QLabel("Window:")
+        self.background_window_sbx = QtGui.QSpinBox()
+        self.background_window_sbx.setRange(3, 201)
+        self.background_window_sbx.setSingleStep(2)
+        self.background_window_sbx.setValue(15)
+        self.background_percentile_sbx = QtGui.QSpinBox()
+        self.background_percentile_sbx.setRange(0, 100)
+        self.background_percentile_sbx.setValue(50)
+        self.background_percentile_sbx.setSuffix(" %")
+
+        # Polls the background projection
+        self.projection_future = None
+        self.projection_timer = QtCore.QTimer()
+        self.projection_interval = 100
+
         self.layout = QtGui.QGridLayout()
         self.setLayout(self.layout)
         self.layout.addWidget(self.cmap_lbl, 0, 0)
-        self.layout.addWidget(self.cmap_cbx, 0, 1)
+        self.layout.addWidget(self.cmap_cbx, 0, 1, 1, 2)
         self.layout.addWidget(self.cmap_scale_lbl, 1, 0)
-        self.layout.addWidget(self.cmap_scale_cbx, 1, 1)
+        self.layout.addWidget(self.cmap_scale_cbx, 1, 1, 1, 2)
+        self.layout.addWidget(self.projection_lbl, 2, 0)
+        self.layout.addWidget(self.projection_cbx, 2, 1, 1, 2)
+        self.layout.addWidget(self.projection_frames_lbl, 3, 0)
+        self.layout.addWidget(self.projection_start_sbx, 3, 1)
+        self.layout.addWidget(self.projection_end_sbx, 3, 2)
+        self.layout.addWidget(self.project_btn, 4, 0, 1, 3)
+        self.layout.addWidget(self.background_chkbox, 5, 0, 1, 3)
+        self.layout.addWidget(self.background_window_lbl, 6, 0)
+        self.layout.addWidget(self.background_window_sbx, 6, 1)
+        self.layout.addWidget(self.background_percentile_sbx, 6, 2)
+
+        self.project_btn.clicked.connect(self.projectFrames)
+        self.projection_timer.timeout.connect(self.updateProjection)
+        self.background_chkbox.toggled.connect(self.updateBackground)
+        self.background_window_sbx.editingFinished.connect(self.updateBackground)
+        self.background_percentile_sbx.editingFinished.connect(self.updateBackground)
 
         self.cmap_cbx.currentIndexChanged.connect(
             lambda x: self.parent.image_widget.displayImage(
                 self.parent.image_widget.image
             )
         )
+        self.cmap_cbx.currentIndexChanged.connect(
+            lambda x: self.parent.scan_control_widget.refreshThumbnails()
+        )
 
         self.cmap_scale_cbx.currentIndexChanged.connect(
             lambda x: self.parent.image_widget.displayImage(
@@ -406,6 +954,78 @@ class OptionsWidget(QtGui.QWidget):
             )
         )
 
+    # --------------------------------------------------------------------------
+
+    def setFrameCount(self, count):
+        """
+        Limits projection range spinboxes to the scan's frames
+        """
+
+        at_end = self.projection_end_sbx.value() == self.projection_end_sbx.maximum()
+        self.projection_start_sbx.setRange(0, max(count - 1, 0))
+        self.projection_end_sbx.setRange(0, max(count - 1, 0))
+        if at_end:
+            self.projection_end_sbx.setValue(count - 1)
+
+    # --------------------------------------------------------------------------
+
+    def updateBackground(self):
+        """
+        Redisplays the current frame with the new background settings
+        """
+
+        scan_control_widget = self.parent.scan_control_widget
+        current_item = scan_control_widget.scan_images_list_widget.currentItem()
+
+        if current_item is not None:
+            scan_control_widget.selectImage(current_item)
+
+    # --------------------------------------------------------------------------
+
+    def projectFrames(self):
+        """
+        Starts projecting the selected (inclusive) frame range in the
+        background
+        """
+
+        projector = self.parent.scan_control_widget.projector
+        start = self.projection_start_sbx.value()
+        end = self.projection_end_sbx.value() + 1
+
+        self.projection_future = projector.submit(min(start, end - 1), max(start + 1, end))
+        self.project_btn.setEnabled(False)
+        self.projection_timer.start(self.projection_interval)
+
+    # --------------------------------------------------------------------------
+
+    def updateProjection(self):
+        """
+        Displays the projection once it's done
+        """
+
+        if self.projection_future is None or not self.projection_future.done():
+            return
+
+        self.projection_timer.stop()
+        self.project_btn.setEnabled(True)
+
+        try:
+            projection_sum, projection_max, projection_mean = \
+                self.projection_future.result()
+        except Exception as ex:
+            error_mbx = QtGui.QMessageBox()
+            error_mbx.setText(str(ex))
+            error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+            error_mbx.exec_()
+            return
+
+        projection = {"Sum": projection_sum, "Max": projection_max,
+            "Mean": projection_mean}[self.projection_cbx.currentText()]
+        self.parent.image_widget.displayImage(projection)
+        self.parent.scan_control_widget.current_image_txt.setText(
+            f"{self.projection_cbx.currentText()} of frames " \
+            f"{self.projection_start_sbx.value()}-{self.projection_end_sbx.value()}")
+
 # ==============================================================================
 
 class AnalysisWidget(QtGui.QWidget):
@@ -448,11 +1068,82 @@ class AnalysisWidget(QtGui.QWidget):
             self.rsm_params_layout.addWidget(txt, i, 1)
             txt.setReadOnly(True)
 
+        self.find_gbx = QtGui.QGroupBox("Find HKL")
+        self.find_lbls = [QtGui.QLabel(i) for i in ["H:", "K:", "L:", "Tolerance:"]]
+        self.find_sbxs = [QtGui.QDoubleSpinBox() for i in self.find_lbls]
+        for sbx in self.find_sbxs:
+            sbx.setDecimals(4)
+            sbx.setRange(-1000, 1000)
+        self.find_sbxs[3].setRange(0, 1000)
+        self.find_sbxs[3].setSingleStep(0.001)
+        self.find_sbxs[3].setValue(0.005)
+        self.find_btn = QtGui.QPushButton("Find Frames")
+        self.find_results_list_widget = QtGui.QListWidget()
+        self.find_layout = QtGui.QGridLayout()
+        self.find_gbx.setLayout(self.find_layout)
+        for lbl, sbx, i in zip(self.find_lbls, self.find_sbxs, range(len(self.find_lbls))):
+            self.find_layout.addWidget(lbl, i, 0)
+            self.find_layout.addWidget(sbx, i, 1)
+        self.find_layout.addWidget(self.find_btn, 4, 0, 1, 2)
+        self.find_layout.addWidget(self.find_results_list_widget, 5, 0, 1, 2)
+
+        # (frame, pixel) for each row of the results list
+        self.find_results = []
+
+        self.region_gbx = QtGui.QGroupBox("HKL Region")
+        self.region_lbls = [QtGui.QLabel(i) for i in ["H:", "K:", "L:"]]
+        self.region_min_sbxs = [QtGui.QDoubleSpinBox() for i in self.region_lbls]
+        self.region_max_sbxs = [QtGui.QDoubleSpinBox() for i in self.region_lbls]
+        for sbx in self.region_min_sbxs + self.region_max_sbxs:
+            sbx.setDecimals(4)
+            sbx.setRange(-1000, 1000)
+            sbx.setSingleStep(0.01)
+        self.region_roi_btn = QtGui.QPushButton("From Gridding ROI")
+        self.region_btn = QtGui.QPushButton("Select Region")
+        self.region_overlay_chkbox = QtGui.QCheckBox("Show Overlay")
+        self.region_overlay_chkbox.setChecked(True)
+        self.region_plot_widget = pg.PlotWidget()
+        self.region_plot_widget.setLabel(axis="bottom", text="Frame")
+        self.region_plot_widget.setLabel(axis="left", text="Region Counts")
+        self.region_layout = QtGui.QGridLayout()
+        self.region_gbx.setLayout(self.region_layout)
+        for lbl, min_sbx, max_sbx, i in zip(self.region_lbls, self.region_min_sbxs,
+            self.region_max_sbxs, range(len(self.region_lbls))):
+            self.region_layout.addWidget(lbl, i, 0)
+            self.region_layout.addWidget(min_sbx, i, 1)
+            self.region_layout.addWidget(max_sbx, i, 2)
+        self.region_layout.addWidget(self.region_roi_btn, 3, 0, 1, 3)
+        self.region_layout.addWidget(self.region_btn, 4, 0, 1, 2)
+        self.region_layout.addWidget(self.region_overlay_chkbox, 4, 2)
+        self.region_layout.addWidget(self.region_plot_widget, 0, 3, 5, 1)
+
+        # Region pixels of each frame ({frame: flat pixel indices})
+        self.region_pixels = {}
+        self.region_counts = None
+
+        # Sums region counts in the background (reads every frame the
+        # region touches); done/total frames are polled for the button
+        self.region_driver = ThreadPoolExecutor(max_workers=1)
+        self.region_future = None
+        self.region_source = None
+        self.region_progress = (0, 0)
+        self.region_timer = QtCore.QTimer()
+        self.region_interval = 100
+
         self.layout = QtGui.QGridLayout()
         self.setLayout(self.layout)
         self.layout.addWidget(self.mouse_gbx, 0, 0)
         self.layout.addWidget(self.max_gbx, 0, 1)
         self.layout.addWidget(self.rsm_params_gbx, 0, 2)
+        self.layout.addWidget(self.find_gbx, 0, 3)
+        self.layout.addWidget(self.region_gbx, 0, 4)
+
+        self.find_btn.clicked.connect(self.findHKL)
+        self.find_results_list_widget.currentRowChanged.connect(self.selectFindResult)
+        self.region_roi_btn.clicked.connect(self.setRegionFromGriddingROI)
+        self.region_btn.clicked.connect(self.selectRegion)
+        self.region_overlay_chkbox.toggled.connect(self.updateRegionOverlay)
+        self.region_timer.timeout.connect(self.updateRegionCounts)
 
     # --------------------------------------------------------------------------
 
@@ -518,7 +1209,637 @@ class AnalysisWidget(QtGui.QWidget):
         for i in range(len(list(rsm_params.keys()))):
             param = self.rsm_params_lbl_list[i].split(" ")[0]
             self.rsm_params_txts[i].setText(str(rsm_params[param]))
-        
+
+    # --------------------------------------------------------------------------
+
+    def findHKL(self):
+        """
+        Lists frames with pixels within the tolerance box around an HKL
+        point (closest pixel per frame). Falls back to the single nearest
+        pixel if none are that close.
+        """
+
+        try:
+            self.parent.scan_control_widget.loadHKLIndex(self.findHKLInIndex)
+        except Exception as ex:
+            error_mbx = QtGui.QMessageBox()
+            error_mbx.setText(str(ex))
+            error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+            error_mbx.exec_()
+
+    # --------------------------------------------------------------------------
+
+    def findHKLInIndex(self, hkl_index):
+        hkl = np.array([sbx.value() for sbx in self.find_sbxs[:3]])
+        tolerance = self.find_sbxs[3].value()
+
+        ids = hkl_index.queryBox(hkl - tolerance, hkl + tolerance)
+        if len(ids) > 0:
+            distances = np.linalg.norm(hkl_index.sampleHKL(ids) - hkl, axis=1)
+        else:
+            ids, distances = hkl_index.queryNearest(hkl)
+
+        frames, pixels_1, pixels_2 = hkl_index.samplePixels(ids)
+
+        # Closest pixel of each frame, frames in scan order
+        order = np.lexsort((distances, frames))
+        first = np.unique(frames[order], return_index=True)[1]
+        closest = order[first]
+
+        self.find_results = [(frames[i], (pixels_1[i], pixels_2[i])) for i in closest]
+        self.find_results_list_widget.clear()
+        self.find_results_list_widget.addItems([f"Frame {frames[i]}: " \
+            f"({pixels_1[i]}, {pixels_2[i]}), d = {distances[i]:.2e}" for i in closest])
+
+    # --------------------------------------------------------------------------
+
+    def setIndexProgress(self, done, total=0):
+        """
+        Shows HKL index build progress on the buttons that need the index
+        (None once it's finished)
+        """
+
+        if done is None:
+            self.find_btn.setText("Find Frames")
+            self.region_btn.setText("Select Region")
+        else:
+            text = f"Indexing: {done}/{total}" if total > 0 else "Loading Index"
+            self.find_btn.setText(text)
+            self.region_btn.setText(text)
+
+        self.find_btn.setEnabled(done is None)
+        self.region_btn.setEnabled(done is None and not self.region_timer.isActive())
+
+    # --------------------------------------------------------------------------
+
+    def selectFindResult(self, row):
+        if 0 <= row < len(self.find_results):
+            frame, pixel = self.find_results[row]
+            self.parent.scan_control_widget.jumpToFrame(frame, pixel)
+
+    # --------------------------------------------------------------------------
+
+    def setRegionFromGriddingROI(self):
+        """
+        Copies the HKL box of the visible ROI in the first Gridding tab
+        (currently selected ROI tab preferred)
+        """
+
+        main_window = self.window()
+        if not hasattr(main_window, "tab_widget"):
+            return
+
+        for i in range(main_window.tab_widget.count()):
+            tab = main_window.tab_widget.widget(i)
+            if not hasattr(tab, "roi_analysis_widget") or \
+                tab.data_widget.dataset_rect is None:
+                continue
+
+            roi_analysis_widget = tab.roi_analysis_widget
+            roi_widgets = [roi_analysis_widget.roi_tabs.currentWidget(),
+                roi_analysis_widget.roi_1, roi_analysis_widget.roi_2,
+                roi_analysis_widget.roi_3, roi_analysis_widget.roi_4]
+
+            for roi_widget in roi_widgets:
+                if hasattr(roi_widget, "hklBox") and roi_widget.roi.isVisible():
+                    hkl_min, hkl_max = roi_widget.hklBox()
+                    for sbx, value in zip(self.region_min_sbxs, hkl_min):
+                        sbx.setValue(value)
+                    for sbx, value in zip(self.region_max_sbxs, hkl_max):
+                        sbx.setValue(value)
+                    return
+
+        error_mbx = QtGui.QMessageBox()
+        error_mbx.setText("No visible ROI found in a Gridding tab.")
+        error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+        error_mbx.exec_()
+
+    # --------------------------------------------------------------------------
+
+    def selectRegion(self):
+        """
+        - Finds every frame pixel inside the HKL box
+        - Plots the region's summed raw counts per frame
+        - Overlays region pixels on the displayed frame
+        """
+
+        try:
+            self.parent.scan_control_widget.loadHKLIndex(self.selectRegionInIndex)
+        except Exception as ex:
+            error_mbx = QtGui.QMessageBox()
+            error_mbx.setText(str(ex))
+            error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+            error_mbx.exec_()
+
+    # --------------------------------------------------------------------------
+
+    def selectRegionInIndex(self, hkl_index):
+        scan_control_widget = self.parent.scan_control_widget
+        hkl_min = np.array([sbx.value() for sbx in self.region_min_sbxs])
+        hkl_max = np.array([sbx.value() for sbx in self.region_max_sbxs])
+
+        self.region_source = scan_control_widget.image_source
+        self.region_progress = (0, 0)
+        self.region_future = self.region_driver.submit(MappingLogic.selectRegion,
+            hkl_index, self.region_source, hkl_min, hkl_max,
+            lambda done, total: setattr(self, "region_progress", (done, total)))
+        self.region_btn.setEnabled(False)
+        self.region_timer.start(self.region_interval)
+        self.updateRegionCounts()
+
+    # --------------------------------------------------------------------------
+
+    def updateRegionCounts(self):
+        """
+        Shows summing progress; plots the region counts and overlays its
+        pixels once they're done (dropped if the scan changed meanwhile)
+        """
+
+        if self.region_future is None:
+            return
+
+        if not self.region_future.done():
+            done, total = self.region_progress
+            self.region_btn.setText(f"Summing: {done}/{total}" if total > 0 \
+                else "Selecting Region")
+            return
+
+        self.region_timer.stop()
+        self.region_btn.setText("Select Region")
+        self.region_btn.setEnabled(True)
+
+        try:
+            region_pixels, region_counts = self.region_future.result()
+        except Exception as ex:
+            error_mbx = QtGui.QMessageBox()
+            error_mbx.setText(f"Could not sum region counts: {ex}")
+            error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+            error_mbx.exec_()
+            return
+
+        if self.region_source is not self.parent.scan_control_widget.image_source:
+            return
+
+        self.region_pixels = region_pixels
+        self.region_counts = region_counts
+        self.region_plot_widget.plot(self.region_counts, clear=True)
+        self.updateRegionOverlay()
+
+    # --------------------------------------------------------------------------
+
+    def updateRegionOverlay(self):
+        """
+        Highlights the region's pixels in the displayed frame
+        """
+
+        scan_control_widget = self.parent.scan_control_widget
+        frame = getattr(scan_control_widget, "current_image_index", None)
+
+        if self.region_overlay_chkbox.isChecked() and frame in self.region_pixels:
+            self.parent.image_widget.showRegion(self.region_pixels[frame])
+        else:
+            self.parent.image_widget.showRegion(None)
+
+# ==============================================================================
+
+class StatisticsWidget(QtGui.QWidget):
+    """
+    Scan-wide per-frame statistics:
+    - Computed in the background and saved beside the scan
+    - Plotted against frame number; clicking the plot jumps to that frame
+    """
+
+    def __init__ (self, parent):
+        super().__init__()
+
+        self.parent = parent
+
+        # FrameStatsIndex for the current scan
+        self.stats_index = None
+
+        # Refreshes the plot while the background pass runs
+        self.update_timer = QtCore.QTimer()
+        self.update_interval = 500
+
+        self.stat_lbl = QtGui.QLabel("Statistic:")
+        self.stat_cbx = QtGui.QComboBox()
+        self.stat_cbx.addItems(FrameStatsIndex.STATISTICS)
+        self.saturation_lbl = QtGui.QLabel("Saturation:")
+        self.saturation_sbx = QtGui.QSpinBox()
+        self.saturation_sbx.setRange(1, 2 ** 31 - 1)
+        self.saturation_sbx.setValue(2 ** 20 - 1)
+        self.roi_chkbox = QtGui.QCheckBox("Use ROI")
+        self.compute_btn = QtGui.QPushButton("Compute")
+        self.brightest_btn = QtGui.QPushButton("Jump to Brightest Frame")
+        self.brightest_btn.setEnabled(False)
+        self.progress_lbl = QtGui.QLabel("")
+        self.plot_widget = pg.PlotWidget()
+        self.plot_widget.setLabel(axis="bottom", text="Frame")
+        self.frame_line = pg.InfiniteLine(pos=0, angle=90, movable=False)
+        self.plot_widget.addItem(self.frame_line)
+
+        self.layout = QtGui.QGridLayout()
+        self.setLayout(self.layout)
+        self.layout.addWidget(self.stat_lbl, 0, 0)
+        self.layout.addWidget(self.stat_cbx, 0, 1)
+        self.layout.addWidget(self.saturation_lbl, 1, 0)
+        self.layout.addWidget(self.saturation_sbx, 1, 1)
+        self.layout.addWidget(self.roi_chkbox, 2, 0)
+        self.layout.addWidget(self.compute_btn, 2, 1)
+        self.layout.addWidget(self.brightest_btn, 3, 0, 1, 2)
+        self.layout.addWidget(self.progress_lbl, 4, 0, 1, 2)
+        self.layout.addWidget(self.plot_widget, 0, 2, 6, 1)
+        self.layout.setColumnStretch(2, 1)
+
+        self.stat_cbx.currentIndexChanged.connect(self.plotStatistic)
+        self.roi_chkbox.toggled.connect(self.toggleROI)
+        self.compute_btn.clicked.connect(self.computeStatistics)
+        self.brightest_btn.clicked.connect(self.jumpToBrightestFrame)
+        self.update_timer.timeout.connect(self.updateProgress)
+        self.plot_widget.scene().sigMouseClicked.connect(self.selectFrame)
+
+    # --------------------------------------------------------------------------
+
+    def toggleROI(self, state):
+        if state:
+            self.parent.image_widget.stats_roi.show()
+        else:
+            self.parent.image_widget.stats_roi.hide()
+
+    # --------------------------------------------------------------------------
+
+    def computeStatistics(self):
+        """
+        Starts the background statistics pass over the scan's frames
+        """
+
+        scan_control_widget = self.parent.scan_control_widget
+        self.stopStatistics()
+
+        roi = None
+        if self.roi_chkbox.isChecked():
+            stats_roi = self.parent.image_widget.stats_roi
+            x, y = stats_roi.pos()
+            width, height = stats_roi.size()
+            roi = (max(x, 0), max(x + width, 0), max(y, 0), max(y + height, 0))
+
+        self.stats_index = FrameStatsIndex(scan_control_widget.image_source,
+            self.saturation_sbx.value(), roi)
+        self.stats_index.start()
+        self.update_timer.start(self.update_interval)
+        self.updateProgress()
+
+    # --------------------------------------------------------------------------
+
+    def stopStatistics(self):
+        self.update_timer.stop()
+        if self.stats_index is not None:
+            self.stats_index.stop()
+
+    # --------------------------------------------------------------------------
+
+    def clear(self):
+        self.stopStatistics()
+        self.stats_index = None
+        self.plot_widget.clearPlots()
+        self.progress_lbl.setText("")
+        self.brightest_btn.setEnabled(False)
+
+    # --------------------------------------------------------------------------
+
+    def updateProgress(self):
+        """
+        Shows frames done and replots; stops polling when the pass ends
+        """
+
+        if self.stats_index is None:
+            return
+
+        done = int(np.count_nonzero(self.stats_index.done))
+        total = len(self.stats_index.done)
+        self.progress_lbl.setText(f"{done}/{total} frames")
+        self.brightest_btn.setEnabled(done > 0)
+        self.plotStatistic()
+
+        if not self.stats_index.isRunning():
+            self.update_timer.stop()
+
+    # --------------------------------------------------------------------------
+
+    def plotStatistic(self):
+        if self.stats_index is None:
+            return
+
+        stat = self.stat_cbx.currentText()
+        frames = np.nonzero(self.stats_index.done)[0]
+        values = self.stats_index.stats[stat][frames]
+
+        self.plot_widget.clearPlots()
+        self.plot_widget.plot(frames, values, symbol="o", symbolSize=4)
+        self.plot_widget.setLabel(axis="left", text=stat)
+
+    # --------------------------------------------------------------------------
+
+    def updateFrameLine(self, frame):
+        self.frame_line.setValue(frame)
+
+    # --------------------------------------------------------------------------
+
+    def selectFrame(self, event):
+        """
+        Jumps to the frame nearest a click on the plot
+        """
+
+        view_box = self.plot_widget.getViewBox()
+        if self.stats_index is None or \
+            not view_box.sceneBoundingRect().contains(event.scenePos()):
+            return
+
+        frame = int(round(view_box.mapSceneToView(event.scenePos()).x()))
+        if 0 <= frame < len(self.stats_index.image_names):
+            self.parent.scan_control_widget.jumpToFrame(frame)
+
+    # --------------------------------------------------------------------------
+
+    def jumpToBrightestFrame(self):
+        frame = self.stats_index.brightestFrame()
+
+        if frame is not None:
+            pixel = tuple(self.stats_index.argmax[frame])
+            self.parent.scan_control_widget.jumpToFrame(frame, pixel)
+
+# ==============================================================================
+
+class TraceWidget(QtGui.QWidget):
+    """
+    Intensity of a pixel (or small square ROI) across every frame of the
+    scan, read from a pixel-major stack built in the background
+    """
+
+    def __init__ (self, parent):
+        super().__init__()
+
+        self.parent = parent
+
+        # PixelTraceStack for the current scan
+        self.trace_stack = None
+
+        # Polls the background build
+        self.build_timer = QtCore.QTimer()
+        self.build_interval = 500
+
+        self.build_btn = QtGui.QPushButton("Build Trace Stack")
+        self.progress_lbl = QtGui.QLabel("")
+        self.radius_lbl = QtGui.QLabel("ROI Radius:")
+        self.radius_sbx = QtGui.QSpinBox()
+        self.radius_sbx.setRange(0, 50)
+        self.follow_mouse_chkbox = QtGui.QCheckBox("Follow Mouse")
+        self.follow_mouse_chkbox.setChecked(True)
+        self.pixel_lbl = QtGui.QLabel("")
+        self.plot_widget = pg.PlotWidget()
+        self.plot_widget.setLabel(axis="bottom", text="Frame")
+        self.plot_widget.setLabel(axis="left", text="Intensity")
+
+        self.layout = QtGui.QGridLayout()
+        self.setLayout(self.layout)
+        self.layout.addWidget(self.build_btn, 0, 0, 1, 2)
+        self.layout.addWidget(self.progress_lbl, 1, 0, 1, 2)
+        self.layout.addWidget(self.radius_lbl, 2, 0)
+        self.layout.addWidget(self.radius_sbx, 2, 1)
+        self.layout.addWidget(self.follow_mouse_chkbox, 3, 0, 1, 2)
+        self.layout.addWidget(self.pixel_lbl, 4, 0, 1, 2)
+        self.layout.addWidget(self.plot_widget, 0, 2, 6, 1)
+        self.layout.setColumnStretch(2, 1)
+
+        self.build_btn.clicked.connect(self.buildTraceStack)
+        self.build_timer.timeout.connect(self.updateProgress)
+
+    # --------------------------------------------------------------------------
+
+    def buildTraceStack(self):
+        """
+        Opens the scan's cached trace stack or builds it in the background
+        """
+
+        scan_control_widget = self.parent.scan_control_widget
+        self.clear()
+
+        self.trace_stack = PixelTraceStack(scan_control_widget.image_source)
+        self.trace_stack.start()
+        self.build_btn.setEnabled(False)
+        self.build_timer.start(self.build_interval)
+        self.updateProgress()
+
+    # --------------------------------------------------------------------------
+
+    def updateProgress(self):
+        if self.trace_stack is None:
+            return
+
+        total = len(self.trace_stack.image_names)
+        if self.trace_stack.isReady():
+            self.progress_lbl.setText(f"Ready ({total} frames)")
+            self.build_timer.stop()
+            self.build_btn.setEnabled(True)
+        else:
+            self.progress_lbl.setText(f"Building: {self.trace_stack.frames_done}/{total} frames")
+
+    # --------------------------------------------------------------------------
+
+    def clear(self):
+        self.build_timer.stop()
+        if self.trace_stack is not None:
+            self.trace_stack.stop()
+        self.trace_stack = None
+        self.build_btn.setEnabled(True)
+        self.progress_lbl.setText("")
+        self.plot_widget.clearPlots()
+
+    # --------------------------------------------------------------------------
+
+    def updateTrace(self, point, clicked=False):
+        """
+        Plots the trace around a pixel. Hovering updates it only while
+        following the mouse; clicking pins it.
+        """
+
+        if self.trace_stack is None or not self.trace_stack.isReady():
+            return
+        if not clicked and not self.follow_mouse_chkbox.isChecked():
+            return
+        if clicked:
+            self.follow_mouse_chkbox.setChecked(False)
+
+        x, y = point
+        trace = self.trace_stack.trace(x, y, self.radius_sbx.value())
+        if trace is None:
+            return
+
+        self.pixel_lbl.setText(f"Pixel: ({int(x)}, {int(y)})")
+        self.plot_widget.plot(trace, clear=True)
+
+# ==============================================================================
+
+class PlaneWidget(QtGui.QWidget):
+    """
+    Current frame regridded onto a regular plane spanned by two HKL axes
+    """
+
+    def __init__ (self, parent):
+        super().__init__()
+
+        self.parent = parent
+
+        # PlaneRegridder for the current scan/plane (created on request)
+        self.regridder = None
+
+        # HKL bounds of the scan, shared by every plane. They're computed in
+        # the background (every frame is mapped) for `pending_geometry`;
+        # the plane is shown once they're ready.
+        self.scan_bounds = None
+        self.bounds_geometry = None
+        self.pending_geometry = None
+        self.bounds_driver = ThreadPoolExecutor(max_workers=1)
+        self.bounds_future = None
+        self.bounds_timer = QtCore.QTimer()
+        self.bounds_interval = 100
+
+        self.show_chkbox = QtGui.QCheckBox("Show Plane")
+        self.plane_lbl = QtGui.QLabel("Plane:")
+        self.plane_cbx = QtGui.QComboBox()
+        self.plane_cbx.addItems(["H-K", "H-L", "K-L"])
+        self.plane_cbx.setCurrentIndex(1)
+        self.bins_lbl = QtGui.QLabel("Bins:")
+        self.bins_sbx = QtGui.QSpinBox()
+        self.bins_sbx.setRange(10, 2000)
+        self.bins_sbx.setValue(200)
+        self.plot_widget = pg.PlotWidget()
+        self.plot_widget.setAspectLocked(False)
+        self.image_item = pg.ImageItem()
+        self.plot_widget.addItem(self.image_item)
+
+        self.layout = QtGui.QGridLayout()
+        self.setLayout(self.layout)
+        self.layout.addWidget(self.show_chkbox, 0, 0, 1, 2)
+        self.layout.addWidget(self.plane_lbl, 1, 0)
+        self.layout.addWidget(self.plane_cbx, 1, 1)
+        self.layout.addWidget(self.bins_lbl, 2, 0)
+        self.layout.addWidget(self.bins_sbx, 2, 1)
+        self.layout.addWidget(self.plot_widget, 0, 2, 4, 1)
+        self.layout.setColumnStretch(2, 1)
+
+        self.show_chkbox.toggled.connect(self.updatePlane)
+        self.plane_cbx.currentIndexChanged.connect(self.updatePlane)
+        self.bins_sbx.editingFinished.connect(self.updatePlane)
+        self.bounds_timer.timeout.connect(self.updateBounds)
+
+    # --------------------------------------------------------------------------
+
+    def planeRegridder(self):
+        """
+        Returns the regridder for the selected plane, recreated if the scan
+        geometry, plane or bin count changed (None while the scan's bounds
+        are being computed)
+        """
+
+        geometry = self.parent.scan_control_widget.scanGeometry()
+        axes = [PlaneRegridder.AXIS_NAMES.index(axis) \
+            for axis in self.plane_cbx.currentText().split("-")]
+        shape = (self.bins_sbx.value(),) * 2
+
+        if self.bounds_geometry is not geometry:
+            if self.pending_geometry is not geometry:
+                self.pending_geometry = geometry
+                self.bounds_future = self.bounds_driver.submit(
+                    PlaneRegridder.scanBounds, geometry)
+                self.bounds_timer.start(self.bounds_interval)
+            return None
+
+        if self.regridder is None or self.regridder.geometry is not geometry or \
+            list(self.regridder.axes) != axes or self.regridder.shape != shape:
+            self.regridder = PlaneRegridder(geometry, axes, shape, self.scan_bounds)
+
+        return self.regridder
+
+    # --------------------------------------------------------------------------
+
+    def updateBounds(self):
+        """
+        Shows the plane once the scan's bounds are computed
+        """
+
+        if self.bounds_future is None or not self.bounds_future.done():
+            return
+
+        self.bounds_timer.stop()
+        geometry, self.pending_geometry = self.pending_geometry, None
+
+        try:
+            self.scan_bounds = self.bounds_future.result()
+        except Exception as ex:
+            self.plot_widget.setTitle(None)
+            self.show_chkbox.setChecked(False)
+            error_mbx = QtGui.QMessageBox()
+            error_mbx.setText(str(ex))
+            error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+            error_mbx.exec_()
+            return
+
+        self.bounds_geometry = geometry
+        self.updatePlane()
+
+    # --------------------------------------------------------------------------
+
+    def updatePlane(self):
+        """
+        Regrids and displays the current frame (if shown)
+        """
+
+        scan_control_widget = self.parent.scan_control_widget
+        image = self.parent.image_widget.image
+
+        if not self.show_chkbox.isChecked() or image is None or \
+            scan_control_widget.current_image_path == "":
+            return
+
+        try:
+            regridder = self.planeRegridder()
+        except Exception as ex:
+            self.show_chkbox.setChecked(False)
+            error_mbx = QtGui.QMessageBox()
+            error_mbx.setText(str(ex))
+            error_mbx.setStandardButtons(QtGui.QMessageBox.Ok)
+            error_mbx.exec_()
+            return
+
+        if regridder is None:
+            self.plot_widget.setTitle("Computing Scan Bounds")
+            return
+
+        self.plot_widget.setTitle(None)
+        plane = regridder.regrid(scan_control_widget.current_image_index, image)
+
+        image_widget = self.parent.image_widget
+        norm = image_widget.setColormapScale(max(np.amax(plane), 1))
+        self.image_item.setImage(image_widget.setColormap(norm(plane)))
+        self.image_item.setRect(QtCore.QRectF(*regridder.rect()))
+
+        x_name, y_name = regridder.axisNames()
+        self.plot_widget.setLabel(axis="bottom", text=x_name)
+        self.plot_widget.setLabel(axis="left", text=y_name)
+
+    # --------------------------------------------------------------------------
+
+    def clear(self):
+        self.bounds_timer.stop()
+        self.regridder = None
+        self.scan_bounds = None
+        self.bounds_geometry = None
+        self.pending_geometry = None
+        self.bounds_future = None
+        self.plot_widget.setTitle(None)
+        self.image_item.clear()
+
 # ==============================================================================
 
 class ImageWidget(pg.PlotWidget):
@@ -532,23 +1853,110 @@ class ImageWidget(pg.PlotWidget):
         self.image_item = pg.ImageItem()
         self.addItem(self.image_item)
 
+        # Downsampled levels of the image; only the level/region matching
+        # the view is colormapped and uploaded
+        self.pyramid = None
+        self.norm = None
+        self.displayed_region = None
+        self.max_upload_pixels = 2 ** 20
+        self.view_timer = QtCore.QTimer()
+        self.view_timer.setSingleShot(True)
+        self.view_interval = 30
+
+        # Marks a pixel found by an HKL search
+        self.pixel_marker = pg.ScatterPlotItem(symbol="+", size=20,
+            pen=pg.mkPen("w", width=2), brush=None)
+        self.addItem(self.pixel_marker)
+
+        # Highlights pixels inside a selected HKL region
+        self.region_item = pg.ImageItem()
+        self.addItem(self.region_item)
+
+        # Pixel ROI summed by the scan statistics pass
+        self.stats_roi = pg.RectROI([0, 0], [50, 50], pen=pg.mkPen("w", width=2))
+        self.stats_roi.hide()
+        self.addItem(self.stats_roi)
+
         # Larger y-values towards bottom
         self.invertY(True)
 
         self.view = self.getViewBox()
 
         self.view.scene().sigMouseMoved.connect(self.updateMouse)
+        self.view.scene().sigMouseClicked.connect(self.selectPixel)
+        # Refines the displayed level/region after zooming or panning
+        self.view.sigRangeChanged.connect(
+            lambda *args: self.view_timer.start(self.view_interval))
+        self.view_timer.timeout.connect(self.updateView)
 
     # --------------------------------------------------------------------------
 
     def displayImage(self, image):
+        new_shape = self.image is None or self.image.shape != image.shape
         self.image = image
-        colormap_max = np.amax(self.image)
-        norm = self.setColormapScale(colormap_max)
-        norm_image = norm(self.image)
-        color_image = self.setColormap(norm_image)
+        self.pyramid = ImagePyramid(self.image)
+        colormap_max = np.amax(self.pyramid.levels[-1])
+        self.norm = self.setColormapScale(colormap_max)
+        # Scaled from the full frame, so every level/region is colored alike
+        self.norm.autoscale_None(self.image)
+        self.displayed_region = None
+
+        if new_shape:
+            self.view.setRange(xRange=(0, self.image.shape[0]),
+                yRange=(0, self.image.shape[1]))
+        self.updateView()
 
+    # --------------------------------------------------------------------------
+
+    def updateView(self):
+        """
+        Displays the pyramid level matching the view's resolution (only the
+        region around the view for large frames)
+        """
+
+        if self.pyramid is None:
+            return
+
+        x_range, y_range = self.view.viewRange()
+        pixel_size = (x_range[1] - x_range[0]) / max(self.view.width(), 1)
+        level = self.pyramid.levelFor(pixel_size)
+        image, rect = self.pyramid.region(level, x_range, y_range,
+            self.max_upload_pixels)
+
+        if image.size == 0 or (level, rect) == self.displayed_region:
+            return
+
+        color_image = self.setColormap(self.norm(image))
         self.image_item.setImage(color_image)
+        self.image_item.setRect(QtCore.QRectF(*rect))
+        self.displayed_region = (level, rect)
+
+    # --------------------------------------------------------------------------
+
+    def showRegion(self, pixels=None):
+        """
+        Overlays flat pixel indices in translucent white (hidden if None)
+        """
+
+        if pixels is None or self.image is None:
+            self.region_item.clear()
+            return
+
+        overlay = np.zeros(self.image.shape + (4,), dtype=np.ubyte)
+        overlay.reshape(-1, 4)[pixels] = (255, 255, 255, 110)
+        self.region_item.setImage(overlay, levels=(0, 255))
+
+    # --------------------------------------------------------------------------
+
+    def markPixel(self, pixel=None):
+        """
+        Shows a marker at the centre of a pixel (hidden if pixel is None)
+        """
+
+        if pixel is None:
+            self.pixel_marker.setData([], [])
+        else:
+            self.pixel_marker.setData([pixel[0] + 0.5], [pixel[1] + 0.5])
 
     # --------------------------------------------------------------------------
 
@@ -610,6 +2018,20 @@ class ImageWidget(pg.PlotWidget):
                 return
 
             self.parent.analysis_widget.updateMouseInfo((x, y))
+            self.parent.trace_widget.updateTrace((x, y))
+
+    # --------------------------------------------------------------------------
+
+    def selectPixel(self, event):
+        """
+        Pins the pixel trace to a clicked pixel
+        """
+
+        if self.image is not None and \
+            self.view.sceneBoundingRect().contains(event.scenePos()):
+            view_point = self.view.mapSceneToView(event.scenePos())
+            self.parent.trace_widget.updateTrace((view_point.x(), view_point.y()),
+                clicked=True)
 
 # ==============================================================================
 
@@ -621,52 +2043,49 @@ class MappingLogic:
         Creates a scan area to map pixels to reciprocal space coordinates
         """
 
-        d_reader = detReader(detector_config_name) # Detector reader
-        i_reader = instrReader(instrument_config_name) # Instrument reader
+        # Pixel directions are computed once per config and reused
+        kernel = AreaConversionKernel.fromConfig(detector_config_name,
+            instrument_config_name)
 
-        # x+/-, y+/-, z+/-
-        sample_circle_dir = i_reader.getSampleCircleDirections()
-        det_circle_dir = i_reader.getDetectorCircleDirections()
-        primary_beam_dir = i_reader.getPrimaryBeamDirection()
+        angle_params = [rsm_params[i] for i in angles]
+        qx,qy,qz = kernel.area(angle_params, rsm_params["UB_Matrix"],
+            rsm_params["Energy"])
+
+        return (qx, qy, qz)
+
+    # --------------------------------------------------------------------------
+
+    def selectRegion(hkl_index, image_source, hkl_min, hkl_max, progress=None):
 
         """
-        Object for the conversion of angular coordinates to momentum space for
-        arbitrary goniometer geometries and X-ray energy. (from xru docs)
+        Returns the pixels of each frame inside an HKL box ({frame: flat
+        pixel indices}) and their summed raw counts per frame
         """
 
-        q_conv = xu.experiment.QConversion(sample_circle_dir, det_circle_dir, primary_beam_dir)
+        frame_pixels = hkl_index.framePixels(hkl_index.queryBox(hkl_min, hkl_max))
 
-        # x+/-, y+/-, z+/-
-        inplane_ref_dir = i_reader.getInplaneReferenceDirection()
-        sample_norm_dir = i_reader.getSampleSurfaceNormalDirection()
+        return frame_pixels, MappingLogic.sumRegionCounts(image_source,
+            frame_pixels, progress)
+
+    # --------------------------------------------------------------------------
+
+    def sumRegionCounts(image_source, frame_pixels, progress=None):
 
         """
-        Object describing high angle x-ray diffraction experiments and helps with
-        calculating the angles of Bragg reflections as well as helps with analyzing
-        measured data. (from xru docs)
+        Returns raw counts summed over each frame's region pixels (0 for
+        frames the region doesn't touch). `progress(done, total)` is called
+        after each frame.
         """
 
-        hxrd = xu.HXRD(inplane_ref_dir, sample_norm_dir, en=rsm_params["Energy"], qconv=q_conv)
-
-        detector = d_reader.getDetectors()[0]
-        pixel_dir_1 = d_reader.getPixelDirection1(detector)
-        pixel_dir_2 = d_reader.getPixelDirection2(detector)
-        c_ch_1 = d_reader.getCenterChannelPixel(detector)[0]
-        c_ch_2 = d_reader.getCenterChannelPixel(detector)[1]
-        n_ch_1 = d_reader.getNpixels(detector)[0]
-        n_ch_2 = d_reader.getNpixels(detector)[1]
-        pixel_width_1 = d_reader.getSize(detector)[0] / d_reader.getNpixels(detector)[0]
-        pixel_width_2 = d_reader.getSize(detector)[1] / d_reader.getNpixels(detector)[1]
-        distance = d_reader.getDistance(detector)
-        roi = [0, n_ch_1, 0, n_ch_2]
+        counts = np.zeros(image_source.frameCount())
 
-        hxrd.Ang2Q.init_area(pixel_dir_1, pixel_dir_2, cch1=c_ch_1, cch2=c_ch_2,
-            Nch1=n_ch_1, Nch2=n_ch_2, pwidth1=pixel_width_1, pwidth2=pixel_width_2,
-            distance=distance, roi=roi)
-        
-        angle_params = [rsm_params[i] for i in angles]
-        qx,qy,qz = hxrd.Ang2Q.area(*angle_params, UB=rsm_params["UB_Matrix"])
+        for done, (frame, pixels) in enumerate(frame_pixels.items(), 1):
+            if frame < len(counts):
+                image = image_source.getFrame(frame)
+                counts[frame] = np.sum(image.ravel()[pixels], dtype=np.float64)
+            if progress is not None:
+                progress(done, len(frame_pixels))
 
-        return (qx, qy, qz)
+        return counts
 
 # ==============================================================================
@@ -0,0 +1,1595 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import numpy as np
+import os
+from scipy import ndimage
+from rsMap3D.datasource.DetectorGeometryForXrayutilitiesReader import DetectorGeometryForXrayutilitiesReader as detReader
+from rsMap3D.datasource.InstForXrayutilitiesReader import InstForXrayutilitiesReader as instrReader
+from source.image_logic import *
+from spec2nexus import spec
+import threading
+import xrayutilities as xu
+
+# ==============================================================================
+
+class AreaConversionKernel:
+
+    """
+    Vectorized replacement for xrayutilities' Ang2Q.area:
+    - Per-pixel unit vectors are computed once per detector configuration
+    - Each frame only needs its sample/detector rotation matrices, which are
+      folded with the UB matrix into a single 3x3 transform
+    - Frames can be converted in batches with one stacked matmul
+    Matches xrayutilities for configs using x/y/z circle and pixel directions.
+    """
+
+    # Kernels shared between scans/tabs, keyed by config paths and mtimes
+    kernels = {}
+
+    AXES = {"x": 0, "y": 1, "z": 2}
+
+    def __init__ (self, detector_path, instrument_path, dtype=np.float64):
+
+        d_reader = detReader(detector_path)
+        i_reader = instrReader(instrument_path)
+
+        axis_vector = AreaConversionKernel.axisVector
+
+        self.dtype = dtype
+        self.sample_axes = [axis_vector(direction) for direction in \
+            i_reader.getSampleCircleDirections()]
+        self.detector_axes = [axis_vector(direction) for direction in \
+            i_reader.getDetectorCircleDirections()]
+        self.primary_beam = np.asarray(i_reader.getPrimaryBeamDirection(),
+            dtype=np.float64)
+        self.primary_beam /= np.linalg.norm(self.primary_beam)
+
+        detector = d_reader.getDetectors()[0]
+        c_ch_1, c_ch_2 = d_reader.getCenterChannelPixel(detector)
+        n_ch_1, n_ch_2 = d_reader.getNpixels(detector)
+        pixel_width_1 = d_reader.getSize(detector)[0] / n_ch_1
+        pixel_width_2 = d_reader.getSize(detector)[1] / n_ch_2
+        self.n_pixels = (int(n_ch_1), int(n_ch_2))
+
+        # Pixel positions with all detector circles at zero, then unit vectors
+        offsets_1 = (np.arange(self.n_pixels[0]) - c_ch_1) * pixel_width_1
+        offsets_2 = (np.arange(self.n_pixels[1]) - c_ch_2) * pixel_width_2
+        positions = d_reader.getDistance(detector) * self.primary_beam + \
+            offsets_1[:, None, None] * axis_vector(d_reader.getPixelDirection1(detector)) + \
+            offsets_2[None, :, None] * axis_vector(d_reader.getPixelDirection2(detector))
+        positions /= np.linalg.norm(positions, axis=2, keepdims=True)
+        # Stored as (3, n_pixels) so each frame is a single matmul
+        self.pixel_directions = np.ascontiguousarray(positions.reshape(-1, 3).T,
+            dtype=dtype)
+
+    # --------------------------------------------------------------------------
+
+    def fromConfig(detector_path, instrument_path, dtype=np.float64):
+
+        """
+        Returns a cached kernel for the given configs, rebuilding it if either
+        file has changed
+        """
+
+        key = (detector_path, instrument_path, os.stat(detector_path).st_mtime,
+            os.stat(instrument_path).st_mtime, np.dtype(dtype).str)
+
+        if key not in AreaConversionKernel.kernels:
+            AreaConversionKernel.kernels[key] = AreaConversionKernel(
+                detector_path, instrument_path, dtype)
+
+        return AreaConversionKernel.kernels[key]
+
+    # --------------------------------------------------------------------------
+
+    def axisVector(direction):
+
+        """
+        Returns the unit vector for an xrayutilities direction string
+        (e.g. "x+", "z-")
+        """
+
+        if direction[0] not in AreaConversionKernel.AXES or \
+            direction[1:] not in ["+", "-"]:
+            raise ValueError(f"Unsupported circle/pixel direction '{direction}'.")
+
+        vector = np.zeros(3)
+        vector[AreaConversionKernel.AXES[direction[0]]] = 1 if direction[1] == "+" else -1
+
+        return vector
+
+    # --------------------------------------------------------------------------
+
+    def rotationMatrices(axes, angles):
+
+        """
+        Returns (n_frames, 3, 3) right-handed rotation matrices for stacked
+        circles, outermost circle first
+        """
+
+        angles = np.radians(np.atleast_2d(angles))
+        matrices = np.tile(np.eye(3), (angles.shape[0], 1, 1))
+
+        for i, axis in enumerate(axes):
+            cos, sin = np.cos(angles[:, i]), np.sin(angles[:, i])
+            cross = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]],
+                [-axis[1], axis[0], 0]])
+            rotation = np.eye(3) + sin[:, None, None] * cross + \
+                (1 - cos)[:, None, None] * (cross @ cross)
+            matrices = matrices @ rotation
+
+        return matrices
+
+    # --------------------------------------------------------------------------
+
+    def transforms(self, angles, ub_matrix, energy):
+
+        """
+        Returns per-frame (3, 3) matrices and (3,) offsets so that
+        hkl = matrix @ pixel_direction - offset
+        """
+
+        angles = np.atleast_2d(angles)
+        n_sample = len(self.sample_axes)
+        k = 2 * np.pi / xu.en2lam(energy)
+
+        sample_rotations = AreaConversionKernel.rotationMatrices(
+            self.sample_axes, angles[:, :n_sample])
+        detector_rotations = AreaConversionKernel.rotationMatrices(
+            self.detector_axes, angles[:, n_sample:])
+
+        # Lab frame Q -> sample frame -> HKL
+        to_hkl = np.linalg.inv(ub_matrix) @ np.transpose(sample_rotations, (0, 2, 1))
+        matrices = k * to_hkl @ detector_rotations
+        offsets = k * to_hkl @ self.primary_beam
+
+        return matrices, offsets
+
+    # --------------------------------------------------------------------------
+
+    def area(self, angles, ub_matrix, energy):
+
+        """
+        Returns (H, K, L) pixel arrays for a single set of circle angles
+        """
+
+        return tuple(self.areaBatch(np.atleast_2d(angles), ub_matrix, energy)[0])
+
+    # --------------------------------------------------------------------------
+
+    def areaBatch(self, angles, ub_matrix, energy):
+
+        """
+        Returns an (n_frames, 3, n_ch_1, n_ch_2) HKL array for an
+        (n_frames, n_circles) array of angles
+        """
+
+        matrices, offsets = self.transforms(angles, ub_matrix, energy)
+        hkl = matrices.astype(self.dtype) @ self.pixel_directions
+        hkl -= offsets.astype(self.dtype)[:, :, None]
+
+        return hkl.reshape(len(matrices), 3, *self.n_pixels)
+
+# ==============================================================================
+
+class ScanGeometry:
+
+    """
+    Holds everything needed to map a scan's detector pixels into HKL:
+    - Circle angles for every point in the SPEC scan
+    - Per-point monitor/filter normalization weights
+    - UB matrix and energy for the scan
+    - A shared area conversion kernel for the instrument/detector configs
+    """
+
+    def __init__ (self, spec_path, scan_number, detector_path, instrument_path,
+        spec_file=None):
+
+        self.spec_path = spec_path
+        self.scan_number = int(scan_number)
+        self.detector_path = detector_path
+        self.instrument_path = instrument_path
+
+        # An already parsed SPEC file can be shared between scans
+        if spec_file is None:
+            spec_file = spec.SpecDataFile(spec_path)
+        self.spec_file = spec_file
+        self.scan = self.spec_file.getScan(self.scan_number)
+
+        i_reader = instrReader(instrument_path)
+        self.angle_names = i_reader.getSampleCircleNames() + \
+            i_reader.getDetectorCircleNames()
+
+        # SPEC columns used to normalize intensities (None if not configured)
+        self.monitor_name = i_reader.getMonitorName()
+        self.monitor_scale_factor = i_reader.getMonitorScaleFactor()
+        self.filter_name = i_reader.getFilterName()
+        self.filter_scale_factor = i_reader.getFilterScaleFactor()
+
+        # UB matrix and energy (originally in keV, converted to eV)
+        ub_list = self.scan.G["G3"].split(" ")
+        self.ub_matrix = np.reshape(ub_list, (3, 3)).astype(np.float64)
+        self.energy = 0
+        for line in self.scan.raw.split("\n"):
+            if line.startswith("#U"):
+                self.energy = float(line.split(" ")[1]) * 1000
+                break
+
+        self.angles = self.readAngles()
+        self.weights = self.readWeights()
+        self.kernel = AreaConversionKernel.fromConfig(detector_path, instrument_path)
+        self.n_pixels = self.kernel.n_pixels
+
+    # --------------------------------------------------------------------------
+
+    def readAngles(self):
+
+        """
+        Returns an (n_points, n_circles) array of circle angles. Scanned
+        circles come from the data columns, the rest from the positioners.
+        """
+
+        if len(self.scan.L) == 0 or self.scan.L[0] not in self.scan.data:
+            n_points = 0
+        else:
+            n_points = len(self.scan.data[self.scan.L[0]])
+        angles = np.zeros((n_points, len(self.angle_names)))
+
+        for i, name in enumerate(self.angle_names):
+            if name in self.scan.data:
+                angles[:, i] = self.scan.data[name][:n_points]
+            elif name in self.scan.positioner:
+                angles[:, i] = self.scan.positioner[name]
+
+        return angles
+
+    # --------------------------------------------------------------------------
+
+    def readWeights(self):
+
+        """
+        Returns per-point intensity weights, matching rsMap3D's correction:
+        monitor_scale_factor / monitor * filter_scale_factor / filter.
+        Points with a zero monitor/filter reading get NaN.
+        """
+
+        n_points = self.angles.shape[0]
+        weights = np.ones(n_points)
+
+        for name, scale_factor in [(self.monitor_name, self.monitor_scale_factor),
+            (self.filter_name, self.filter_scale_factor)]:
+            if name is None:
+                continue
+            if name not in self.scan.data:
+                raise IOError(f"Did not find normalization column '{name}' in " \
+                    f"scan {self.scan_number}. Check the instrument config.")
+
+            column = np.asarray(self.scan.data[name][:n_points], dtype=np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                weights *= np.where(column != 0, scale_factor / column, np.nan)
+
+        return weights
+
+    # --------------------------------------------------------------------------
+
+    def refresh(self):
+
+        """
+        Re-reads the SPEC file if it has grown (e.g. a scan in progress).
+        Returns True if new scan points were found.
+        """
+
+        n_points = self.pointCount()
+
+        try:
+            if self.spec_file.update_available:
+                self.spec_file = spec.SpecDataFile(self.spec_path)
+                self.scan = self.spec_file.getScan(self.scan_number)
+                self.angles = self.readAngles()
+                self.weights = self.readWeights()
+        except (IndexError, ValueError):
+            # File caught mid-write; keep previous points until next refresh
+            pass
+
+        return self.pointCount() > n_points
+
+    # --------------------------------------------------------------------------
+
+    def plannedAngles(self, count=9):
+
+        """
+        Returns angles for `count` points spread over the range given in the
+        scan command (ascan/dscan/a2scan/...), or None if the command can't
+        be interpreted. Used to size grids before a scan has finished.
+        """
+
+        scan_cmd = self.scan.scanCmd.split()
+        scan_type = scan_cmd[0]
+
+        if scan_type in ["ascan", "dscan", "lup"]:
+            n_motors = 1
+        elif scan_type[0] in "ad" and scan_type[2:] == "scan" and scan_type[1].isdigit():
+            n_motors = int(scan_type[1])
+        else:
+            return None
+
+        # SPEC motor mnemonics -> motor names (which match circle names)
+        mnemonics = {}
+        for o_line, O_line in zip(self.scan.header.o, self.scan.header.O):
+            mnemonics.update(zip(o_line, O_line))
+
+        base_angles = np.zeros(len(self.angle_names))
+        for i, name in enumerate(self.angle_names):
+            if name in self.scan.positioner:
+                base_angles[i] = self.scan.positioner[name]
+
+        angles = np.tile(base_angles, (count, 1))
+        fractions = np.linspace(0, 1, count)
+
+        try:
+            for motor in range(n_motors):
+                mnemonic, start, end = scan_cmd[1 + motor * 3:4 + motor * 3]
+                name = mnemonics.get(mnemonic, mnemonic)
+                if name not in self.angle_names:
+                    continue
+                i = self.angle_names.index(name)
+                start, end = float(start), float(end)
+                if scan_type[0] == "d" or scan_type == "lup":
+                    start, end = start + base_angles[i], end + base_angles[i]
+                angles[:, i] = start + (end - start) * fractions
+        except ValueError:
+            return None
+
+        return angles
+
+    # --------------------------------------------------------------------------
+
+    def pointCount(self):
+        return self.angles.shape[0]
+
+    # --------------------------------------------------------------------------
+
+    def mapFrame(self, point):
+
+        """
+        Returns (H, K, L) arrays, each with the detector's pixel dimensions,
+        for a single scan point
+        """
+
+        return self.mapAngles(self.angles[point])
+
+    # --------------------------------------------------------------------------
+
+    def mapAngles(self, angles):
+
+        """
+        Returns (H, K, L) pixel arrays for an arbitrary set of circle angles
+        """
+
+        return self.kernel.area(angles, self.ub_matrix, self.energy)
+
+    # --------------------------------------------------------------------------
+
+    def iterFrames(self, points=None, batch_size=16):
+
+        """
+        Yields (H, K, L) arrays for the given scan points (all by default),
+        converting them in batches
+        """
+
+        if points is None:
+            points = range(self.pointCount())
+        points = list(points)
+
+        for start in range(0, len(points), batch_size):
+            batch = points[start:start + batch_size]
+            yield from self.kernel.areaBatch(self.angles[batch], self.ub_matrix,
+                self.energy)
+
+# ==============================================================================
+
+class GridPlanningLogic:
+
+    """
+    Recommends grid dimensions for a scan before it is converted:
+    - HKL step per axis from the volume of the scan's sample lattice
+    - Predicted memory footprint of gridding and displaying the result
+    - Predicted fraction of voxels in the scanned region that no pixel lands in
+    """
+
+    # Bytes per voxel: sum/count accumulators, loaded dataset and the RGBA
+    # colour dataset built by DataWidget (all float64)
+    ACCUMULATOR_BYTES = 16
+    DATASET_BYTES = 8
+    COLOR_DATASET_BYTES = 32
+
+    # Pixel samples each voxel should receive on average
+    SAMPLES_PER_VOXEL = 4
+
+    def estimateSampling(geometry):
+
+        """
+        Returns HKL bounds of the whole scan and the per-axis step at which
+        voxels hold SAMPLES_PER_VOXEL samples each
+        """
+
+        n_points = geometry.pointCount()
+        bounds = GridPlanningLogic.estimateBounds(geometry.iterFrames())
+        steps = GridPlanningLogic.estimateSteps(geometry,
+            sorted(set([0, n_points // 2, max(n_points - 2, 0)])))
+
+        return bounds, steps
+
+    # --------------------------------------------------------------------------
+
+    def sampleCount(geometry):
+
+        """
+        Returns the number of pixel samples in the scan
+        """
+
+        return geometry.pointCount() * int(np.prod(geometry.n_pixels))
+
+    # --------------------------------------------------------------------------
+
+    def estimateBounds(frames_hkl):
+
+        """
+        Returns [[min, max]] per HKL axis over an iterable of (H, K, L) frames
+        """
+
+        bounds = np.array([[np.inf, -np.inf]] * 3)
+
+        for hkl in frames_hkl:
+            for axis in range(3):
+                bounds[axis][0] = min(bounds[axis][0], np.amin(hkl[axis]))
+                bounds[axis][1] = max(bounds[axis][1], np.amax(hkl[axis]))
+
+        return bounds
+
+    # --------------------------------------------------------------------------
+
+    def estimateSteps(geometry, points):
+
+        """
+        Returns per-axis HKL steps around the given scan points. Neighbouring
+        samples (along both pixel directions and between consecutive scan
+        points) are generally oblique to the HKL axes, so their per-axis
+        projections only set the aspect ratio of a voxel; its volume is
+        SAMPLES_PER_VOXEL times the largest volume element of the sample
+        lattice.
+        """
+
+        n_points = geometry.pointCount()
+        steps = np.zeros(3)
+        cell_volume = 0
+
+        for point in points:
+            hkl = np.array(geometry.mapFrame(point))
+            directions = [np.diff(hkl, axis=1), np.diff(hkl, axis=2)]
+            if point + 1 < n_points:
+                next_hkl = np.array(geometry.mapFrame(point + 1))
+                directions.append(next_hkl - hkl)
+
+            vectors = [np.median(step.reshape(3, -1), axis=1) for step in directions]
+            for step in directions:
+                steps = np.maximum(steps, np.median(np.abs(step).reshape(3, -1), axis=1))
+            if len(vectors) == 3:
+                cell_volume = max(cell_volume, abs(np.linalg.det(vectors)))
+
+        # Single scan point (or degenerate lattice): no volume to match
+        if cell_volume == 0 or np.any(steps == 0):
+            return steps
+
+        scale = GridPlanningLogic.SAMPLES_PER_VOXEL * cell_volume / np.prod(steps)
+
+        return steps * scale ** (1 / 3)
+
+    # --------------------------------------------------------------------------
+
+    def recommendGridSize(bounds, steps, max_count=1000, max_voxels=None):
+
+        """
+        Returns (nx, ny, nz) with voxels no finer than the given steps. The
+        shape is scaled down (keeping its aspect ratio) if it would hold more
+        than `max_voxels` voxels.
+        """
+
+        extents = np.array([axis_max - axis_min for axis_min, axis_max in bounds])
+        steps = np.array(steps, dtype=np.float64)
+
+        if max_voxels is not None:
+            counts = [extent / step + 1 if step > 0 else 1 for extent, step in zip(extents, steps)]
+            if np.prod(counts) > max_voxels:
+                steps = steps * (np.prod(counts) / max_voxels) ** (1 / 3)
+
+        shape = []
+
+        for extent, step in zip(extents, steps):
+            if step > 0:
+                count = int(np.ceil(extent / step)) + 1
+            else:
+                count = 1
+            shape.append(int(np.clip(count, 1, max_count)))
+
+        return tuple(shape)
+
+    # --------------------------------------------------------------------------
+
+    def estimateMemory(shape):
+
+        """
+        Returns predicted memory (in bytes) needed to grid and display a
+        dataset with the given dimensions
+        """
+
+        voxels = int(np.prod(shape))
+        return voxels * (GridPlanningLogic.ACCUMULATOR_BYTES + \
+            GridPlanningLogic.DATASET_BYTES + GridPlanningLogic.COLOR_DATASET_BYTES)
+
+    # --------------------------------------------------------------------------
+
+    def estimateEmptyFraction(geometry, bounds, shape):
+
+        """
+        Deposits every pixel of every scan point into an occupancy grid
+        (using the same nearest-voxel rule as xrayutilities' gridder) and
+        returns the fraction of voxels left empty inside the scanned region.
+        Voxels outside the region the scan sweeps (e.g. corners of the HKL
+        box around an oblique scan) cannot be filled at any grid size and
+        are not counted.
+        """
+
+        shape = tuple(int(n) for n in shape)
+        occupied = np.zeros(shape, dtype=bool)
+
+        for hkl in geometry.iterFrames():
+            index, valid = GridPlanningLogic.voxelIndices(hkl, bounds, shape)
+            occupied.reshape(-1)[index[valid]] = True
+
+        # Scanned region: occupied voxels with gaps up to a few voxels wide
+        # closed (padded so the grid edges are not eroded)
+        pad = 2
+        region = ndimage.binary_closing(np.pad(occupied, pad), iterations=pad)
+        region = region[tuple(slice(pad, -pad) for n in shape)]
+        region = ndimage.binary_fill_holes(region | occupied)
+
+        return 1 - np.count_nonzero(occupied) / np.count_nonzero(region)
+
+    # --------------------------------------------------------------------------
+
+    def voxelIndices(hkl, bounds, shape):
+
+        """
+        Returns flat voxel indices for (H, K, L) pixel arrays and a mask of
+        pixels that fall inside the grid. Works for any number of axes (one
+        coordinate array per entry of `shape`).
+        """
+
+        flat_index = np.zeros(np.size(hkl[0]), dtype=np.int64)
+        valid = np.ones(np.size(hkl[0]), dtype=bool)
+
+        for axis in range(len(shape)):
+            axis_min, axis_max = bounds[axis]
+            count = shape[axis]
+            values = np.ravel(hkl[axis])
+
+            if count > 1 and axis_max > axis_min:
+                index = np.rint((values - axis_min) * (count - 1) / (axis_max - axis_min))
+            else:
+                index = np.zeros(values.shape)
+
+            valid &= (index >= 0) & (index < count)
+            flat_index = flat_index * count + np.clip(index, 0, count - 1).astype(np.int64)
+
+        return flat_index, valid
+
+# ==============================================================================
+
+class GridAccumulator:
+
+    """
+    Persistent sum/count accumulators on a regular HKL grid. Pixels are
+    deposited with the same nearest-voxel rule as xrayutilities' gridder, so
+    sum / count matches a VTI gridded from the same frames. Frames can be
+    weighted (e.g. monitor normalization) as they are deposited; unweighted
+    sums can optionally be kept in a second accumulator.
+    """
+
+    def __init__ (self, bounds, shape, keep_raw=False):
+
+        self.shape = tuple(int(n) for n in shape)
+        self.origin = np.array([axis_min for axis_min, axis_max in bounds], dtype=np.float64)
+        self.step = np.zeros(3)
+
+        for axis in range(3):
+            axis_min, axis_max = bounds[axis]
+            if self.shape[axis] > 1 and axis_max > axis_min:
+                self.step[axis] = (axis_max - axis_min) / (self.shape[axis] - 1)
+            else:
+                self.step[axis] = 1
+
+        self.sum = np.zeros(self.shape)
+        self.count = np.zeros(self.shape)
+        self.raw_sum = np.zeros(self.shape) if keep_raw else None
+
+    # --------------------------------------------------------------------------
+
+    def bounds(self):
+        return np.stack((self.origin, self.origin + self.step * (np.array(self.shape) - 1)), axis=1)
+
+    # --------------------------------------------------------------------------
+
+    def axes(self):
+
+        """
+        Returns [x, y, z] axis value lists (same form as ConversionLogic.loadData)
+        """
+
+        return [list(self.origin[axis] + self.step[axis] * np.arange(self.shape[axis])) \
+            for axis in range(3)]
+
+    # --------------------------------------------------------------------------
+
+    def deposit(self, hkl, intensity, weight=1.0):
+
+        """
+        Adds a frame's pixel intensities (scaled by the frame's weight) into
+        the voxels their HKL fall in. Pixels outside the grid are dropped.
+        """
+
+        index, valid = GridPlanningLogic.voxelIndices(hkl, self.bounds(), self.shape)
+        index = index[valid]
+        intensity = np.ravel(intensity)[valid]
+
+        # Only touches the voxels hit by this frame
+        voxels, inverse = np.unique(index, return_inverse=True)
+        voxel_sums = np.bincount(inverse, weights=intensity, minlength=voxels.size)
+        self.sum.reshape(-1)[voxels] += voxel_sums * weight
+        self.count.reshape(-1)[voxels] += np.bincount(inverse, minlength=voxels.size)
+        if self.raw_sum is not None:
+            self.raw_sum.reshape(-1)[voxels] += voxel_sums
+
+    # --------------------------------------------------------------------------
+
+    def contains(self, bounds):
+        grid_bounds = self.bounds()
+        return np.all(bounds[:, 0] >= grid_bounds[:, 0] - self.step / 2) and \
+            np.all(bounds[:, 1] <= grid_bounds[:, 1] + self.step / 2)
+
+    # --------------------------------------------------------------------------
+
+    def grow(self, bounds, margin=0.25):
+
+        """
+        Extends the grid (keeping the voxel step) so it covers `bounds`.
+        Existing sums/counts are copied into place, never recomputed. Sides
+        that need to grow get an extra margin to avoid frequent reallocation.
+        """
+
+        grid_bounds = self.bounds()
+        extent = grid_bounds[:, 1] - grid_bounds[:, 0]
+        lower = np.zeros(3, dtype=int)
+        upper = np.zeros(3, dtype=int)
+
+        for axis in range(3):
+            low = grid_bounds[axis][0] - bounds[axis][0]
+            high = bounds[axis][1] - grid_bounds[axis][1]
+            if low > self.step[axis] / 2:
+                lower[axis] = int(np.ceil((low + margin * extent[axis]) / self.step[axis]))
+            if high > self.step[axis] / 2:
+                upper[axis] = int(np.ceil((high + margin * extent[axis]) / self.step[axis]))
+
+        if not np.any(lower) and not np.any(upper):
+            return
+
+        padding = list(zip(lower, upper))
+        self.sum = np.pad(self.sum, padding)
+        self.count = np.pad(self.count, padding)
+        if self.raw_sum is not None:
+            self.raw_sum = np.pad(self.raw_sum, padding)
+        self.origin = self.origin - lower * self.step
+        self.shape = self.sum.shape
+
+    # --------------------------------------------------------------------------
+
+    def dataset(self, raw=False):
+
+        """
+        Returns the gridded (averaged) intensities; empty voxels are 0.
+        raw=True uses the unweighted sums (only if kept).
+        """
+
+        grid_sum = self.raw_sum if raw else self.sum
+        dataset = np.zeros(self.shape)
+        np.divide(grid_sum, self.count, out=dataset, where=self.count > 0)
+        return dataset
+
+# ==============================================================================
+
+class ProjectionAccumulator:
+
+    """
+    Sum/count accumulators for a histogram over one or two reciprocal space
+    coordinates (H, K, L or |Q|), filled straight from detector pixels:
+    - The remaining coordinates are integrated out as pixels are deposited,
+      so no 3D grid is ever allocated
+    - Pixels are binned with the same nearest-bin rule as GridAccumulator,
+      so the sum/count accumulators match a 3D grid's accumulators summed
+      along the dropped axis. projection() is their ratio: the mean
+      intensity per pixel in each bin, not a sum.
+    - |Q| (1/Angstrom) is the length of UB @ hkl, which is the lab frame Q
+      rotated into the sample frame
+    """
+
+    AXIS_NAMES = ["H", "K", "L", "|Q|"]
+    Q_AXIS = 3
+
+    def __init__ (self, axes, bounds, shape):
+
+        self.axes = tuple(int(axis) for axis in axes)
+        self.bounds = np.array(bounds, dtype=np.float64).reshape(len(self.axes), 2)
+        self.shape = tuple(int(n) for n in shape)
+
+        self.sum = np.zeros(self.shape)
+        self.count = np.zeros(self.shape)
+
+    # --------------------------------------------------------------------------
+
+    def coordinates(hkl, ub_matrix, axes):
+
+        """
+        Returns a flat coordinate array per axis for an (H, K, L) frame
+        """
+
+        coordinates = []
+
+        for axis in axes:
+            if axis == ProjectionAccumulator.Q_AXIS:
+                q = ub_matrix @ np.reshape(hkl, (3, -1))
+                coordinates.append(np.sqrt(np.sum(q * q, axis=0)))
+            else:
+                coordinates.append(np.ravel(hkl[axis]))
+
+        return coordinates
+
+    # --------------------------------------------------------------------------
+
+    def scanBounds(geometries, axes):
+
+        """
+        Returns [[min, max]] per projection axis over every frame of every
+        scan
+        """
+
+        bounds = np.array([[np.inf, -np.inf]] * len(axes))
+
+        for geometry in geometries:
+            for hkl in geometry.iterFrames():
+                coordinates = ProjectionAccumulator.coordinates(hkl,
+                    geometry.ub_matrix, axes)
+                for i, values in enumerate(coordinates):
+                    bounds[i][0] = min(bounds[i][0], np.amin(values))
+                    bounds[i][1] = max(bounds[i][1], np.amax(values))
+
+        return bounds
+
+    # --------------------------------------------------------------------------
+
+    def deposit(self, hkl, ub_matrix, intensity, weight=1.0):
+
+        """
+        Adds a frame's pixel intensities (scaled by the frame's weight) into
+        the bins their coordinates fall in. Pixels outside are dropped.
+        """
+
+        coordinates = ProjectionAccumulator.coordinates(hkl, ub_matrix, self.axes)
+        index, valid = GridPlanningLogic.voxelIndices(coordinates, self.bounds,
+            self.shape)
+        index = index[valid]
+        n_bins = self.sum.size
+
+        self.sum.reshape(-1)[:] += np.bincount(index,
+            weights=np.ravel(intensity)[valid], minlength=n_bins) * weight
+        self.count.reshape(-1)[:] += np.bincount(index, minlength=n_bins)
+
+    # --------------------------------------------------------------------------
+
+    def projection(self):
+
+        """
+        Returns the mean intensity per pixel in each bin (sum / count);
+        empty bins are 0
+        """
+
+        projection = np.zeros(self.shape)
+        np.divide(self.sum, self.count, out=projection, where=self.count > 0)
+        return projection
+
+    # --------------------------------------------------------------------------
+
+    def axisValues(self):
+
+        """
+        Returns bin centre values along each projection axis
+        """
+
+        return [np.linspace(axis_min, axis_max, count) \
+            for (axis_min, axis_max), count in zip(self.bounds, self.shape)]
+
+    # --------------------------------------------------------------------------
+
+    def axisNames(self):
+        return [ProjectionAccumulator.AXIS_NAMES[axis] for axis in self.axes]
+
+# ==============================================================================
+
+class LiveGridder:
+
+    """
+    Grids a scan while it is being collected:
+    - Watches the scan's image directory and the growing SPEC file
+    - Deposits each new frame into persistent sum/count accumulators,
+      optionally weighted by the scan's monitor/filter normalization
+    - Never reprocesses a frame that has already been deposited
+    - Polls run on a single worker thread, which also builds the datasets
+      handed back for display; the accumulators are only touched there
+    """
+
+    def __init__ (self, image_dir, geometry, shape, normalize=True, keep_raw=False):
+
+        self.image_dir = image_dir
+        self.frame_reader = ScanFrameReader(image_dir,
+            DetectorCorrection.fromConfig(geometry.detector_path))
+        self.geometry = geometry
+        self.shape = shape
+        self.normalize = normalize
+        self.keep_raw = keep_raw
+        self.accumulator = None
+
+        # Basenames of images already deposited
+        self.processed_images = set()
+        # Frames deposited since the last dataset was handed back
+        self.snapshot_pending = False
+
+        self.driver = ThreadPoolExecutor(max_workers=1)
+
+    # --------------------------------------------------------------------------
+
+    def createAccumulator(self, first_hkl):
+
+        """
+        Sizes the grid from the scan command's planned range when possible,
+        otherwise from the first frame (the grid grows as frames arrive)
+        """
+
+        planned_angles = self.geometry.plannedAngles()
+
+        if planned_angles is not None:
+            frames = [self.geometry.mapAngles(angles) for angles in planned_angles]
+            bounds = GridPlanningLogic.estimateBounds(frames + [first_hkl])
+        else:
+            bounds = GridPlanningLogic.estimateBounds([first_hkl])
+
+        self.accumulator = GridAccumulator(bounds, self.shape, self.keep_raw)
+
+    # --------------------------------------------------------------------------
+
+    def update(self, max_frames=None):
+
+        """
+        Deposits frames that have both an image on disk and a point in the
+        SPEC file. Returns the number of frames deposited by this call.
+        """
+
+        self.geometry.refresh()
+        n_points = self.geometry.pointCount()
+
+        images = sorted([file for file in os.listdir(self.image_dir) \
+            if file.endswith((".tif", ".tiff"))])
+        deposited = 0
+
+        for point, image_name in enumerate(images[:n_points]):
+            if image_name in self.processed_images:
+                continue
+            if max_frames is not None and deposited >= max_frames:
+                break
+
+            weight = self.geometry.weights[point] if self.normalize else 1.0
+            if not np.isfinite(weight):
+                # No monitor counts for this point; nothing to normalize by
+                self.processed_images.add(image_name)
+                continue
+
+            try:
+                image = self.frame_reader.readFrame(image_name)
+            except Exception:
+                # Image still being written; picked up on a later update
+                continue
+
+            hkl = self.geometry.mapFrame(point)
+
+            if self.accumulator is None:
+                self.createAccumulator(hkl)
+            frame_bounds = GridPlanningLogic.estimateBounds([hkl])
+            if not self.accumulator.contains(frame_bounds):
+                self.accumulator.grow(frame_bounds)
+
+            self.accumulator.deposit(hkl, image, weight)
+            self.processed_images.add(image_name)
+            deposited += 1
+
+        if deposited > 0:
+            self.snapshot_pending = True
+
+        return deposited
+
+    # --------------------------------------------------------------------------
+
+    def poll(self, max_frames=None, snapshot=False):
+
+        """
+        Deposits new frames (see update). Returns (frame count, snapshot),
+        where snapshot is (dataset, axes) if one was requested and frames
+        were deposited since the last one, otherwise None.
+        """
+
+        self.update(max_frames)
+
+        result = None
+        if snapshot and self.snapshot_pending:
+            result = (self.accumulator.dataset(), self.accumulator.axes())
+            self.snapshot_pending = False
+
+        return self.frameCount(), result
+
+    # --------------------------------------------------------------------------
+
+    def submit(self, max_frames=None, snapshot=False):
+
+        """
+        Starts a poll on the worker thread. Returns a Future for its result.
+        """
+
+        return self.driver.submit(self.poll, max_frames, snapshot)
+
+    # --------------------------------------------------------------------------
+
+    def frameCount(self):
+        return len(self.processed_images)
+
+    # --------------------------------------------------------------------------
+
+    def shutdown(self):
+        self.driver.shutdown(wait=False)
+
+# ==============================================================================
+
+class GridMergeLogic:
+
+    """
+    Grids several scans into a single reciprocal space grid:
+    - Union extent of all scans is computed once up front
+    - Frames from every scan are streamed into shared sum/count
+      accumulators, so each voxel averages all pixels that land in it
+      (rather than averaging per-scan averages)
+    - Each frame is weighted by its monitor/filter normalization as it is
+      deposited, so no second pass over the volume is needed
+    - Scans can also be projected straight onto one or two axes, skipping
+      the 3D grid
+    """
+
+    # Frames read (decoded concurrently) at once
+    BATCH_SIZE = 16
+
+    def mergeScans(geometries, image_dirs, shape, progress=None, normalize=True,
+        keep_raw=False):
+
+        """
+        Returns a GridAccumulator holding every frame of every scan.
+        `progress(done, total)` is called after each frame if given.
+        """
+
+        bounds = GridPlanningLogic.estimateBounds(hkl \
+            for geometry in geometries for hkl in geometry.iterFrames())
+        accumulator = GridAccumulator(bounds, shape, keep_raw)
+
+        for geometry, point, image, weight in GridMergeLogic.scanFrames(
+            geometries, image_dirs, progress, normalize):
+            accumulator.deposit(geometry.mapFrame(point), image, weight)
+
+        return accumulator
+
+    # --------------------------------------------------------------------------
+
+    def projectScans(geometries, image_dirs, axes, shape, bounds=None,
+        progress=None, normalize=True):
+
+        """
+        Returns a ProjectionAccumulator holding every frame of every scan,
+        binned over `axes` (two of H/K/L, or |Q| alone). Bounds default to
+        the scans' full extent along those axes.
+        """
+
+        if bounds is None:
+            bounds = ProjectionAccumulator.scanBounds(geometries, axes)
+        accumulator = ProjectionAccumulator(axes, bounds, shape)
+
+        for geometry, point, image, weight in GridMergeLogic.scanFrames(
+            geometries, image_dirs, progress, normalize):
+            accumulator.deposit(geometry.mapFrame(point), geometry.ub_matrix,
+                image, weight)
+
+        return accumulator
+
+    # --------------------------------------------------------------------------
+
+    def scanFrames(geometries, image_dirs, progress=None, normalize=True):
+
+        """
+        Yields (geometry, point, image, weight) for every frame of every
+        scan, reading frames in batches. Points without monitor counts are
+        skipped. `progress(done, total)` is called after each frame if given.
+        """
+
+        scan_images = []
+        for geometry, image_dir in zip(geometries, image_dirs):
+            images = sorted([file for file in os.listdir(image_dir) \
+                if file.endswith((".tif", ".tiff"))])
+            scan_images.append(images[:geometry.pointCount()])
+
+        total = sum(len(images) for images in scan_images)
+        done = 0
+
+        for geometry, image_dir, images in zip(geometries, image_dirs, scan_images):
+            # Packed scans are read from their FrameStack; the rest are
+            # batch-decoded. Frames are corrected as they're read.
+            frame_reader = ScanFrameReader(image_dir,
+                DetectorCorrection.fromConfig(geometry.detector_path))
+            weights = geometry.weights if normalize else np.ones(len(images))
+
+            for start in range(0, len(images), GridMergeLogic.BATCH_SIZE):
+                batch = range(start, min(start + GridMergeLogic.BATCH_SIZE, len(images)))
+
+                # Points without monitor counts have nothing to normalize by
+                points = [point for point in batch if np.isfinite(weights[point])]
+                if points:
+                    frames = frame_reader.readFrames([images[point] for point in points])
+                    for point, image in zip(points, frames):
+                        yield geometry, point, image, weights[point]
+
+                for point in batch:
+                    done += 1
+                    if progress is not None:
+                        progress(done, total)
+
+# ==============================================================================
+
+class HKLIndex:
+
+    """
+    Reverse map from HKL to the (frame, pixel) samples of a scan:
+    - A uniform bucket grid over the scan's HKL bounds, with the flat ids
+      (frame * n_pixels + pixel) of each bucket's samples stored contiguously
+    - Candidate HKL values are recomputed exactly from the geometry's
+      per-frame transforms, so only ids are kept in memory/on disk
+    - Answers box and nearest-neighbour queries
+    """
+
+    # Buckets are roughly this many recommended voxel steps wide along each
+    # axis (each voxel step spans a few sampling steps)
+    BUCKET_STEPS = 2
+    MAX_BUCKETS_PER_AXIS = 256
+
+    # Samples converted to HKL at once while answering a query
+    CHUNK_SIZE = 2 ** 20
+
+    def __init__ (self, geometry, bounds, shape, offsets, ids):
+
+        self.geometry = geometry
+        self.bounds = np.asarray(bounds, dtype=np.float64)
+        self.shape = tuple(int(n) for n in shape)
+        self.offsets = offsets
+        self.ids = ids
+        self.occupied = None
+
+        self.origin = self.bounds[:, 0]
+        self.width = (self.bounds[:, 1] - self.bounds[:, 0]) / np.array(self.shape)
+        self.width[self.width <= 0] = 1
+        self.n_pixels = int(np.prod(geometry.n_pixels))
+
+        self.matrices, self.frame_offsets = geometry.kernel.transforms(
+            geometry.angles, geometry.ub_matrix, geometry.energy)
+
+    # --------------------------------------------------------------------------
+
+    def build(geometry, progress=None):
+
+        """
+        Returns an index over every pixel of every point in the scan.
+        `progress(done, total)` is called after each pass over a batch.
+        """
+
+        n_points = geometry.pointCount()
+        bounds = GridPlanningLogic.estimateBounds(geometry.iterFrames())
+        steps = GridPlanningLogic.estimateSteps(geometry,
+            sorted(set([0, n_points // 2, max(n_points - 2, 0)])))
+        shape = GridPlanningLogic.recommendGridSize(bounds,
+            steps * HKLIndex.BUCKET_STEPS, HKLIndex.MAX_BUCKETS_PER_AXIS)
+
+        index = HKLIndex(geometry, bounds, shape, None, None)
+        n_buckets = int(np.prod(shape))
+        n_pixels = index.n_pixels
+        batch_size = 16
+        batches = list(range(0, n_points, batch_size))
+
+        # Counting sort: bucket sizes first, then ids placed bucket by bucket
+        counts = np.zeros(n_buckets, dtype=np.int64)
+        for i, start in enumerate(batches):
+            hkl = geometry.kernel.areaBatch(geometry.angles[start:start + batch_size],
+                geometry.ub_matrix, geometry.energy)
+            buckets = index.bucketIndices(np.moveaxis(hkl, 1, 0).reshape(3, -1))
+            counts += np.bincount(buckets, minlength=n_buckets)
+            if progress is not None:
+                progress(i + 1, 2 * len(batches))
+
+        offsets = np.zeros(n_buckets + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        id_dtype = np.uint32 if n_points * n_pixels < 2 ** 32 else np.int64
+        ids = np.empty(offsets[-1], dtype=id_dtype)
+        filled = offsets[:-1].copy()
+
+        for i, start in enumerate(batches):
+            hkl = geometry.kernel.areaBatch(geometry.angles[start:start + batch_size],
+                geometry.ub_matrix, geometry.energy)
+            buckets = index.bucketIndices(np.moveaxis(hkl, 1, 0).reshape(3, -1))
+
+            order = np.argsort(buckets, kind="stable")
+            sorted_buckets = buckets[order]
+            rank = np.arange(len(order)) - np.searchsorted(sorted_buckets, sorted_buckets)
+            ids[filled[sorted_buckets] + rank] = start * n_pixels + order
+            filled += np.bincount(buckets, minlength=n_buckets)
+            if progress is not None:
+                progress(len(batches) + i + 1, 2 * len(batches))
+
+        index.offsets, index.ids = offsets, ids
+
+        return index
+
+    # --------------------------------------------------------------------------
+
+    def cachePath(image_dir):
+
+        """
+        Index files are kept beside (not inside) the scan's image directory
+        """
+
+        return os.path.normpath(image_dir) + "_hkl_index.npz"
+
+    # --------------------------------------------------------------------------
+
+    def save(self, path):
+
+        """
+        Writes the index along with the geometry it was built from. Returns
+        False if the location isn't writable.
+        """
+
+        try:
+            with open(path, "wb") as file:
+                np.savez(file, bounds=self.bounds, shape=self.shape,
+                    offsets=self.offsets, ids=self.ids,
+                    angles=self.geometry.angles, ub_matrix=self.geometry.ub_matrix,
+                    energy=self.geometry.energy, n_pixels=self.geometry.n_pixels)
+        except OSError:
+            return False
+
+        return True
+
+    # --------------------------------------------------------------------------
+
+    def load(path, geometry):
+
+        """
+        Returns a saved index, or None if it's missing or was built from
+        different angles/UB matrix/energy/detector
+        """
+
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path) as data:
+                if not (np.array_equal(data["angles"], geometry.angles) and \
+                    np.array_equal(data["ub_matrix"], geometry.ub_matrix) and \
+                    float(data["energy"]) == geometry.energy and \
+                    tuple(data["n_pixels"]) == tuple(geometry.n_pixels)):
+                    return None
+                return HKLIndex(geometry, data["bounds"], data["shape"],
+                    data["offsets"], data["ids"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    # --------------------------------------------------------------------------
+
+    def loadOrBuild(geometry, image_dir, progress=None):
+
+        """
+        Returns the cached index for a scan, building (and caching) it if
+        needed
+        """
+
+        path = HKLIndex.cachePath(image_dir)
+        index = HKLIndex.load(path, geometry)
+
+        if index is None:
+            index = HKLIndex.build(geometry, progress)
+            index.save(path)
+
+        return index
+
+    # --------------------------------------------------------------------------
+
+    def bucketIndices(self, hkl):
+
+        """
+        Returns flat bucket indices for a (3, n) HKL array (clipped to grid)
+        """
+
+        flat_index = np.zeros(hkl.shape[1], dtype=np.int64)
+
+        for axis in range(3):
+            index = np.floor((hkl[axis] - self.origin[axis]) / self.width[axis])
+            index = np.clip(index, 0, self.shape[axis] - 1).astype(np.int64)
+            flat_index = flat_index * self.shape[axis] + index
+
+        return flat_index
+
+    # --------------------------------------------------------------------------
+
+    def bucketRange(self, hkl_min, hkl_max):
+
+        """
+        Returns per-axis [first, last] bucket indices covering an HKL box
+        """
+
+        first = np.floor((np.asarray(hkl_min) - self.origin) / self.width)
+        last = np.floor((np.asarray(hkl_max) - self.origin) / self.width)
+        upper = np.array(self.shape) - 1
+
+        return np.clip(first, 0, upper).astype(int), np.clip(last, 0, upper).astype(int)
+
+    # --------------------------------------------------------------------------
+
+    def blockBuckets(self, first, last):
+
+        """
+        Returns flat indices of the bucket block [first, last]
+        """
+
+        blocks = np.ix_(*[np.arange(first[axis], last[axis] + 1) for axis in range(3)])
+
+        return np.ravel_multi_index(blocks, self.shape).ravel()
+
+    # --------------------------------------------------------------------------
+
+    def occupiedBuckets(self):
+
+        """
+        Returns flat indices and (3, n) grid coordinates of non-empty buckets
+        """
+
+        if self.occupied is None:
+            buckets = np.nonzero(np.diff(self.offsets))[0]
+            self.occupied = (buckets, np.array(np.unravel_index(buckets, self.shape)))
+
+        return self.occupied
+
+    # --------------------------------------------------------------------------
+
+    def samplesInBuckets(self, buckets):
+
+        """
+        Returns ids of all samples in the given buckets
+        """
+
+        starts = self.offsets[buckets]
+        lengths = self.offsets[buckets + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Concatenated ranges without a Python loop
+        shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.ids[shifts + np.arange(total)].astype(np.int64)
+
+    # --------------------------------------------------------------------------
+
+    def sampleHKL(self, ids):
+
+        """
+        Returns exact (n, 3) HKL values for sample ids
+        """
+
+        frames, pixels = np.divmod(ids, self.n_pixels)
+        directions = self.geometry.kernel.pixel_directions[:, pixels]
+
+        return np.einsum("nij,jn->ni", self.matrices[frames], directions) - \
+            self.frame_offsets[frames]
+
+    # --------------------------------------------------------------------------
+
+    def iterSampleHKL(self, ids):
+
+        """
+        Yields (ids, HKL) in chunks so large queries stay memory-bounded
+        """
+
+        for start in range(0, len(ids), HKLIndex.CHUNK_SIZE):
+            chunk = ids[start:start + HKLIndex.CHUNK_SIZE]
+            yield chunk, self.sampleHKL(chunk)
+
+    # --------------------------------------------------------------------------
+
+    def samplePixels(self, ids):
+
+        """
+        Returns (frames, pixel_1, pixel_2) for sample ids
+        """
+
+        frames, pixels = np.divmod(ids, self.n_pixels)
+        pixel_1, pixel_2 = np.unravel_index(pixels, self.geometry.n_pixels)
+
+        return frames, pixel_1, pixel_2
+
+    # --------------------------------------------------------------------------
+
+    def framePixels(self, ids):
+
+        """
+        Groups sample ids by frame. Returns {frame: flat pixel indices}.
+        """
+
+        frames, pixels = np.divmod(np.sort(ids), self.n_pixels)
+        unique_frames, starts = np.unique(frames, return_index=True)
+
+        return dict(zip(unique_frames.tolist(), np.split(pixels, starts[1:])))
+
+    # --------------------------------------------------------------------------
+
+    def queryBox(self, hkl_min, hkl_max):
+
+        """
+        Returns ids of samples with hkl_min <= HKL <= hkl_max
+        """
+
+        hkl_min, hkl_max = np.asarray(hkl_min), np.asarray(hkl_max)
+        if np.any(hkl_max < self.bounds[:, 0]) or np.any(hkl_min > self.bounds[:, 1]):
+            return np.zeros(0, dtype=np.int64)
+
+        ids = self.samplesInBuckets(self.blockBuckets(*self.bucketRange(hkl_min, hkl_max)))
+        found = [chunk[np.all((hkl >= hkl_min) & (hkl <= hkl_max), axis=1)] \
+            for chunk, hkl in self.iterSampleHKL(ids)]
+
+        return np.concatenate(found) if found else ids
+
+    # --------------------------------------------------------------------------
+
+    def queryNearest(self, hkl, count=1):
+
+        """
+        Returns (ids, distances) of the `count` samples closest to an HKL
+        point. Non-empty buckets are visited in order of their distance from
+        the point until none left can hold anything closer.
+        """
+
+        hkl = np.asarray(hkl, dtype=np.float64)
+        buckets, coords = self.occupiedBuckets()
+
+        # Lower bound on the distance to anything in each bucket
+        low = self.origin[:, None] + coords * self.width[:, None]
+        outside = np.maximum(low - hkl[:, None], 0) + \
+            np.maximum(hkl[:, None] - (low + self.width[:, None]), 0)
+        lower_bounds = np.sqrt(np.sum(outside ** 2, axis=0))
+        order = np.argsort(lower_bounds)
+
+        nearest_ids, distances = np.zeros(0, dtype=np.int64), np.zeros(0)
+        start, batch_size = 0, 8
+
+        while start < len(order):
+            if len(distances) == count and distances[-1] <= lower_bounds[order[start]]:
+                break
+
+            ids = self.samplesInBuckets(buckets[order[start:start + batch_size]])
+            for chunk, chunk_hkl in self.iterSampleHKL(ids):
+                nearest_ids = np.concatenate((nearest_ids, chunk))
+                distances = np.concatenate((distances,
+                    np.linalg.norm(chunk_hkl - hkl, axis=1)))
+                keep = np.argsort(distances)[:count]
+                nearest_ids, distances = nearest_ids[keep], distances[keep]
+
+            start += batch_size
+            batch_size *= 2
+
+        return nearest_ids, distances
+
+# ==============================================================================
+
+class HKLIndexLoader:
+
+    """
+    Loads a scan's HKL index from disk, or builds (and caches) it, on a
+    background thread. Progress and the result (index or error) are read
+    from the GUI thread.
+    """
+
+    def __init__ (self, geometry, image_dir):
+
+        self.geometry = geometry
+        self.image_dir = image_dir
+
+        # Passes over the scan done/needed (0/0 while loading from disk)
+        self.done = 0
+        self.total = 0
+
+        self.index = None
+        self.error = None
+        self.thread = None
+
+    # --------------------------------------------------------------------------
+
+    def progress(self, done, total):
+        self.done, self.total = done, total
+
+    # --------------------------------------------------------------------------
+
+    def run(self):
+        try:
+            self.index = HKLIndex.loadOrBuild(self.geometry, self.image_dir,
+                self.progress)
+        except Exception as ex:
+            self.error = ex
+
+    # --------------------------------------------------------------------------
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # --------------------------------------------------------------------------
+
+    def isRunning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+# ==============================================================================
+
+class PlaneRegridder:
+
+    """
+    Regrids single frames onto a regular 2D plane spanned by two HKL axes
+    (the third is projected out):
+    - The plane covers the whole scan, so frames stay comparable during
+      playback
+    - A frame's bin indices and per-bin pixel counts depend only on the
+      geometry, so they're computed once per frame and cached (bounded by
+      bytes); regridding a cached frame is a single bincount
+    """
+
+    AXIS_NAMES = ["H", "K", "L"]
+    MAX_CACHED_BYTES = 256 * 1024 ** 2
+
+    def __init__ (self, geometry, axes=(0, 2), shape=(200, 200), bounds=None):
+
+        self.geometry = geometry
+        self.axes = tuple(int(axis) for axis in axes)
+        self.shape = tuple(int(n) for n in shape)
+
+        if bounds is None:
+            bounds = PlaneRegridder.scanBounds(geometry)
+        self.bounds = np.asarray(bounds, dtype=np.float64)[list(self.axes)]
+        self.step = (self.bounds[:, 1] - self.bounds[:, 0]) / np.array(self.shape)
+        self.step[self.step <= 0] = 1
+
+        # Scan point -> (pixels, bins, counts)
+        self.frame_bins = OrderedDict()
+        self.n_bytes = 0
+        self.lock = threading.Lock()
+
+    # --------------------------------------------------------------------------
+
+    def scanBounds(geometry):
+
+        """
+        Returns [[min, max]] per HKL axis over the scan's frames (and its
+        planned points, for scans still being collected)
+        """
+
+        frames = geometry.iterFrames()
+        planned_angles = geometry.plannedAngles()
+        if planned_angles is not None:
+            frames = itertools.chain(frames,
+                (geometry.mapAngles(angles) for angles in planned_angles))
+
+        return GridPlanningLogic.estimateBounds(frames)
+
+    # --------------------------------------------------------------------------
+
+    def frameBins(self, point):
+
+        """
+        Returns (pixels, bins, counts) for a scan point: flat indices of the
+        frame's pixels inside the plane, the flat bin each falls in, and the
+        number of pixels per bin
+        """
+
+        with self.lock:
+            if point in self.frame_bins:
+                self.frame_bins.move_to_end(point)
+                return self.frame_bins[point]
+
+        if point >= self.geometry.pointCount():
+            self.geometry.refresh()
+        hkl = self.geometry.mapFrame(point)
+
+        valid = True
+        indices = []
+        for i, axis in enumerate(self.axes):
+            coords = (np.ravel(hkl[axis]) - self.bounds[i][0]) / self.step[i]
+            valid = valid & (coords >= 0) & (coords <= self.shape[i])
+            indices.append(np.minimum(coords.astype(np.int64), self.shape[i] - 1))
+
+        pixels = np.flatnonzero(valid)
+        bins = indices[0][pixels] * self.shape[1] + indices[1][pixels]
+        counts = np.bincount(bins, minlength=self.shape[0] * self.shape[1])
+        entry = (pixels.astype(np.int32), bins.astype(np.int32), counts)
+
+        with self.lock:
+            self.frame_bins[point] = entry
+            self.n_bytes += sum(array.nbytes for array in entry)
+            while self.n_bytes > PlaneRegridder.MAX_CACHED_BYTES and len(self.frame_bins) > 1:
+                _, removed = self.frame_bins.popitem(last=False)
+                self.n_bytes -= sum(array.nbytes for array in removed)
+
+        return entry
+
+    # --------------------------------------------------------------------------
+
+    def regrid(self, point, image):
+
+        """
+        Returns the frame's mean intensity per plane bin (0 where no pixel
+        falls), shape (n_1, n_2) along the plane's two axes
+        """
+
+        pixels, bins, counts = self.frameBins(point)
+        sums = np.bincount(bins, weights=np.ravel(image)[pixels], minlength=counts.size)
+        plane = np.zeros(counts.size)
+        np.divide(sums, counts, out=plane, where=counts > 0)
+
+        return plane.reshape(self.shape)
+
+    # --------------------------------------------------------------------------
+
+    def rect(self):
+
+        """
+        Returns the plane's (x, y, width, height) in HKL units
+        """
+
+        return (self.bounds[0][0], self.bounds[1][0],
+            self.bounds[0][1] - self.bounds[0][0], self.bounds[1][1] - self.bounds[1][0])
+
+    # --------------------------------------------------------------------------
+
+    def axisNames(self):
+        return [PlaneRegridder.AXIS_NAMES[axis] for axis in self.axes]
+
+# ==============================================================================
@@ -0,0 +1,106 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+from rsMap3D.datasource.DetectorGeometryForXrayutilitiesReader import DetectorGeometryForXrayutilitiesReader as detReader
+from rsMap3D.datasource.InstForXrayutilitiesReader import InstForXrayutilitiesReader as instrReader
+import xrayutilities as xu
+
+from source.rsm_logic import AreaConversionKernel, ScanGeometry
+
+# ==============================================================================
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "example_files")
+SPEC_PATH = os.path.join(EXAMPLE_DIR, "pmn_pt011_2_1.spec")
+DETECTOR_PATH = os.path.join(EXAMPLE_DIR, "6IDB_DetectorGeometry.xml")
+INSTRUMENT_PATH = os.path.join(EXAMPLE_DIR, "6IDB_Instrument.xml")
+SCAN_NUMBER = 840
+
+# ==============================================================================
+
+def xuArea(angles, ub_matrix, energy):
+
+    """
+    Returns (H, K, L) pixel arrays from xrayutilities' Ang2Q.area, set up
+    from the example configs
+    """
+
+    d_reader = detReader(DETECTOR_PATH)
+    i_reader = instrReader(INSTRUMENT_PATH)
+
+    q_conv = xu.experiment.QConversion(i_reader.getSampleCircleDirections(),
+        i_reader.getDetectorCircleDirections(), i_reader.getPrimaryBeamDirection())
+    hxrd = xu.HXRD(i_reader.getInplaneReferenceDirection(),
+        i_reader.getSampleSurfaceNormalDirection(), en=energy, qconv=q_conv)
+
+    detector = d_reader.getDetectors()[0]
+    c_ch_1, c_ch_2 = d_reader.getCenterChannelPixel(detector)
+    n_ch_1, n_ch_2 = d_reader.getNpixels(detector)
+    hxrd.Ang2Q.init_area(d_reader.getPixelDirection1(detector),
+        d_reader.getPixelDirection2(detector), cch1=c_ch_1, cch2=c_ch_2,
+        Nch1=n_ch_1, Nch2=n_ch_2, pwidth1=d_reader.getSize(detector)[0] / n_ch_1,
+        pwidth2=d_reader.getSize(detector)[1] / n_ch_2,
+        distance=d_reader.getDistance(detector), roi=[0, n_ch_1, 0, n_ch_2])
+
+    return hxrd.Ang2Q.area(*angles, UB=ub_matrix)
+
+# ==============================================================================
+
+@pytest.fixture(scope="module")
+def geometry():
+    return ScanGeometry(SPEC_PATH, SCAN_NUMBER, DETECTOR_PATH, INSTRUMENT_PATH)
+
+# ------------------------------------------------------------------------------
+
+@pytest.fixture(scope="module")
+def points(geometry):
+    n_points = geometry.pointCount()
+    return sorted(set([0, 1, n_points // 3, n_points // 2, n_points - 1]))
+
+# ------------------------------------------------------------------------------
+
+def test_area_matches_xrayutilities(geometry, points):
+    kernel = AreaConversionKernel.fromConfig(DETECTOR_PATH, INSTRUMENT_PATH)
+
+    for point in points:
+        angles = geometry.angles[point]
+        expected = xuArea(angles, geometry.ub_matrix, geometry.energy)
+        hkl = kernel.area(angles, geometry.ub_matrix, geometry.energy)
+
+        for axis in range(3):
+            np.testing.assert_allclose(hkl[axis], expected[axis], rtol=0, atol=1e-10)
+
+# ------------------------------------------------------------------------------
+
+def test_area_batch_matches_xrayutilities(geometry, points):
+    kernel = AreaConversionKernel.fromConfig(DETECTOR_PATH, INSTRUMENT_PATH)
+    hkl = kernel.areaBatch(geometry.angles[points], geometry.ub_matrix,
+        geometry.energy)
+
+    assert hkl.shape == (len(points), 3) + kernel.n_pixels
+
+    for i, point in enumerate(points):
+        expected = xuArea(geometry.angles[point], geometry.ub_matrix, geometry.energy)
+        np.testing.assert_allclose(hkl[i], np.array(expected), rtol=0, atol=1e-10)
+
+# ------------------------------------------------------------------------------
+
+def test_area_matches_xrayutilities_off_scan(geometry):
+    # Every circle moved away from the scan's values, so each rotation's
+    # axis and sign is exercised
+    kernel = AreaConversionKernel.fromConfig(DETECTOR_PATH, INSTRUMENT_PATH)
+    angles = geometry.angles[0] + np.linspace(3, 11, geometry.angles.shape[1])
+
+    expected = xuArea(angles, geometry.ub_matrix, geometry.energy)
+    hkl = kernel.area(angles, geometry.ub_matrix, geometry.energy)
+
+    np.testing.assert_allclose(np.array(hkl), np.array(expected), rtol=0, atol=1e-10)
+
+# ==============================================================================
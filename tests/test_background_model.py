@@ -0,0 +1,133 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+import tifffile as tiff
+
+from source.image_logic import BackgroundModel, FrameCache, TiffDirectorySource
+
+# ==============================================================================
+
+N_FRAMES = 30
+FRAME_SHAPE = (8, 5)
+
+# ==============================================================================
+
+def expectedBackground(frames, start, end, percentile):
+
+    """
+    Returns the k-th smallest value per pixel over frames [start, end)
+    """
+
+    window = np.sort(frames[start:end].astype(np.float32), axis=0)
+    k = int(round(percentile / 100 * (end - start - 1)))
+
+    return window[k]
+
+# ==============================================================================
+
+@pytest.fixture
+def scan(tmp_path):
+
+    """
+    Returns a TiffDirectorySource over random frames (as read) and the
+    frames, counting frame reads in source.reads
+    """
+
+    scan_path = str(tmp_path / "S1")
+    os.makedirs(scan_path)
+    frames = np.random.default_rng(0).integers(0, 1000,
+        (N_FRAMES,) + FRAME_SHAPE, dtype=np.uint16)
+    for i, frame in enumerate(frames):
+        tiff.imwrite(os.path.join(scan_path, f"scan_S1_{i:05d}.tif"), frame)
+
+    source = TiffDirectorySource(scan_path, FrameCache())
+    source.reads = []
+    get_frame = source.getFrame
+    source.getFrame = lambda i: source.reads.append(i) or get_frame(i)
+
+    return source, frames.transpose(0, 2, 1)
+
+# ------------------------------------------------------------------------------
+
+@pytest.mark.parametrize("percentile", [0, 25, 50, 90, 100])
+def test_percentile_over_centred_window(scan, percentile):
+    source, frames = scan
+    model = BackgroundModel(source, window=7, percentile=percentile, max_workers=2)
+
+    np.testing.assert_array_equal(model.background(12),
+        expectedBackground(frames, 9, 16, percentile))
+    model.shutdown()
+
+# ------------------------------------------------------------------------------
+
+def test_window_shifted_inside_scan(scan):
+    source, frames = scan
+    model = BackgroundModel(source, window=7)
+
+    assert model.windowRange(0) == (0, 7)
+    assert model.windowRange(N_FRAMES - 1) == (N_FRAMES - 7, N_FRAMES)
+    np.testing.assert_array_equal(model.background(1), expectedBackground(frames, 0, 7, 50))
+    np.testing.assert_array_equal(model.background(N_FRAMES - 1),
+        expectedBackground(frames, N_FRAMES - 7, N_FRAMES, 50))
+
+    # A window longer than the scan uses every frame
+    model = BackgroundModel(source, window=45)
+    assert model.windowRange(10) == (0, N_FRAMES)
+    np.testing.assert_array_equal(model.background(10),
+        expectedBackground(frames, 0, N_FRAMES, 50))
+
+# ------------------------------------------------------------------------------
+
+def test_stepping_reads_one_frame_per_step(scan):
+    source, frames = scan
+    model = BackgroundModel(source, window=5, percentile=50)
+
+    model.background(10)
+    assert sorted(source.reads) == list(range(8, 13))
+
+    for frame in range(11, 20):
+        source.reads.clear()
+        np.testing.assert_array_equal(model.background(frame),
+            expectedBackground(frames, frame - 2, frame + 3, 50))
+        assert source.reads == [frame + 2]
+
+    # Stepping back reuses the cached background
+    source.reads.clear()
+    background = model.background(18)
+    assert source.reads == [] and background is model.background(18)
+
+# ------------------------------------------------------------------------------
+
+def test_cached_backgrounds_bounded(scan):
+    source, frames = scan
+    model = BackgroundModel(source, window=3)
+
+    for frame in range(1, 20):
+        model.background(frame)
+
+    assert len(model.backgrounds) == BackgroundModel.MAX_CACHED_BACKGROUNDS
+    assert list(model.backgrounds) == list(range(20 - BackgroundModel.MAX_CACHED_BACKGROUNDS, 20))
+
+    model.clear()
+    assert len(model.backgrounds) == 0 and np.all(model.slot_frames == -1)
+
+# ------------------------------------------------------------------------------
+
+def test_subtract_clips_at_zero(scan):
+    source, frames = scan
+    model = BackgroundModel(source, window=5)
+
+    subtracted = model.subtract(frames[10], 10)
+    expected = np.maximum(frames[10] - expectedBackground(frames, 8, 13, 50), 0)
+
+    assert subtracted.dtype == np.float32
+    np.testing.assert_array_equal(subtracted, expected)
+
+# ==============================================================================
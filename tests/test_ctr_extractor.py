@@ -0,0 +1,151 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import h5py
+import numpy as np
+import pytest
+
+from source.analysis_logic import CTRExtractor
+
+# ==============================================================================
+
+# H, K steps of 0.025: a 0.04 window holds 3 x 3 columns around each rod and
+# a 0.04 border the 7 x 7 - 3 x 3 columns around that
+AXES = [np.linspace(-1.5, 1.5, 121), np.linspace(-1.5, 1.5, 121), np.linspace(0.5, 3, 26)]
+WINDOW = (0.04, 0.04)
+BORDER = (0.04, 0.04)
+RODS = [(0, 0), (1, -1), (-1, 1), (1, 1)]
+
+# ==============================================================================
+
+def rodMasks(rod):
+
+    """
+    Returns (window, border) (H, K) masks of a rod, from voxel distances
+    """
+
+    h, k = np.meshgrid(AXES[0], AXES[1], indexing="ij")
+    distance = np.maximum(np.abs(h - rod[0]), np.abs(k - rod[1]))
+
+    return distance < 0.03, (distance > 0.03) & (distance < 0.08)
+
+# ------------------------------------------------------------------------------
+
+def bruteForceRod(dataset, rod, mask):
+
+    """
+    Returns (signal, background) means per L of a rod's window and border
+    """
+
+    keep = mask & np.isfinite(dataset)
+    means = []
+
+    for columns in rodMasks(rod):
+        values = np.where(keep, dataset, 0)[columns]
+        counts = keep[columns].sum(axis=0)
+        means.append(np.where(counts > 0, values.sum(axis=0) / np.maximum(counts, 1), 0))
+
+    return means
+
+# ------------------------------------------------------------------------------
+
+def rodDataset():
+
+    """
+    Returns a (1 + L) background with rods of amplitude 100 / L filling
+    each rod's window
+    """
+
+    dataset = np.broadcast_to(1 + AXES[2], tuple(len(values) for values in AXES)).copy()
+    for rod in RODS:
+        dataset[rodMasks(rod)[0]] += 100 / AXES[2]
+
+    return dataset
+
+# ==============================================================================
+
+@pytest.fixture
+def dataset():
+    dataset = rodDataset()
+    return dataset + np.random.default_rng(0).normal(0, 0.1, dataset.shape)
+
+# ------------------------------------------------------------------------------
+
+def test_rods_on_flat_background():
+    extractor = CTRExtractor(AXES, RODS, WINDOW, BORDER)
+    intensity, signal, background = extractor.extract(rodDataset())
+
+    assert intensity.shape == signal.shape == background.shape == (len(RODS), len(AXES[2]))
+    np.testing.assert_allclose(background, np.broadcast_to(1 + AXES[2], background.shape))
+    np.testing.assert_allclose(signal - background,
+        np.broadcast_to(100 / AXES[2], signal.shape))
+    np.testing.assert_allclose(intensity, 9 * 100 / AXES[2] * np.ones((len(RODS), 1)))
+
+# ------------------------------------------------------------------------------
+
+def test_window_and_border_means_match_brute_force(dataset):
+    mask = np.random.default_rng(1).uniform(size=dataset.shape) > 0.2
+    dataset[60, 60, 3] = np.nan
+    # No window voxel left at one L of the first rod
+    mask[59:62, 59:62, 5] = False
+
+    extractor = CTRExtractor(AXES, RODS, WINDOW, BORDER)
+    intensity, signal, background = extractor.extract(dataset, mask)
+
+    for i, rod in enumerate(RODS):
+        expected_signal, expected_background = bruteForceRod(dataset, rod, mask)
+        np.testing.assert_allclose(signal[i], expected_signal)
+        np.testing.assert_allclose(background[i], expected_background)
+
+        filled = expected_signal != 0
+        np.testing.assert_allclose(intensity[i][filled],
+            9 * (expected_signal - expected_background)[filled])
+
+    assert signal[0, 5] == 0 and intensity[0, 5] == 0
+
+# ------------------------------------------------------------------------------
+
+def test_chunked_along_l(dataset, monkeypatch):
+    expected = CTRExtractor(AXES, RODS, WINDOW, BORDER).extract(dataset)
+
+    # A few L values per chunk, with a short last chunk
+    extractor = CTRExtractor(AXES, RODS, WINDOW, BORDER)
+    monkeypatch.setattr(CTRExtractor, "CHUNK_VOXELS", 4 * len(extractor.columns[0]))
+
+    for values, expected_values in zip(extractor.extract(dataset), expected):
+        np.testing.assert_allclose(values, expected_values)
+
+# ------------------------------------------------------------------------------
+
+def test_grid_rods():
+    assert CTRExtractor.gridRods(AXES) == [(h, k) for h in (-1, 0, 1) for k in (-1, 0, 1)]
+    assert CTRExtractor.gridRods([np.linspace(0.2, 2.7, 5), np.linspace(-0.5, 0.5, 5),
+        AXES[2]]) == [(1, 0), (2, 0)]
+
+# ------------------------------------------------------------------------------
+
+def test_save_layout(dataset, tmp_path):
+    extractor = CTRExtractor(AXES, RODS, WINDOW, BORDER)
+    intensity, signal, background = extractor.extract(dataset)
+    file_path = str(tmp_path / "rods.h5")
+    extractor.save(file_path, intensity, signal, background)
+
+    with h5py.File(file_path, "r") as file:
+        rods = file["rods"]
+        assert sorted(rods) == sorted(f"H{h}_K{k}" for h, k in RODS)
+        np.testing.assert_allclose(rods.attrs["window"], WINDOW)
+        np.testing.assert_allclose(rods.attrs["border"], BORDER)
+
+        for i, (h, k) in enumerate(RODS):
+            rod = rods[f"H{h}_K{k}"]
+            assert (rod.attrs["H"], rod.attrs["K"]) == (h, k)
+            np.testing.assert_array_equal(rod["L"][()], AXES[2])
+            np.testing.assert_array_equal(rod["Intensity"][()], intensity[i])
+            np.testing.assert_array_equal(rod["Signal"][()], signal[i])
+            np.testing.assert_array_equal(rod["Background"][()], background[i])
+
+# ==============================================================================
@@ -0,0 +1,141 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import pytest
+
+from source.analysis_logic import DatasetIntegrator
+
+# ==============================================================================
+
+AXES = [np.linspace(-1, 1, 21), np.linspace(-0.5, 1.5, 17), np.linspace(1, 2, 11)]
+
+# ==============================================================================
+
+def bruteForceIntegrate(values, dataset, n_bins, bin_range, keep=None):
+
+    """
+    Returns (sums, counts) of dataset voxels histogrammed by a per-voxel
+    coordinate
+    """
+
+    keep = np.ones(dataset.shape, dtype=bool) if keep is None else keep
+    sums, edges = np.histogram(values[keep], n_bins, bin_range, weights=dataset[keep])
+    counts, edges = np.histogram(values[keep], n_bins, bin_range)
+
+    return sums, counts
+
+# ------------------------------------------------------------------------------
+
+def voxelHKL():
+    return np.meshgrid(*AXES, indexing="ij")
+
+# ==============================================================================
+
+@pytest.fixture(autouse=True)
+def clear_bin_cache():
+    DatasetIntegrator.bin_cache.clear()
+
+# ------------------------------------------------------------------------------
+
+@pytest.fixture
+def dataset():
+    return np.random.default_rng(0).uniform(0, 100, tuple(len(values) for values in AXES))
+
+# ------------------------------------------------------------------------------
+
+def test_q_shells_match_brute_force(dataset):
+    metric = np.array([[2.0, 0.3, 0], [0, 1.5, 0], [0, 0.2, 1.0]])
+    center = (0.1, 0.5, 1.5)
+    integrator = DatasetIntegrator(AXES, "|Q|", 30, center=center, metric=metric)
+
+    centers, intensity, counts = integrator.integrate(dataset)
+
+    offsets = np.stack(voxelHKL(), axis=-1) - center
+    q = np.linalg.norm(offsets @ metric.T, axis=-1)
+    sums, expected_counts = bruteForceIntegrate(q, dataset, 30, (q.min(), q.max()))
+
+    np.testing.assert_array_equal(counts, expected_counts)
+    filled = expected_counts > 0
+    np.testing.assert_allclose(intensity[filled], sums[filled] / expected_counts[filled])
+    assert np.all(intensity[~filled] == 0)
+    np.testing.assert_allclose(centers, np.linspace(q.min(), q.max(), 31)[:-1] + \
+        (q.max() - q.min()) / 60)
+
+# ------------------------------------------------------------------------------
+
+def test_azimuth_sectors_match_brute_force(dataset):
+    # Angles around L, measured from H towards K
+    h, k, l = voxelHKL()
+    azimuth = np.degrees(np.arctan2(k, h))
+    q = np.sqrt(h ** 2 + k ** 2 + l ** 2)
+
+    integrator = DatasetIntegrator(AXES, "Azimuth", 36, axis=2,
+        azimuth_range=(-180, 180), q_range=(1.2, 2))
+    centers, intensity, counts = integrator.integrate(dataset)
+
+    keep = (q >= 1.2) & (q <= 2)
+    sums, expected_counts = bruteForceIntegrate(azimuth, dataset, 36, (-180, 180), keep)
+
+    np.testing.assert_array_equal(counts, expected_counts)
+    filled = expected_counts > 0
+    np.testing.assert_allclose(intensity[filled], sums[filled] / expected_counts[filled])
+
+# ------------------------------------------------------------------------------
+
+def test_masked_and_non_finite_voxels_left_out(dataset):
+    integrator = DatasetIntegrator(AXES, "|Q|", 20, q_range=(1, 2.5))
+    mask = np.random.default_rng(1).uniform(size=dataset.shape) > 0.3
+    dataset = dataset.copy()
+    dataset[0, 0, :] = np.nan
+
+    centers, intensity, counts = integrator.integrate(dataset, mask)
+
+    h, k, l = voxelHKL()
+    q = np.sqrt(h ** 2 + k ** 2 + l ** 2)
+    keep = mask & np.isfinite(dataset)
+    sums, expected_counts = bruteForceIntegrate(q, np.nan_to_num(dataset), 20, (1, 2.5), keep)
+
+    np.testing.assert_array_equal(counts, expected_counts)
+    filled = expected_counts > 0
+    np.testing.assert_allclose(intensity[filled], sums[filled] / expected_counts[filled])
+
+# ------------------------------------------------------------------------------
+
+def test_bins_cached_per_grid_and_binning(dataset, monkeypatch):
+    calls = []
+    coordinates = DatasetIntegrator.coordinates
+    monkeypatch.setattr(DatasetIntegrator, "coordinates",
+        lambda self, name: calls.append(name) or coordinates(self, name))
+
+    first = DatasetIntegrator(AXES, "|Q|", 50)
+    result = first.integrate(dataset)
+    assert calls == ["|Q|"]
+
+    # Same grid and binning (another integrator, another dataset): no
+    # coordinates recomputed
+    second = DatasetIntegrator(AXES, "|Q|", 50)
+    assert second.voxelBins() is first.voxelBins()
+    second.integrate(dataset * 2)
+    np.testing.assert_allclose(second.integrate(dataset)[1], result[1])
+    assert calls == ["|Q|"]
+
+    # Other binnings are cached separately, up to MAX_CACHED_BINS
+    for n_bins in range(10, 10 + DatasetIntegrator.MAX_CACHED_BINS):
+        DatasetIntegrator(AXES, "|Q|", n_bins).integrate(dataset)
+    assert len(calls) == 1 + DatasetIntegrator.MAX_CACHED_BINS
+    assert len(DatasetIntegrator.bin_cache) == DatasetIntegrator.MAX_CACHED_BINS
+    assert first.key() not in DatasetIntegrator.bin_cache
+
+# ------------------------------------------------------------------------------
+
+def test_empty_range_raises(dataset):
+    # No voxel lies in the azimuth sector the shells are limited to
+    with pytest.raises(ValueError):
+        DatasetIntegrator(AXES, "|Q|", 10, azimuth_range=(190, 200)).integrate(dataset)
+
+# ==============================================================================
@@ -0,0 +1,136 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+import shutil
+import tifffile as tiff
+
+from source.image_logic import DetectorCorrection, ScanFrameReader
+
+# ==============================================================================
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "example_files")
+DETECTOR_PATH = os.path.join(EXAMPLE_DIR, "6IDB_DetectorGeometry.xml")
+DETECTOR_SHAPE = (487, 195)
+
+# ==============================================================================
+
+@pytest.fixture
+def detector_path(tmp_path):
+
+    """
+    Returns a copy of the example detector config with no correction files
+    beside it
+    """
+
+    path = str(tmp_path / "Detector.xml")
+    shutil.copy(DETECTOR_PATH, path)
+
+    return path
+
+# ------------------------------------------------------------------------------
+
+def test_mask_and_flat_field():
+    mask = np.zeros((4, 3), dtype=np.uint8)
+    mask[1, 2] = 1
+    flat_field = np.arange(1, 13, dtype=np.float64).reshape(4, 3)
+    # Unusable flat-field pixels are masked as well
+    flat_field[3, 0] = 0
+
+    correction = DetectorCorrection((4, 3), mask, flat_field)
+    frame = np.full((4, 3), 100, dtype=np.uint16)
+    corrected = correction.apply(frame)
+
+    good = np.ones((4, 3), dtype=bool)
+    good[1, 2] = good[3, 0] = False
+    expected = np.zeros((4, 3))
+    expected[good] = 100 * flat_field[good].mean() / flat_field[good]
+
+    assert corrected.dtype == np.float32
+    np.testing.assert_allclose(corrected, expected, rtol=1e-6)
+    # Integer frames aren't modified
+    assert np.all(frame == 100)
+
+# ------------------------------------------------------------------------------
+
+def test_apply_in_place_and_batched():
+    mask = np.zeros((4, 3), dtype=bool)
+    mask[0, 0] = True
+    correction = DetectorCorrection((4, 3), mask)
+
+    frames = np.ones((5, 4, 3), dtype=np.float32)
+    corrected = correction.apply(frames)
+    assert corrected is frames
+    assert np.all(frames[:, 0, 0] == 0) and frames.sum() == 5 * 11
+
+    # Read-only frames (e.g. memory-mapped) are copied
+    frame = np.ones((4, 3), dtype=np.uint16)
+    frame.flags.writeable = False
+    corrected = correction.apply(frame)
+    assert corrected is not frame and corrected[0, 0] == 0 and frame[0, 0] == 1
+
+    with pytest.raises(ValueError):
+        correction.apply(np.ones((3, 4)))
+
+# ------------------------------------------------------------------------------
+
+def test_no_correction_files(detector_path):
+    assert DetectorCorrection.fromConfig(detector_path) is None
+
+# ------------------------------------------------------------------------------
+
+def test_correction_files_beside_config(detector_path, tmp_path):
+    # Files are in the TIFF's layout, transposed from the detector's
+    mask = np.zeros(DETECTOR_SHAPE[::-1], dtype=np.uint8)
+    mask[10, 20] = 1
+    flat_field = np.full(DETECTOR_SHAPE[::-1], 2.0)
+    flat_field[0, :] = 4.0
+    tiff.imwrite(str(tmp_path / "Detector_mask.tif"), mask)
+    np.save(str(tmp_path / "Detector_flatfield.npy"), flat_field)
+
+    correction = DetectorCorrection.fromConfig(detector_path)
+    assert correction.shape == DETECTOR_SHAPE
+    assert correction.mask[20, 10] and np.count_nonzero(correction.mask) == 1
+    assert correction.gain[5, 0] < 1 < correction.gain[5, 1]
+
+    # Reused while the files are unchanged; reloaded once one changes
+    assert DetectorCorrection.fromConfig(detector_path) is correction
+    np.save(str(tmp_path / "Detector_flatfield.npy"), np.ones(DETECTOR_SHAPE[::-1]))
+    os.utime(str(tmp_path / "Detector_flatfield.npy"), (1, 1))
+    reloaded = DetectorCorrection.fromConfig(detector_path)
+    assert reloaded is not correction
+    np.testing.assert_allclose(reloaded.gain[~reloaded.mask], 1)
+
+# ------------------------------------------------------------------------------
+
+def test_mismatched_file_rejected(detector_path, tmp_path):
+    np.save(str(tmp_path / "Detector_mask.npy"), np.zeros((10, 10)))
+
+    with pytest.raises(ValueError):
+        DetectorCorrection.fromConfig(detector_path)
+
+# ------------------------------------------------------------------------------
+
+def test_frames_corrected_as_read(tmp_path):
+    scan_path = str(tmp_path / "S1")
+    os.makedirs(scan_path)
+    frame = np.full((3, 4), 10, dtype=np.uint16)
+    tiff.imwrite(os.path.join(scan_path, "scan_S1_00000.tif"), frame)
+
+    mask = np.zeros((4, 3), dtype=bool)
+    mask[2, 1] = True
+    reader = ScanFrameReader(scan_path, DetectorCorrection((4, 3), mask))
+
+    for corrected in [reader.readFrame("scan_S1_00000.tif"),
+        reader.readFrames(["scan_S1_00000.tif"])[0]]:
+        assert corrected.shape == (4, 3)
+        assert corrected[2, 1] == 0 and corrected.sum() == 10 * 11
+
+# ==============================================================================
@@ -0,0 +1,117 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+import tifffile as tiff
+
+from source.image_logic import FrameCache, FrameStack, ScanFrameReader
+
+# ==============================================================================
+
+N_FRAMES = 12
+FRAME_SHAPE = (4, 6)
+
+# ==============================================================================
+
+def imageName(i):
+    return f"scan_S1_{i:05d}.tif"
+
+# ------------------------------------------------------------------------------
+
+def writeFrame(scan_path, i, frame):
+
+    """
+    Writes a frame (in file layout) and returns its path
+    """
+
+    path = os.path.join(scan_path, imageName(i))
+    tiff.imwrite(path, frame)
+
+    return path
+
+# ==============================================================================
+
+@pytest.fixture
+def scan(tmp_path):
+
+    """
+    Returns a scan directory of random uint16 TIFFs and the frames as read
+    (transposed to match dimensions of RSM)
+    """
+
+    scan_path = str(tmp_path / "S1")
+    os.makedirs(scan_path)
+    frames = np.random.default_rng(0).integers(0, 1000,
+        (N_FRAMES,) + FRAME_SHAPE, dtype=np.uint16)
+    for i, frame in enumerate(frames):
+        writeFrame(scan_path, i, frame)
+
+    return scan_path, frames.transpose(0, 2, 1)
+
+# ------------------------------------------------------------------------------
+
+def test_packed_frames_match_tiffs(scan):
+    scan_path, frames = scan
+    names = [imageName(i) for i in range(N_FRAMES)]
+
+    stack = FrameStack(scan_path)
+    assert not stack.open()
+    stack.build(names)
+
+    assert stack.frames_done == N_FRAMES
+    assert stack.stack.shape == frames.shape
+    for i, name in enumerate(names):
+        mtime = os.stat(os.path.join(scan_path, name)).st_mtime
+        assert stack.contains(name, mtime)
+        np.testing.assert_array_equal(stack.frame(name), frames[i])
+
+    # Another reader maps the same stack
+    reopened = FrameStack(scan_path)
+    assert reopened.open()
+    np.testing.assert_array_equal(reopened.frame(names[7]), frames[7])
+
+# ------------------------------------------------------------------------------
+
+def test_changed_and_new_frames_read_from_tiffs(scan):
+    scan_path, frames = scan
+    FrameStack(scan_path).build([imageName(i) for i in range(N_FRAMES - 2)])
+
+    rewritten = np.full(FRAME_SHAPE, 7, dtype=np.uint16)
+    os.utime(writeFrame(scan_path, 3, rewritten), (1, 1))
+
+    reader = ScanFrameReader(scan_path)
+    stack = reader.frame_stack
+    assert not stack.contains(imageName(3))
+    assert not stack.contains(imageName(N_FRAMES - 1))
+    assert stack.contains(imageName(4))
+
+    expected = frames.copy()
+    expected[3] = rewritten.T
+    np.testing.assert_array_equal(reader.readFrame(imageName(3)), rewritten.T)
+    np.testing.assert_array_equal(reader.readFrame(imageName(5)), frames[5])
+
+    # Batches mix packed and decoded frames
+    names = [imageName(i) for i in range(N_FRAMES)]
+    np.testing.assert_array_equal(reader.readFrames(names), expected)
+    np.testing.assert_array_equal(reader.readFrames(names[4:8]), expected[4:8])
+
+# ------------------------------------------------------------------------------
+
+def test_frame_cache_reads_packed_frames(scan):
+    scan_path, frames = scan
+    FrameStack(scan_path).build([imageName(i) for i in range(N_FRAMES)])
+
+    frame_cache = FrameCache()
+    frame = frame_cache.getFrame(os.path.join(scan_path, imageName(2)))
+
+    np.testing.assert_array_equal(frame, frames[2])
+    # Served from the memory-mapped stack, so nothing is cached
+    assert frame_cache.n_bytes == 0
+
+# ==============================================================================
@@ -0,0 +1,179 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+
+from source.image_logic import DetectorCorrection, ScanFrameReader
+from source.rsm_logic import GridAccumulator, LiveGridder, ScanGeometry
+
+# ==============================================================================
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "example_files")
+SPEC_PATH = os.path.join(EXAMPLE_DIR, "pmn_pt011_2_1.spec")
+DETECTOR_PATH = os.path.join(EXAMPLE_DIR, "6IDB_DetectorGeometry.xml")
+INSTRUMENT_PATH = os.path.join(EXAMPLE_DIR, "6IDB_Instrument.xml")
+IMAGE_DIR = os.path.join(EXAMPLE_DIR, "images", "pmn_pt011_2_1", "S840")
+SCAN_NUMBER = 840
+
+# ==============================================================================
+
+def bruteForceGrid(hkl, intensity, bounds, shape, weight=1.0):
+
+    """
+    Returns (sum, count) grids, placing each pixel in its nearest voxel one
+    at a time
+    """
+
+    grid_sum, grid_count = np.zeros(shape), np.zeros(shape)
+    steps = [(axis_max - axis_min) / (n - 1) for (axis_min, axis_max), n in zip(bounds, shape)]
+
+    for pixel in range(len(intensity)):
+        voxel = tuple(int(np.rint((hkl[axis][pixel] - bounds[axis][0]) / steps[axis])) \
+            for axis in range(3))
+        if all(0 <= voxel[axis] < shape[axis] for axis in range(3)):
+            grid_sum[voxel] += intensity[pixel] * weight
+            grid_count[voxel] += 1
+
+    return grid_sum, grid_count
+
+# ------------------------------------------------------------------------------
+
+def linkImages(image_dir, count):
+
+    """
+    Links the first `count` images of scan 840 into `image_dir`, as if the
+    scan were still being collected
+    """
+
+    for name in sorted(os.listdir(IMAGE_DIR))[:count]:
+        link = os.path.join(image_dir, name)
+        if not os.path.exists(link):
+            os.symlink(os.path.join(IMAGE_DIR, name), link)
+
+# ==============================================================================
+
+@pytest.fixture(scope="module")
+def geometry():
+    return ScanGeometry(SPEC_PATH, SCAN_NUMBER, DETECTOR_PATH, INSTRUMENT_PATH)
+
+# ------------------------------------------------------------------------------
+
+def test_deposit_matches_brute_force():
+    rng = np.random.default_rng(0)
+    bounds = np.array([[0, 1], [-1, 1], [2, 3]], dtype=np.float64)
+    shape = (6, 9, 5)
+    # Some pixels fall outside the grid and are dropped
+    hkl = [rng.uniform(axis_min - 0.1, axis_max + 0.1, 5000) for axis_min, axis_max in bounds]
+    intensity = rng.uniform(0, 100, 5000)
+
+    accumulator = GridAccumulator(bounds, shape, keep_raw=True)
+    accumulator.deposit(hkl, intensity, 0.5)
+    accumulator.deposit(hkl, intensity, 2.0)
+
+    expected_sum, expected_count = bruteForceGrid(hkl, intensity, bounds, shape, 2.5)
+    raw_sum, _ = bruteForceGrid(hkl, intensity, bounds, shape)
+    np.testing.assert_allclose(accumulator.sum, expected_sum)
+    np.testing.assert_array_equal(accumulator.count, 2 * expected_count)
+    np.testing.assert_allclose(accumulator.raw_sum, 2 * raw_sum)
+
+    # Weighted average per voxel; raw average ignores weights; empty voxels are 0
+    filled = expected_count > 0
+    dataset = accumulator.dataset()
+    np.testing.assert_allclose(dataset[filled], expected_sum[filled] / (2 * expected_count[filled]))
+    np.testing.assert_allclose(accumulator.dataset(raw=True)[filled],
+        raw_sum[filled] / expected_count[filled])
+    assert np.all(dataset[~filled] == 0)
+
+# ------------------------------------------------------------------------------
+
+def test_nearest_voxel_rule():
+    accumulator = GridAccumulator([[0, 1]] * 3, (3, 3, 3))
+
+    # Voxel centres are 0, 0.5 and 1 along each axis
+    accumulator.deposit([np.array([0.24, 0.26, 1.24, 1.26])] * 3, np.array([1, 2, 4, 8]))
+
+    assert accumulator.sum[0, 0, 0] == 1
+    assert accumulator.sum[1, 1, 1] == 2
+    assert accumulator.sum[2, 2, 2] == 4
+    assert accumulator.count.sum() == 3
+
+# ------------------------------------------------------------------------------
+
+def test_grow_keeps_sums_in_place():
+    rng = np.random.default_rng(1)
+    bounds = np.array([[0, 1], [0, 1], [0, 1]], dtype=np.float64)
+    hkl = [rng.uniform(0, 1, 1000) for axis in range(3)]
+    intensity = rng.uniform(0, 100, 1000)
+
+    accumulator = GridAccumulator(bounds, (11, 11, 11))
+    accumulator.deposit(hkl, intensity)
+    before = accumulator.dataset()
+
+    accumulator.grow(np.array([[-0.5, 1], [0, 1.5], [0, 1]]), margin=0)
+
+    assert accumulator.shape == (16, 16, 11)
+    np.testing.assert_allclose(accumulator.step, 0.1)
+    np.testing.assert_allclose(accumulator.bounds(), [[-0.5, 1], [0, 1.5], [0, 1]])
+    np.testing.assert_array_equal(accumulator.dataset()[5:, :11, :], before)
+    assert accumulator.count[:5].sum() == 0 and accumulator.count[:, 11:].sum() == 0
+
+    # New pixels land on the same voxels as before growing
+    accumulator.deposit(hkl, intensity)
+    np.testing.assert_allclose(accumulator.dataset()[5:, :11, :], before)
+
+# ------------------------------------------------------------------------------
+
+def test_live_gridder_deposits_each_frame_once(geometry, tmp_path):
+    image_dir = str(tmp_path)
+    linkImages(image_dir, 3)
+
+    gridder = LiveGridder(image_dir, geometry, (20, 20, 20))
+    assert gridder.update() == 3
+    assert gridder.update() == 0
+
+    # Frames arriving later are added to the same accumulators
+    linkImages(image_dir, 5)
+    count, snapshot = gridder.poll(max_frames=1, snapshot=True)
+    assert count == 4 and snapshot is not None
+    count, snapshot = gridder.submit(snapshot=True).result()
+    assert count == 5 and snapshot is not None
+    assert gridder.poll(snapshot=True) == (5, None)
+    gridder.shutdown()
+
+    # Same sums as depositing the five frames straight into that grid
+    accumulator = gridder.accumulator
+    expected = GridAccumulator(accumulator.bounds(), accumulator.shape)
+    frame_reader = ScanFrameReader(image_dir, DetectorCorrection.fromConfig(DETECTOR_PATH))
+    for point, name in enumerate(sorted(os.listdir(IMAGE_DIR))[:5]):
+        expected.deposit(geometry.mapFrame(point), frame_reader.readFrame(name),
+            geometry.weights[point])
+
+    np.testing.assert_allclose(accumulator.sum, expected.sum)
+    np.testing.assert_array_equal(accumulator.count, expected.count)
+    np.testing.assert_allclose(snapshot[0], expected.dataset())
+    assert accumulator.count.sum() > 0
+
+# ------------------------------------------------------------------------------
+
+def test_live_gridder_covers_planned_range(geometry, tmp_path):
+    image_dir = str(tmp_path)
+    linkImages(image_dir, 1)
+
+    gridder = LiveGridder(image_dir, geometry, (20, 20, 20))
+    gridder.update()
+    gridder.shutdown()
+
+    # Sized from the scan command, so later frames need no regrowth
+    last_hkl = np.array(geometry.mapFrame(geometry.pointCount() - 1))
+    frame_bounds = np.stack((last_hkl.reshape(3, -1).min(axis=1),
+        last_hkl.reshape(3, -1).max(axis=1)), axis=1)
+    assert gridder.accumulator.contains(frame_bounds)
+
+# ==============================================================================
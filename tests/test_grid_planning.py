@@ -0,0 +1,111 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+
+from source.rsm_logic import GridPlanningLogic, ScanGeometry
+
+# ==============================================================================
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "example_files")
+SPEC_PATH = os.path.join(EXAMPLE_DIR, "pmn_pt011_2_1.spec")
+DETECTOR_PATH = os.path.join(EXAMPLE_DIR, "6IDB_DetectorGeometry.xml")
+INSTRUMENT_PATH = os.path.join(EXAMPLE_DIR, "6IDB_Instrument.xml")
+SCAN_NUMBER = 840
+
+# Voxel steps for scan 840, the grid shape they give and the shape
+# recommended for it (capped at a quarter of its samples)
+STEPS = [0.00106374, 0.00099341, 0.00041623]
+STEP_SHAPE = (319, 199, 301)
+SHAPE = (254, 159, 239)
+
+# ==============================================================================
+
+@pytest.fixture(scope="module")
+def geometry():
+    return ScanGeometry(SPEC_PATH, SCAN_NUMBER, DETECTOR_PATH, INSTRUMENT_PATH)
+
+# ------------------------------------------------------------------------------
+
+@pytest.fixture(scope="module")
+def sampling(geometry):
+    return GridPlanningLogic.estimateSampling(geometry)
+
+# ------------------------------------------------------------------------------
+
+def test_sample_count(geometry):
+    assert GridPlanningLogic.sampleCount(geometry) == 401 * 487 * 195
+
+# ------------------------------------------------------------------------------
+
+def test_steps_match_sample_volume(geometry, sampling):
+    bounds, steps = sampling
+
+    np.testing.assert_allclose(steps, STEPS, rtol=1e-4)
+
+    # A voxel holds SAMPLES_PER_VOXEL volume elements of the sample lattice
+    # (pixel rows, pixel columns and consecutive scan points) at its widest
+    volumes = []
+    for point in [0, 200]:
+        hkl = np.array(geometry.mapFrame(point))
+        next_hkl = np.array(geometry.mapFrame(point + 1))
+        vectors = [np.median(step.reshape(3, -1), axis=1) for step in \
+            [np.diff(hkl, axis=1), np.diff(hkl, axis=2), next_hkl - hkl]]
+        volumes.append(abs(np.linalg.det(vectors)))
+
+    np.testing.assert_allclose(np.prod(steps),
+        GridPlanningLogic.SAMPLES_PER_VOXEL * max(volumes), rtol=0.05)
+
+# ------------------------------------------------------------------------------
+
+def test_recommended_shape(geometry, sampling):
+    bounds, steps = sampling
+    n_samples = GridPlanningLogic.sampleCount(geometry)
+
+    shape = GridPlanningLogic.recommendGridSize(bounds, steps, 1000, n_samples // 4)
+
+    assert GridPlanningLogic.recommendGridSize(bounds, steps) == STEP_SHAPE
+    assert shape == SHAPE
+    assert np.prod(shape) == pytest.approx(n_samples / 4, rel=0.02)
+
+# ------------------------------------------------------------------------------
+
+def test_max_voxels_cap(sampling):
+    bounds, steps = sampling
+
+    shape = GridPlanningLogic.recommendGridSize(bounds, steps, 1000, 10 ** 6)
+
+    assert shape == (120, 76, 114)
+    assert np.prod(shape) == pytest.approx(10 ** 6, rel=0.05)
+    # Scaled down evenly, so the aspect ratio is kept
+    np.testing.assert_allclose(np.array(shape) / np.array(STEP_SHAPE), 0.38, atol=0.01)
+    # A cap above the uncapped size changes nothing
+    assert GridPlanningLogic.recommendGridSize(bounds, steps, 1000, 10 ** 8) == STEP_SHAPE
+
+# ------------------------------------------------------------------------------
+
+def test_max_count_clips_each_axis(sampling):
+    bounds, steps = sampling
+
+    assert GridPlanningLogic.recommendGridSize(bounds, steps, 200) == (200, 199, 200)
+
+# ------------------------------------------------------------------------------
+
+def test_empty_fraction_of_swept_region(geometry, sampling):
+    bounds, steps = sampling
+
+    # Recommended voxels each receive samples across the swept region...
+    assert GridPlanningLogic.estimateEmptyFraction(geometry, bounds, SHAPE) < 0.001
+
+    # ...while voxels about half as wide leave gaps between them
+    empty = GridPlanningLogic.estimateEmptyFraction(geometry, bounds, (487, 304, 460))
+    assert empty == pytest.approx(0.176, abs=0.005)
+
+# ==============================================================================
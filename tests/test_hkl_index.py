@@ -0,0 +1,143 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+
+from source.rsm_logic import HKLIndex, ScanGeometry
+
+# ==============================================================================
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "example_files")
+SPEC_PATH = os.path.join(EXAMPLE_DIR, "pmn_pt011_2_1.spec")
+DETECTOR_PATH = os.path.join(EXAMPLE_DIR, "6IDB_DetectorGeometry.xml")
+INSTRUMENT_PATH = os.path.join(EXAMPLE_DIR, "6IDB_Instrument.xml")
+SCAN_NUMBER = 840
+
+# Every 20th point of the scan keeps the index small
+POINT_STEP = 20
+
+# ==============================================================================
+
+@pytest.fixture(scope="module")
+def geometry():
+    geometry = ScanGeometry(SPEC_PATH, SCAN_NUMBER, DETECTOR_PATH, INSTRUMENT_PATH)
+    geometry.angles = geometry.angles[::POINT_STEP]
+    geometry.weights = geometry.weights[::POINT_STEP]
+    return geometry
+
+# ------------------------------------------------------------------------------
+
+@pytest.fixture(scope="module")
+def index(geometry):
+    return HKLIndex.build(geometry)
+
+# ------------------------------------------------------------------------------
+
+@pytest.fixture(scope="module")
+def samples(geometry):
+
+    """
+    Returns (n_samples, 3) HKL of every sample, in id order
+    """
+
+    hkl = np.array([geometry.mapFrame(point) for point in range(geometry.pointCount())])
+    return np.moveaxis(hkl, 1, 0).reshape(3, -1).T
+
+# ------------------------------------------------------------------------------
+
+def test_every_sample_indexed_once(index, samples):
+    np.testing.assert_array_equal(np.sort(index.ids), np.arange(len(samples)))
+    assert index.offsets[-1] == len(samples)
+
+# ------------------------------------------------------------------------------
+
+def test_sample_hkl_and_pixels(index, samples, geometry):
+    ids = np.random.default_rng(0).integers(0, len(samples), 1000)
+
+    np.testing.assert_allclose(index.sampleHKL(ids), samples[ids], rtol=0, atol=1e-12)
+
+    frames, pixels_1, pixels_2 = index.samplePixels(ids)
+    for i in range(10):
+        hkl = geometry.mapFrame(frames[i])
+        np.testing.assert_allclose([hkl[axis][pixels_1[i], pixels_2[i]] for axis in range(3)],
+            samples[ids[i]])
+
+# ------------------------------------------------------------------------------
+
+@pytest.mark.parametrize("center, half_width", [
+    ((0, 2, 2), (0.01, 0.01, 0.005)),
+    ((0.1, 2.05, 1.98), (0.05, 0.02, 0.01)),
+    # Box reaching past the scan's bounds
+    ((-0.2, 2, 2), (0.1, 0.1, 0.1)),
+])
+def test_query_box_matches_brute_force(index, samples, center, half_width):
+    hkl_min = np.array(center) - half_width
+    hkl_max = np.array(center) + half_width
+
+    expected = np.flatnonzero(np.all((samples >= hkl_min) & (samples <= hkl_max), axis=1))
+    ids = index.queryBox(hkl_min, hkl_max)
+
+    assert len(expected) > 0
+    np.testing.assert_array_equal(np.sort(ids), expected)
+
+# ------------------------------------------------------------------------------
+
+def test_query_box_outside_scan(index):
+    assert len(index.queryBox([5, 5, 5], [6, 6, 6])) == 0
+
+# ------------------------------------------------------------------------------
+
+@pytest.mark.parametrize("count", [1, 5])
+def test_query_nearest_matches_brute_force(index, samples, count):
+    rng = np.random.default_rng(1)
+    points = [rng.uniform(index.bounds[:, 0], index.bounds[:, 1]) for i in range(5)]
+    # Also a point well outside the scanned region
+    points.append(index.bounds[:, 1] + 0.05)
+
+    for hkl in points:
+        distances = np.linalg.norm(samples - hkl, axis=1)
+        expected = np.sort(distances)[:count]
+
+        ids, found = index.queryNearest(hkl, count)
+
+        np.testing.assert_allclose(found, expected, rtol=0, atol=1e-12)
+        np.testing.assert_allclose(distances[ids], found, rtol=0, atol=1e-12)
+
+# ------------------------------------------------------------------------------
+
+def test_frame_pixels_groups_by_frame(index, samples):
+    ids = index.queryBox([-0.05, 1.95, 1.95], [0.05, 2.05, 2.05])
+    frame_pixels = index.framePixels(ids)
+
+    assert sum(len(pixels) for pixels in frame_pixels.values()) == len(ids)
+    for frame, pixels in frame_pixels.items():
+        np.testing.assert_array_equal(pixels,
+            np.sort(ids[ids // index.n_pixels == frame] % index.n_pixels))
+
+# ------------------------------------------------------------------------------
+
+def test_save_and_load(index, geometry, tmp_path):
+    path = str(tmp_path / "index.npz")
+    assert index.save(path)
+
+    loaded = HKLIndex.load(path, geometry)
+    np.testing.assert_array_equal(loaded.offsets, index.offsets)
+    np.testing.assert_array_equal(loaded.ids, index.ids)
+    assert loaded.shape == index.shape
+
+    # An index built from other angles isn't reused
+    angles = geometry.angles
+    geometry.angles = angles + 0.1
+    try:
+        assert HKLIndex.load(path, geometry) is None
+    finally:
+        geometry.angles = angles
+
+# ==============================================================================
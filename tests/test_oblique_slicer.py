@@ -0,0 +1,123 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import itertools
+import numpy as np
+import pytest
+import threading
+from scipy import ndimage
+
+from source.analysis_logic import ObliqueSlicer
+
+# ==============================================================================
+
+AXES = [np.linspace(-1, 1, 41), np.linspace(-0.5, 1.5, 21), np.linspace(1, 3, 31)]
+# Plane perpendicular to [110] through (0, 0, 2)
+ORIGIN = (0, 0, 2)
+U = (1, -1, 0)
+V = (0, 0, 1)
+
+# ==============================================================================
+
+def directSlice(dataset, origin, u, v, shape, extent):
+
+    """
+    Returns the plane sampled with one map_coordinates call on fractional
+    voxel indices of every point
+    """
+
+    s, t = np.meshgrid(np.linspace(*extent[0], shape[0]), np.linspace(*extent[1], shape[1]),
+        indexing="ij")
+    hkl = [origin[i] + u[i] * s + v[i] * t for i in range(3)]
+    indices = [(hkl[i] - AXES[i][0]) / (AXES[i][1] - AXES[i][0]) for i in range(3)]
+
+    return ndimage.map_coordinates(dataset, indices, order=1, mode="constant", cval=0)
+
+# ==============================================================================
+
+@pytest.fixture
+def dataset():
+    return np.random.default_rng(0).uniform(0, 100, tuple(len(values) for values in AXES))
+
+# ------------------------------------------------------------------------------
+
+@pytest.fixture
+def slicer():
+    slicer = ObliqueSlicer()
+    yield slicer
+    slicer.shutdown()
+
+# ------------------------------------------------------------------------------
+
+def test_slice_matches_map_coordinates(dataset, slicer, monkeypatch):
+    # Several row chunks, with a short last chunk
+    monkeypatch.setattr(ObliqueSlicer, "CHUNK_ROWS", 16)
+    shape = (70, 50)
+
+    image, extent = slicer.slice(dataset, AXES, ORIGIN, U, V, shape)
+
+    assert image.shape == shape
+    np.testing.assert_allclose(image, directSlice(dataset, ORIGIN, U, V, shape, extent))
+    # Points off the grid are 0
+    assert image[0, 0] == 0 and np.count_nonzero(image) < image.size
+
+    extent = ((-0.3, 0.4), (-0.5, 0.8))
+    image, sliced_extent = slicer.slice(dataset, AXES, (0.2, 0.5, 2), (1, 1, 0),
+        (0.5, 0, 1), shape, extent)
+    assert sliced_extent == extent
+    np.testing.assert_allclose(image,
+        directSlice(dataset, (0.2, 0.5, 2), (1, 1, 0), (0.5, 0, 1), shape, extent))
+
+# ------------------------------------------------------------------------------
+
+def test_linear_dataset_reproduced_inside_grid(slicer):
+    # Trilinear interpolation is exact for a linear function of HKL
+    h, k, l = np.meshgrid(*AXES, indexing="ij")
+    dataset = 3 * h - 2 * k + l + 10
+
+    extent = ((-0.4, 0.4), (-0.8, 0.8))
+    image, extent = slicer.slice(dataset, AXES, ORIGIN, U, V, (9, 17), extent)
+
+    s, t = np.meshgrid(np.linspace(*extent[0], 9), np.linspace(*extent[1], 17), indexing="ij")
+    h, k, l = s, -s, 2 + t
+    np.testing.assert_allclose(image, 3 * h - 2 * k + l + 10)
+
+# ------------------------------------------------------------------------------
+
+def test_plane_extent_covers_grid_corners():
+    extent = ObliqueSlicer.planeExtent(AXES, np.array(ORIGIN), np.array(U), np.array(V))
+
+    corners = np.array(list(itertools.product(*[(values[0], values[-1]) for values in AXES])))
+    st = np.linalg.pinv(np.stack((U, V), axis=1)) @ (corners - ORIGIN).T
+    for (low, high), values in zip(extent, st):
+        assert low == pytest.approx(values.min()) and high == pytest.approx(values.max())
+
+    # s spans h - k over the grid: (-1 - 1.5, 1 + 0.5) / 2; t spans l - 2
+    np.testing.assert_allclose(extent, ((-1.25, 0.75), (-1, 1)))
+
+# ------------------------------------------------------------------------------
+
+def test_parallel_vectors_rejected(dataset, slicer):
+    with pytest.raises(ValueError):
+        slicer.slice(dataset, AXES, ORIGIN, U, (2, -2, 0))
+
+# ------------------------------------------------------------------------------
+
+def test_newer_requests_supersede_older(dataset, slicer):
+    assert slicer.slice(dataset, AXES, ORIGIN, U, V, generation=slicer.generation - 1) is None
+
+    # Requests queue behind a busy worker; only the latest one runs
+    busy = threading.Event()
+    slicer.driver.submit(busy.wait)
+    futures = [slicer.submit(dataset, AXES, ORIGIN, U, V, (40, 30)) for i in range(3)]
+    busy.set()
+
+    image, extent = futures[-1].result()
+    np.testing.assert_allclose(image, directSlice(dataset, ORIGIN, U, V, (40, 30), extent))
+    assert all(future.cancelled() for future in futures[:-1])
+
+# ==============================================================================
@@ -0,0 +1,81 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+from scipy import ndimage
+
+from source.analysis_logic import PeakFinder
+
+# ==============================================================================
+
+AXES = [np.linspace(-1, 1, 41), np.linspace(1, 3, 41), np.linspace(0, 2, 41)]
+
+# ==============================================================================
+
+def gaussian(center, amplitude, sigma):
+    h, k, l = np.meshgrid(*AXES, indexing="ij")
+    r2 = (h - center[0]) ** 2 + (k - center[1]) ** 2 + (l - center[2]) ** 2
+    return amplitude * np.exp(-r2 / (2 * sigma ** 2))
+
+# ------------------------------------------------------------------------------
+
+def test_isolated_peaks_get_region_totals():
+    dataset = gaussian((-0.5, 1.5, 0.5), 100, 0.05) + gaussian((0.5, 2.5, 1.5), 50, 0.05)
+    threshold = 1
+
+    indices, table = PeakFinder.findPeaks(dataset, AXES, threshold)
+
+    assert len(indices) == 2
+    np.testing.assert_allclose(table[:, :3], [[-0.5, 1.5, 0.5], [0.5, 2.5, 1.5]])
+    np.testing.assert_allclose(table[:, 3], [100, 50])
+    # Each peak is its own region
+    labels, n_regions = ndimage.label(dataset > threshold, structure=np.ones((3, 3, 3)))
+    assert n_regions == 2
+    for index, row in zip(indices, table):
+        region = labels == labels[tuple(index)]
+        np.testing.assert_allclose(row[4], dataset[region].sum())
+        assert row[5] == np.count_nonzero(region)
+
+# ------------------------------------------------------------------------------
+
+def test_peaks_in_one_region_split_its_intensity():
+    first = gaussian((-0.15, 2.0, 1.0), 100, 0.1)
+    second = gaussian((0.15, 2.0, 1.0), 60, 0.1)
+    dataset = first + second
+    threshold = 1
+
+    above = dataset > threshold
+    labels, n_regions = ndimage.label(above, structure=np.ones((3, 3, 3)))
+    assert n_regions == 1
+
+    indices, table = PeakFinder.findPeaks(dataset, AXES, threshold)
+
+    assert len(indices) == 2
+    np.testing.assert_allclose(table[:, 0], [-0.15, 0.15], atol=0.03)
+    # Parts add up to the region, without double counting
+    np.testing.assert_allclose(table[:, 4].sum(), dataset[above].sum())
+    assert table[:, 5].sum() == np.count_nonzero(above)
+    # Each part holds roughly its own Gaussian (they overlap a little)
+    np.testing.assert_allclose(table[:, 4], [first[above].sum(), second[above].sum()],
+        rtol=0.05)
+    # Split along H: each part is about half the region's H extent
+    assert np.all(table[:, 6] < (AXES[0][1] - AXES[0][0]) * \
+        np.ptp(np.nonzero(above)[0]))
+
+# ------------------------------------------------------------------------------
+
+def test_flat_top_counts_as_one_peak():
+    dataset = np.zeros((41, 41, 41))
+    dataset[10:13, 20, 20] = 5
+
+    indices, table = PeakFinder.findPeaks(dataset, AXES, 1)
+
+    assert len(indices) == 1
+    assert table[0, 4] == 15
+    assert table[0, 5] == 3
+
+# ==============================================================================
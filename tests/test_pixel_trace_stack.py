@@ -0,0 +1,104 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+import tifffile as tiff
+
+from source.image_logic import FrameCache, PixelTraceStack, TiffDirectorySource
+
+# ==============================================================================
+
+N_FRAMES = 10
+FRAME_SHAPE = (4, 6)
+
+# ==============================================================================
+
+def writeScan(scan_path, n_frames=N_FRAMES, seed=0):
+
+    """
+    Writes a scan directory of random uint16 TIFFs. Returns the frames as
+    read (transposed to match dimensions of RSM), (n_frames, n_x, n_y).
+    """
+
+    os.makedirs(scan_path, exist_ok=True)
+    frames = np.random.default_rng(seed).integers(0, 1000,
+        (n_frames,) + FRAME_SHAPE, dtype=np.uint16)
+
+    for i, frame in enumerate(frames):
+        tiff.imwrite(os.path.join(scan_path, f"scan_S1_{i:05d}.tif"), frame)
+
+    return frames.transpose(0, 2, 1)
+
+# ==============================================================================
+
+@pytest.fixture
+def scan(tmp_path, monkeypatch):
+    # Several small blocks, so frames are packed across block boundaries
+    monkeypatch.setattr(PixelTraceStack, "BLOCK_FRAMES", 3)
+
+    scan_path = str(tmp_path / "S1")
+    return scan_path, writeScan(scan_path)
+
+# ------------------------------------------------------------------------------
+
+def test_traces_match_frames(scan):
+    scan_path, frames = scan
+    stack = PixelTraceStack(TiffDirectorySource(scan_path, FrameCache()))
+    stack.build()
+
+    assert stack.isReady()
+    assert stack.stack.shape == frames.shape[1:] + (N_FRAMES,)
+    for x, y in [(0, 0), (2, 1), (5, 3)]:
+        np.testing.assert_array_equal(stack.trace(x, y), frames[:, x, y])
+    # Fractional positions fall in the pixel they're inside
+    np.testing.assert_array_equal(stack.trace(2.7, 1.2), frames[:, 2, 1])
+
+# ------------------------------------------------------------------------------
+
+def test_roi_traces_sum_square_clipped_at_edges(scan):
+    scan_path, frames = scan
+    stack = PixelTraceStack(TiffDirectorySource(scan_path, FrameCache()))
+    stack.build()
+
+    np.testing.assert_array_equal(stack.trace(2, 1, radius=1),
+        frames[:, 1:4, 0:3].sum(axis=(1, 2)))
+    np.testing.assert_array_equal(stack.trace(0, 0, radius=1),
+        frames[:, 0:2, 0:2].sum(axis=(1, 2)))
+    assert stack.trace(-1, 0) is None
+    assert stack.trace(6, 0) is None
+
+# ------------------------------------------------------------------------------
+
+def test_stack_reused_until_frames_change(scan):
+    scan_path, frames = scan
+    stack = PixelTraceStack(TiffDirectorySource(scan_path, FrameCache()))
+    stack.build()
+
+    reopened = PixelTraceStack(TiffDirectorySource(scan_path, FrameCache()))
+    assert reopened.open()
+    np.testing.assert_array_equal(reopened.trace(3, 2), frames[:, 3, 2])
+
+    # A rewritten frame invalidates the manifest
+    path = os.path.join(scan_path, "scan_S1_00004.tif")
+    tiff.imwrite(path, np.zeros(FRAME_SHAPE, dtype=np.uint16))
+    os.utime(path, (1, 1))
+    assert not PixelTraceStack(TiffDirectorySource(scan_path, FrameCache())).open()
+
+# ------------------------------------------------------------------------------
+
+def test_background_build(scan):
+    scan_path, frames = scan
+    stack = PixelTraceStack(TiffDirectorySource(scan_path, FrameCache()))
+    stack.start()
+    stack.thread.join()
+
+    assert stack.frames_done == N_FRAMES
+    np.testing.assert_array_equal(stack.trace(1, 1), frames[:, 1, 1])
+
+# ==============================================================================
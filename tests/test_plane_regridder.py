@@ -0,0 +1,127 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+
+from source.rsm_logic import PlaneRegridder, ScanGeometry
+
+# ==============================================================================
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "example_files")
+SPEC_PATH = os.path.join(EXAMPLE_DIR, "pmn_pt011_2_1.spec")
+DETECTOR_PATH = os.path.join(EXAMPLE_DIR, "6IDB_DetectorGeometry.xml")
+INSTRUMENT_PATH = os.path.join(EXAMPLE_DIR, "6IDB_Instrument.xml")
+SCAN_NUMBER = 840
+
+# Every 20th point of the scan keeps bounds quick to compute
+POINT_STEP = 20
+SHAPE = (60, 40)
+
+# ==============================================================================
+
+def bruteForceRegrid(geometry, point, image, axes, bounds):
+
+    """
+    Returns the mean of image pixels per plane bin, histogrammed from the
+    frame's HKL
+    """
+
+    hkl = geometry.mapFrame(point)
+    coords = [np.ravel(hkl[axis]) for axis in axes]
+    ranges = [bounds[axis] for axis in axes]
+    sums, edges_1, edges_2 = np.histogram2d(*coords, SHAPE, ranges, weights=np.ravel(image))
+    counts, edges_1, edges_2 = np.histogram2d(*coords, SHAPE, ranges)
+
+    return np.where(counts > 0, sums / np.maximum(counts, 1), 0), counts
+
+# ==============================================================================
+
+@pytest.fixture(scope="module")
+def geometry():
+    geometry = ScanGeometry(SPEC_PATH, SCAN_NUMBER, DETECTOR_PATH, INSTRUMENT_PATH)
+    geometry.angles = geometry.angles[::POINT_STEP]
+    geometry.weights = geometry.weights[::POINT_STEP]
+    return geometry
+
+# ------------------------------------------------------------------------------
+
+@pytest.fixture(scope="module")
+def bounds(geometry):
+    return PlaneRegridder.scanBounds(geometry)
+
+# ------------------------------------------------------------------------------
+
+@pytest.fixture
+def image(geometry):
+    return np.random.default_rng(0).uniform(0, 100, geometry.mapFrame(0)[0].shape)
+
+# ------------------------------------------------------------------------------
+
+@pytest.mark.parametrize("axes", [(0, 2), (1, 2), (0, 1)])
+def test_regrid_matches_histogram(geometry, bounds, image, axes):
+    regridder = PlaneRegridder(geometry, axes, SHAPE, bounds)
+
+    for point in [0, geometry.pointCount() // 2, geometry.pointCount() - 1]:
+        expected, counts = bruteForceRegrid(geometry, point, image, axes, bounds)
+        pixels, bins, bin_counts = regridder.frameBins(point)
+
+        # Every pixel lies on the plane, which covers the whole scan
+        assert len(pixels) == image.size
+        np.testing.assert_array_equal(bin_counts.reshape(SHAPE), counts)
+        np.testing.assert_allclose(regridder.regrid(point, image), expected)
+
+    assert regridder.axisNames() == [PlaneRegridder.AXIS_NAMES[axis] for axis in axes]
+
+# ------------------------------------------------------------------------------
+
+def test_pixels_off_plane_left_out(geometry, bounds, image):
+    # A plane covering the middle of the scan only
+    center = np.mean(bounds, axis=1)
+    half_width = np.ptp(bounds, axis=1) / 4
+    bounds = np.stack((center - half_width, center + half_width), axis=1)
+    regridder = PlaneRegridder(geometry, (0, 2), SHAPE, bounds)
+    point = geometry.pointCount() // 2
+
+    expected, counts = bruteForceRegrid(geometry, point, image, (0, 2), bounds)
+    pixels, bins, bin_counts = regridder.frameBins(point)
+
+    assert 0 < len(pixels) < image.size and len(pixels) == counts.sum()
+    np.testing.assert_allclose(regridder.regrid(point, image), expected)
+    assert regridder.rect() == pytest.approx((bounds[0][0], bounds[2][0],
+        bounds[0][1] - bounds[0][0], bounds[2][1] - bounds[2][0]))
+
+# ------------------------------------------------------------------------------
+
+def test_frame_bins_cached_least_recently_used(geometry, bounds, monkeypatch):
+    regridder = PlaneRegridder(geometry, (0, 2), SHAPE, bounds)
+    entry = regridder.frameBins(0)
+    entry_bytes = sum(array.nbytes for array in entry)
+    assert regridder.frameBins(0) is entry and regridder.n_bytes == entry_bytes
+
+    # Room for two frames' bins
+    monkeypatch.setattr(PlaneRegridder, "MAX_CACHED_BYTES", int(2.5 * entry_bytes))
+
+    regridder.frameBins(1)
+    regridder.frameBins(0)
+    regridder.frameBins(2)
+    assert list(regridder.frame_bins) == [0, 2]
+    assert regridder.n_bytes == 2 * entry_bytes
+
+    for point in range(3, 8):
+        regridder.frameBins(point)
+    assert list(regridder.frame_bins) == [6, 7]
+    assert regridder.n_bytes <= PlaneRegridder.MAX_CACHED_BYTES
+
+    # A single frame larger than the bound is still kept
+    monkeypatch.setattr(PlaneRegridder, "MAX_CACHED_BYTES", entry_bytes // 2)
+    regridder.frameBins(8)
+    assert list(regridder.frame_bins) == [8]
+
+# ==============================================================================
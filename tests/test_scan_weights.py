@@ -0,0 +1,88 @@
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+
+# ==============================================================================
+
+import numpy as np
+import os
+import pytest
+
+from source.rsm_logic import GridMergeLogic, ScanGeometry
+
+# ==============================================================================
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "example_files")
+SPEC_PATH = os.path.join(EXAMPLE_DIR, "pmn_pt011_2_1.spec")
+DETECTOR_PATH = os.path.join(EXAMPLE_DIR, "6IDB_DetectorGeometry.xml")
+INSTRUMENT_PATH = os.path.join(EXAMPLE_DIR, "6IDB_Instrument.xml")
+IMAGE_DIR = os.path.join(EXAMPLE_DIR, "images", "pmn_pt011_2_1", "S840")
+SCAN_NUMBER = 840
+
+# ==============================================================================
+
+@pytest.fixture
+def geometry():
+    return ScanGeometry(SPEC_PATH, SCAN_NUMBER, DETECTOR_PATH, INSTRUMENT_PATH)
+
+# ------------------------------------------------------------------------------
+
+def test_weights_match_rsmap3d_correction(geometry):
+    monitor = np.array(geometry.scan.data[geometry.monitor_name], dtype=np.float64)
+    filters = np.array(geometry.scan.data[geometry.filter_name], dtype=np.float64)
+
+    expected = geometry.monitor_scale_factor / monitor * \
+        geometry.filter_scale_factor / filters
+
+    assert geometry.weights.shape == (geometry.pointCount(),)
+    np.testing.assert_allclose(geometry.weights, expected)
+
+# ------------------------------------------------------------------------------
+
+def test_zero_readings_give_nan(geometry):
+    geometry.scan.data[geometry.monitor_name] = list(geometry.scan.data[geometry.monitor_name])
+    geometry.scan.data[geometry.filter_name] = list(geometry.scan.data[geometry.filter_name])
+    geometry.scan.data[geometry.monitor_name][3] = 0
+    geometry.scan.data[geometry.filter_name][5] = 0
+
+    weights = geometry.readWeights()
+
+    assert np.isnan(weights[3]) and np.isnan(weights[5])
+    assert np.count_nonzero(np.isfinite(weights)) == geometry.pointCount() - 2
+
+# ------------------------------------------------------------------------------
+
+def test_unconfigured_columns_give_unit_weights(geometry):
+    geometry.monitor_name = None
+    geometry.filter_name = None
+
+    np.testing.assert_array_equal(geometry.readWeights(), np.ones(geometry.pointCount()))
+
+# ------------------------------------------------------------------------------
+
+def test_missing_column_raises(geometry):
+    geometry.monitor_name = "Not_A_Column"
+
+    with pytest.raises(IOError):
+        geometry.readWeights()
+
+# ------------------------------------------------------------------------------
+
+def test_points_without_monitor_counts_are_skipped(geometry, tmp_path):
+    for name in sorted(os.listdir(IMAGE_DIR))[:4]:
+        os.symlink(os.path.join(IMAGE_DIR, name), os.path.join(tmp_path, name))
+    geometry.weights[1] = np.nan
+
+    frames = list(GridMergeLogic.scanFrames([geometry], [str(tmp_path)]))
+    assert [point for _, point, _, _ in frames] == [0, 2, 3]
+    np.testing.assert_allclose([weight for _, _, _, weight in frames],
+        geometry.weights[[0, 2, 3]])
+
+    # Without normalization every frame is kept, unweighted
+    frames = list(GridMergeLogic.scanFrames([geometry], [str(tmp_path)], normalize=False))
+    assert [point for _, point, _, _ in frames] == [0, 1, 2, 3]
+    assert all(weight == 1 for _, _, _, weight in frames)
+
+# ==============================================================================